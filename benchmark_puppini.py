@@ -0,0 +1,345 @@
+import argparse
+import hashlib
+import json
+import os
+import platform
+import random
+import shutil
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import date, timedelta
+
+import sqlalchemy
+from sqlalchemy import event, text
+
+from puppini_bridge_engine import PuppiniBridgeManager, POPULATE_STRATEGIES
+
+# Livelli della gerarchia prodotto dello schema di create_db_mysql_test.py, dal più alto al più basso:
+# (tabella, PK, colonna nome, colonna FK con cui il livello sottostante la riferisce).
+PRODUCT_LEVELS = [
+    ("DimProductDepartment", "DepartmentKey", "DepartmentName", "DPK_Ref"),
+    ("DimProductCategory", "CategoryKey", "CategoryName", "CK_Ref"),
+    ("DimProductSubcategory", "SubcategoryKey", "SubcategoryName", "SCK_Ref"),
+]
+INSERT_CHUNK_ROWS = 50000
+
+
+def get_product_levels(depth):
+    """Restituisce i livelli della gerarchia prodotto: con depth=3 gli stessi di create_db_mysql_test.py."""
+    extra_levels = [(f"DimProductLevel{i}", f"Level{i}Key", f"Level{i}Name", f"L{i}K_Ref")
+                    for i in range(max(0, depth - len(PRODUCT_LEVELS)), 0, -1)]
+    return (extra_levels + PRODUCT_LEVELS)[-depth:] if depth > 0 else []
+
+
+def generate_snowflake(path, fact_rows, depth=3, fan_out=5, time_days=365, stores=50, seed=42):
+    """Genera in un file SQLite lo snowflake di create_db_mysql_test.py con fact_rows righe dei fatti."""
+    if os.path.exists(path): os.remove(path)
+    rnd = random.Random(seed)
+    conn = sqlite3.connect(path)
+    conn.execute("PRAGMA journal_mode=OFF")
+    conn.execute("PRAGMA synchronous=OFF")
+
+    conn.execute("CREATE TABLE DimTime (TimeKey INT PRIMARY KEY, FullDate VARCHAR(10), Weekday VARCHAR(10))")
+    conn.execute("CREATE TABLE DimGeography (GeographyKey INT PRIMARY KEY, Country VARCHAR(50), Region VARCHAR(50), City VARCHAR(50))")
+    conn.execute("CREATE TABLE DimStore (StoreKey INT PRIMARY KEY, StoreName VARCHAR(100), GK_Ref INT, "
+                 "CONSTRAINT FK_Store_Geo FOREIGN KEY (GK_Ref) REFERENCES DimGeography(GeographyKey))")
+    levels = get_product_levels(depth)
+    parent_level = None
+    for level in levels:
+        table_name, pk_name, name_column, _ = level
+        if parent_level is None:
+            conn.execute(f"CREATE TABLE {table_name} ({pk_name} INT PRIMARY KEY, {name_column} VARCHAR(50))")
+        else:
+            conn.execute(f"CREATE TABLE {table_name} ({pk_name} INT PRIMARY KEY, {name_column} VARCHAR(50), {parent_level[3]} INT, "
+                         f"CONSTRAINT FK_{table_name}_{parent_level[0]} FOREIGN KEY ({parent_level[3]}) "
+                         f"REFERENCES {parent_level[0]}({parent_level[1]}))")
+        parent_level = level
+    if parent_level is None:
+        conn.execute("CREATE TABLE DimProduct (ProductKey INT PRIMARY KEY, ProductName VARCHAR(100), UnitPrice DECIMAL(10,2), Stock INT)")
+    else:
+        conn.execute(f"CREATE TABLE DimProduct (ProductKey INT PRIMARY KEY, ProductName VARCHAR(100), {parent_level[3]} INT, "
+                     f"UnitPrice DECIMAL(10,2), Stock INT, "
+                     f"CONSTRAINT FK_Prod_{parent_level[0]} FOREIGN KEY ({parent_level[3]}) "
+                     f"REFERENCES {parent_level[0]}({parent_level[1]}))")
+    conn.execute("CREATE TABLE FactSales (SalesID INTEGER PRIMARY KEY, TK_Ref INT, PK_Ref INT, SK_Ref INT, Quantity INT, "
+                 "TotalAmount DECIMAL(12,2), "
+                 "CONSTRAINT FK_Sales_Time FOREIGN KEY (TK_Ref) REFERENCES DimTime(TimeKey), "
+                 "CONSTRAINT FK_Sales_Prod FOREIGN KEY (PK_Ref) REFERENCES DimProduct(ProductKey), "
+                 "CONSTRAINT FK_Sales_Store FOREIGN KEY (SK_Ref) REFERENCES DimStore(StoreKey))")
+
+    first_day = date(2020, 1, 1)
+    time_keys = []
+    for offset in range(time_days):
+        day = first_day + timedelta(days=offset)
+        time_keys.append(int(day.strftime("%Y%m%d")))
+    conn.executemany("INSERT INTO DimTime VALUES (?, ?, ?)",
+                     [(key, str(first_day + timedelta(days=i)), (first_day + timedelta(days=i)).strftime("%A"))
+                      for i, key in enumerate(time_keys)])
+    geography_rows = max(1, fan_out * fan_out)
+    conn.executemany("INSERT INTO DimGeography VALUES (?, ?, ?, ?)",
+                     [(g, f"Country{g // fan_out}", f"Region{g}", f"City{g}") for g in range(1, geography_rows + 1)])
+    conn.executemany("INSERT INTO DimStore VALUES (?, ?, ?)",
+                     [(s, f"Store{s}", rnd.randint(1, geography_rows)) for s in range(1, stores + 1)])
+
+    level_rows = 1
+    for level_index, level in enumerate(levels):
+        table_name, _, _, _ = level
+        level_rows *= fan_out
+        if level_index == 0:
+            conn.executemany(f"INSERT INTO {table_name} VALUES (?, ?)", [(k, f"{table_name}{k}") for k in range(1, level_rows + 1)])
+        else:
+            conn.executemany(f"INSERT INTO {table_name} VALUES (?, ?, ?)",
+                             [(k, f"{table_name}{k}", (k - 1) // fan_out + 1) for k in range(1, level_rows + 1)])
+    product_rows = level_rows * fan_out
+    if levels:
+        conn.executemany("INSERT INTO DimProduct VALUES (?, ?, ?, ?, ?)",
+                         [(p, f"Product{p}", (p - 1) // fan_out + 1, round(rnd.uniform(1, 2000), 2), rnd.randint(0, 500))
+                          for p in range(1, product_rows + 1)])
+    else:
+        conn.executemany("INSERT INTO DimProduct VALUES (?, ?, ?, ?)",
+                         [(p, f"Product{p}", round(rnd.uniform(1, 2000), 2), rnd.randint(0, 500)) for p in range(1, product_rows + 1)])
+
+    for chunk_start in range(1, fact_rows + 1, INSERT_CHUNK_ROWS):
+        chunk_end = min(chunk_start + INSERT_CHUNK_ROWS, fact_rows + 1)
+        conn.executemany("INSERT INTO FactSales VALUES (?, ?, ?, ?, ?, ?)",
+                         [(sales_id, rnd.choice(time_keys), rnd.randint(1, product_rows), rnd.randint(1, stores), rnd.randint(1, 10),
+                           round(rnd.uniform(1, 5000), 2)) for sales_id in range(chunk_start, chunk_end)])
+    conn.commit()
+    conn.close()
+    return {'products': product_rows, 'stores': stores, 'geographies': geography_rows, 'time_days': time_days}
+
+
+def get_bridge_checksum(connection, bridge_table_name="Puppini_Bridge"):
+    """SHA-256 del contenuto della bridge letto ordinato su tutte le colonne: uguale per due bridge con le stesse righe."""
+    column_names = [row[1] for row in connection.execute(text(f'PRAGMA table_info("{bridge_table_name}")'))]
+    order_by = ", ".join(f'"{name}"' for name in column_names)
+    digest = hashlib.sha256()
+    result = connection.execution_options(stream_results=True).execute(text(f'SELECT * FROM "{bridge_table_name}" ORDER BY {order_by}'))
+    for rows in result.partitions(INSERT_CHUNK_ROWS):
+        for row in rows:
+            digest.update(repr(tuple(row)).encode("utf-8"))
+            digest.update(b"\n")
+    return digest.hexdigest()
+
+
+def run_configuration(base_path, work_path, strategy, workers, batch_size, measure_memory=True, pipeline=False, wal=False):
+    """Esegue analisi, create e populate su una copia del DB e ne misura tempi, statement e memoria."""
+    for suffix in ("-wal", "-shm"):
+        if os.path.exists(work_path + suffix): os.remove(work_path + suffix)
+    shutil.copy(base_path, work_path)
+    if wal:
+        with sqlite3.connect(work_path) as wal_connection:
+            wal_connection.execute("PRAGMA journal_mode=WAL")
+    manager = PuppiniBridgeManager(driver="sqlite", hostname="", port="", database_name=work_path, username="", password="", silent=True)
+    statement_count = [0]
+
+    def count_statement(conn, cursor, statement, parameters, context, executemany):
+        statement_count[0] += 1
+    event.listen(manager.engine, "before_cursor_execute", count_statement)
+
+    try:
+        started = time.perf_counter()
+        manager.build_population_plan()
+        analysis_s = time.perf_counter() - started
+
+        started = time.perf_counter()
+        if not manager.create_puppini_bridge():
+            raise RuntimeError("create_puppini_bridge non riuscito")
+        create_s = time.perf_counter() - started
+
+        started = time.perf_counter()
+        plan = manager.build_population_plan()
+        plan_s = time.perf_counter() - started
+
+        statement_count[0] = 0
+        if measure_memory: tracemalloc.start()
+        started = time.perf_counter()
+        if not manager.populate_puppini_bridge(strategy=strategy, workers=workers, batch_size=batch_size, pipeline=pipeline, plan=plan):
+            raise RuntimeError("populate_puppini_bridge non riuscito")
+        populate_s = time.perf_counter() - started
+        peak_memory_mb = None
+        if measure_memory:
+            peak_memory_mb = tracemalloc.get_traced_memory()[1] / (1024 * 1024)
+            tracemalloc.stop()
+        populate_statements = statement_count[0]
+
+        with manager.engine.connect() as connection:
+            rows_written = connection.execute(text("SELECT COUNT(*) FROM Puppini_Bridge")).scalar()
+            bridge_checksum = get_bridge_checksum(connection)
+    finally:
+        if tracemalloc.is_tracing(): tracemalloc.stop()
+        manager.engine.dispose()
+
+    return {
+        'analysis_s': round(analysis_s, 4),
+        'create_s': round(create_s, 4),
+        'plan_s': round(plan_s, 4),
+        'populate_s': round(populate_s, 4),
+        'rows_written': rows_written,
+        'rows_per_s': round(rows_written / populate_s, 1) if populate_s > 0 else None,
+        'statements': populate_statements,
+        'peak_memory_mb': round(peak_memory_mb, 2) if peak_memory_mb is not None else None,
+        'bridge_checksum': bridge_checksum,
+    }
+
+
+def get_git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except Exception:
+        return None
+
+
+def result_key(result):
+    return (result['fact_rows'], result['depth'], result['fan_out'], result['strategy'], result['workers'], result.get('pipeline', False))
+
+
+def compare_results(current, baseline, threshold):
+    """Confronta righe/s con un file di risultati precedente; restituisce il numero di regressioni oltre threshold."""
+    baseline_by_key = {result_key(r): r for r in baseline.get('results', [])}
+    regressions = 0
+    print(f"\nConfronto con il commit {baseline.get('meta', {}).get('git_commit')}:")
+    for result in current['results']:
+        previous = baseline_by_key.get(result_key(result))
+        if not previous or not previous.get('rows_per_s') or not result.get('rows_per_s'):
+            continue
+        ratio = result['rows_per_s'] / previous['rows_per_s']
+        flag = ""
+        if ratio < 1 - threshold:
+            regressions += 1
+            flag = "  <-- REGRESSIONE"
+        print(f"  fact_rows={result['fact_rows']} strategy={result['strategy']} "
+              f"workers={result['workers']}{' pipeline' if result.get('pipeline') else ''}: "
+              f"{previous['rows_per_s']} -> {result['rows_per_s']} righe/s (x{ratio:.2f}), "
+              f"statement {previous['statements']} -> {result['statements']}{flag}")
+    return regressions
+
+
+def check_outputs(results):
+    """
+    Confronta il checksum della bridge delle configurazioni misurate sullo stesso DB generato: rows, set,
+    vectorized, workers > 1 e pipeline devono scrivere le stesse righe. Restituisce il numero di DB con differenze.
+    """
+    checksums_by_db = {}
+    for result in results:
+        db_key = (result['fact_rows'], result['depth'], result['fan_out'])
+        checksums_by_db.setdefault(db_key, {}).setdefault(result['bridge_checksum'], []).append(result)
+    mismatches = 0
+    for (fact_rows, depth, fan_out), checksums in checksums_by_db.items():
+        if len(checksums) <= 1: continue
+        mismatches += 1
+        print(f"\nERRORE: bridge diverse tra le configurazioni con fact_rows={fact_rows} depth={depth} fan_out={fan_out}:")
+        for checksum, checksum_results in checksums.items():
+            configurations = ", ".join(f"{r['strategy']} workers={r['workers']}{' pipeline' if r.get('pipeline') else ''}"
+                                       for r in checksum_results)
+            print(f"  {checksum[:16]} ({checksum_results[0]['rows_written']} righe): {configurations}")
+    return mismatches
+
+
+def parse_int_list(value):
+    return [int(v) for v in value.split(",") if v.strip()]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark di analisi, create e populate della Puppini Bridge su uno "
+                                     "snowflake sintetico SQLite.")
+    parser.add_argument("--fact-rows", type=parse_int_list, default=[1000, 100000],
+                        help="Righe di FactSales, separate da virgola (default: 1000,100000)")
+    parser.add_argument("--depth", type=int, default=3,
+                        help="Livelli della gerarchia prodotto sopra DimProduct (default: 3, come create_db_mysql_test.py)")
+    parser.add_argument("--fan-out", type=int, default=5, help="Figli per riga a ogni livello della gerarchia prodotto (default: 5)")
+    parser.add_argument("--time-days", type=int, default=365, help="Righe di DimTime (default: 365)")
+    parser.add_argument("--stores", type=int, default=50, help="Righe di DimStore (default: 50)")
+    parser.add_argument("--strategies", default=",".join(POPULATE_STRATEGIES), help="Strategie di populate da misurare (default: tutte)")
+    parser.add_argument("--workers", type=parse_int_list, default=[1],
+                        help="Valori di --workers da misurare, separati da virgola (default: 1)")
+    parser.add_argument("--pipeline", action="store_true",
+                        help="Misura ogni configurazione con workers=1 anche con il populate in pipeline; "
+                             "tutti i DB usano journal_mode=WAL")
+    parser.add_argument("--batch-size", type=int, default=1000, help="Righe per INSERT multi-riga (default: 1000)")
+    parser.add_argument("--seed", type=int, default=42, help="Seme del generatore casuale (default: 42)")
+    parser.add_argument("--workdir",
+                        help="Directory per i DB generati (default: directory temporanea); i DB già generati con "
+                             "gli stessi parametri sono riusati")
+    parser.add_argument("--regenerate", action="store_true", help="Rigenera i DB anche se già presenti in --workdir")
+    parser.add_argument("--no-memory", action="store_true", help="Non misura il picco di memoria (tracemalloc rallenta il populate)")
+    parser.add_argument("--output", default="benchmark_results.json", help="File JSON dei risultati (default: benchmark_results.json)")
+    parser.add_argument("--compare", help="File JSON di un run precedente con cui confrontare righe/s")
+    parser.add_argument("--regression-threshold", type=float, default=0.10,
+                        help="Calo relativo di righe/s oltre il quale --compare segnala una regressione ed "
+                             "esce con codice 1 (default: 0.10)")
+    args = parser.parse_args()
+
+    strategies = [s.strip() for s in args.strategies.split(",") if s.strip()]
+    for strategy in strategies:
+        if strategy not in POPULATE_STRATEGIES:
+            parser.error(f"strategia non supportata: {strategy}")
+
+    workdir = args.workdir or tempfile.mkdtemp(prefix="puppini_bench_")
+    os.makedirs(workdir, exist_ok=True)
+    results = {
+        'meta': {
+            'git_commit': get_git_commit(),
+            'timestamp': time.strftime("%Y-%m-%dT%H:%M:%S"),
+            'python': platform.python_version(),
+            'sqlalchemy': sqlalchemy.__version__,
+            'sqlite': sqlite3.sqlite_version,
+            'platform': platform.platform(),
+            'parameters': {'depth': args.depth, 'fan_out': args.fan_out, 'time_days': args.time_days, 'stores': args.stores,
+                           'batch_size': args.batch_size, 'seed': args.seed, 'memory_measured': not args.no_memory, 'wal': args.pipeline},
+        },
+        'results': [],
+    }
+
+    for fact_rows in args.fact_rows:
+        base_path = os.path.join(workdir,
+                                 f"snowflake_{fact_rows}_d{args.depth}_f{args.fan_out}_t{args.time_days}_s{args.stores}_r{args.seed}.db")
+        if args.regenerate or not os.path.exists(base_path):
+            print(f"Generazione snowflake con {fact_rows} righe dei fatti (depth={args.depth}, fan-out={args.fan_out})...")
+            started = time.perf_counter()
+            generate_snowflake(base_path, fact_rows, args.depth, args.fan_out, args.time_days, args.stores, args.seed)
+            print(f"  Generato in {time.perf_counter() - started:.1f} s: {base_path}")
+        for strategy in strategies:
+            for workers in args.workers:
+                pipeline_modes = [False, True] if args.pipeline and workers == 1 and strategy != "set" else [False]
+                for pipeline in pipeline_modes:
+                    print(f"Benchmark fact_rows={fact_rows} strategy={strategy} workers={workers}{' pipeline' if pipeline else ''}...")
+                    measures = run_configuration(base_path, os.path.join(workdir, "bench_run.db"), strategy, workers,
+                                                 args.batch_size, not args.no_memory,
+                                                 pipeline, args.pipeline)
+                    result = {'fact_rows': fact_rows, 'depth': args.depth, 'fan_out': args.fan_out,
+                              'strategy': strategy, 'workers': workers,
+                              'pipeline': pipeline}
+                    result.update(measures)
+                    results['results'].append(result)
+                    print(f"  analisi {measures['analysis_s']} s, create {measures['create_s']} s, populate {measures['populate_s']} s, "
+                          f"{measures['rows_written']} righe ({measures['rows_per_s']} righe/s), {measures['statements']} statement, "
+                          f"picco memoria {measures['peak_memory_mb'] if measures['peak_memory_mb'] is not None else 'n/d'} MB, "
+                          f"checksum {measures['bridge_checksum'][:16]}")
+
+    with open(args.output, "w", encoding="utf-8") as output_file:
+        json.dump(results, output_file, indent=2)
+    print(f"Risultati scritti in {args.output}")
+
+    exit_code = 0
+    mismatches = check_outputs(results['results'])
+    if mismatches:
+        print(f"{mismatches} DB con bridge diverse tra le configurazioni.")
+        exit_code = 1
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as baseline_file:
+            regressions = compare_results(results, json.load(baseline_file), args.regression_threshold)
+        if regressions:
+            print(f"{regressions} regressioni oltre il {args.regression_threshold:.0%}.")
+            exit_code = 1
+    if exit_code:
+        sys.exit(exit_code)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,188 @@
+import sys
+from collections import OrderedDict
+
+from sqlalchemy import text
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+class _DimensionChainCache:
+    """Cache LRU per run delle catene di dimensioni già risolte, con chiave (tabella, valore PK); max_mb=0 la disattiva."""
+
+    def __init__(self, connection, plan, max_mb=256, silent=False):
+        self.connection = connection
+        self.table_details_map = plan.table_details_map
+        self.fk_edges = plan.fk_edges
+        self.max_bytes = int(max_mb * 1024 * 1024)
+        self.silent = silent
+        self.entries = OrderedDict()
+        self.entry_sizes = {}
+        self.current_bytes = 0
+        self.preloaded_rows = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.queries = 0
+
+    def preload_tables(self, table_names):
+        """Carica intere tabelle di dimensione (solo PK e colonne FK) in mappe hash, una query per tabella."""
+        q = "`"
+        for table_name in table_names:
+            details = self.table_details_map.get(table_name)
+            if not details or not details.get('pk_name'): continue
+            fk_columns = [edge[0] for edge in self.fk_edges[table_name]]
+            select_columns = ", ".join(f"{q}{c}{q}" for c in [details['pk_name']] + fk_columns)
+            result = self.connection.execute(text(f"SELECT {select_columns} FROM {q}{table_name}{q}"))
+            self.queries += 1
+            self.preloaded_rows[table_name] = {row[0]: tuple(row[1:]) for row in result}
+            if not self.silent: print(f"    Precaricate {len(self.preloaded_rows[table_name])} righe da {table_name}.")
+
+    def _fetch_fk_values(self, table_name, pk_value):
+        """Restituisce i valori delle FK della riga (in ordine di details['fks']) o None se la riga non esiste."""
+        preloaded = self.preloaded_rows.get(table_name)
+        if preloaded is not None:
+            return preloaded.get(pk_value)
+        q = "`"
+        details = self.table_details_map[table_name]
+        fk_columns = [edge[0] for edge in self.fk_edges[table_name]]
+        select_columns = ", ".join(f"{q}{c}{q}" for c in [details['pk_name']] + fk_columns)
+        stmt_text_select = f"SELECT {select_columns} FROM {q}{table_name}{q} WHERE {q}{details['pk_name']}{q} = :pk_val"
+        row = self.connection.execute(text(stmt_text_select), {"pk_val": pk_value}).first()
+        self.queries += 1
+        return tuple(row[1:]) if row is not None else None
+
+    def compose(self, table_name, fk_values, in_progress=None):
+        """Colonne PBK_ raggiungibili da una riga di table_name: (resolved, truncated se un ciclo è stato interrotto)."""
+        if in_progress is None:
+            in_progress = set()
+        resolved = {}
+        truncated = False
+        for fk_index, (_, referred_table, bridge_col_for_fk, traversable) in enumerate(self.fk_edges[table_name]):
+            fk_value = fk_values[fk_index]
+            if bridge_col_for_fk is not None and (bridge_col_for_fk not in resolved or (1, (fk_index,)) < resolved[bridge_col_for_fk][0]):
+                resolved[bridge_col_for_fk] = ((1, (fk_index,)), fk_value)
+            if fk_value is None or not traversable:
+                continue
+            child_resolved, child_truncated = self.resolve(referred_table, fk_value, in_progress)
+            truncated = truncated or child_truncated
+            for col_name, ((depth, path), value) in child_resolved.items():
+                position = (depth + 1, (fk_index,) + path)
+                if col_name not in resolved or position < resolved[col_name][0]:
+                    resolved[col_name] = (position, value)
+        return resolved, truncated
+
+    def resolve(self, table_name, pk_value, in_progress):
+        """Restituisce (resolved, truncated) per la riga di dimensione (table_name, pk_value), usando la cache."""
+        cache_key = (table_name, pk_value)
+        cached = self.entries.get(cache_key)
+        if cached is not None:
+            self.hits += 1
+            self.entries.move_to_end(cache_key)
+            return cached, False
+        if cache_key in in_progress:
+            # La stessa riga è già in risoluzione più in alto nel cammino: ciò che produrrebbe qui
+            # arriverebbe più in profondità e non vincerebbe mai.
+            return {}, True
+        self.misses += 1
+        fk_values = self._fetch_fk_values(table_name, pk_value)
+        if fk_values is None:
+            resolved, truncated = {}, False
+        else:
+            in_progress.add(cache_key)
+            resolved, truncated = self.compose(table_name, fk_values, in_progress)
+            in_progress.discard(cache_key)
+        if not truncated:
+            self._store(cache_key, resolved)
+        return resolved, truncated
+
+    def _store(self, cache_key, resolved):
+        if self.max_bytes <= 0: return
+        entry_size = sys.getsizeof(cache_key) + sys.getsizeof(resolved) + \
+                     sum(sys.getsizeof(position) + sys.getsizeof(position[1]) + sys.getsizeof(value)
+                         for position, value in resolved.values())
+        self.entries[cache_key] = resolved
+        self.entry_sizes[cache_key] = entry_size
+        self.current_bytes += entry_size
+        while self.current_bytes > self.max_bytes and self.entries:
+            evicted_key, _ = self.entries.popitem(last=False)
+            self.current_bytes -= self.entry_sizes.pop(evicted_key)
+            self.evictions += 1
+
+    def stats(self):
+        return {'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions,
+                'entries': len(self.entries), 'approx_bytes': self.current_bytes, 'queries': self.queries}
+
+def _to_object_array(values):
+    """Array NumPy di oggetti Python (i valori restano quelli restituiti dal driver, NULL compresi)."""
+    array = np.empty(len(values), dtype=object)
+    array[:] = values
+    return array
+
+
+class _ColumnarKeyIndex:
+    """Indice vettoriale dei valori di PK di una tabella: lookup() restituisce le posizioni (-1 se NULL o assente)."""
+    def __init__(self, pk_values):
+        self.size = len(pk_values)
+        self.position_by_key = None
+        self.sorted_keys = None
+        if self.size and all(type(v) is int for v in pk_values):
+            keys = np.array(pk_values, dtype=np.int64)
+            self.order = np.argsort(keys, kind='stable')
+            self.sorted_keys = keys[self.order]
+        self.pk_values = pk_values
+
+    def _lookup_with_dict(self, values):
+        if self.position_by_key is None:
+            self.position_by_key = {key: position for position, key in enumerate(self.pk_values)}
+        position_by_key = self.position_by_key
+        return np.fromiter((position_by_key.get(v, -1) if v is not None else -1 for v in values), dtype=np.int64, count=len(values))
+
+    def lookup(self, values):
+        if not self.size:
+            return np.full(len(values), -1, dtype=np.int64)
+        if self.sorted_keys is None:
+            return self._lookup_with_dict(values)
+        valid = values != None  # noqa: E711 - confronto elemento per elemento sull'array di oggetti
+        try:
+            int_values = np.where(valid, values, 0).astype(np.int64)
+        except (TypeError, ValueError, OverflowError):
+            return self._lookup_with_dict(values)
+        if not np.all(int_values[valid] == values[valid]):
+            return self._lookup_with_dict(values)
+        sorted_positions = np.minimum(np.searchsorted(self.sorted_keys, int_values), self.size - 1)
+        found = valid & (self.sorted_keys[sorted_positions] == int_values)
+        return np.where(found, self.order[sorted_positions], -1)
+
+
+class _ColumnarDimensions:
+    """Dimensioni in forma colonnare (PK e FK come array NumPy) per il popolamento vettoriale."""
+    def __init__(self, connection, plan, silent=False):
+        self.connection = connection
+        self.table_details_map = plan.table_details_map
+        self.fk_edges = plan.fk_edges
+        self.silent = silent
+        self.tables = {}
+        self.rows_loaded = 0
+
+    def load_tables(self, table_names):
+        for table_name in table_names:
+            self.table(table_name)
+
+    def table(self, table_name):
+        """Restituisce (indice PK, dict colonna -> array) della tabella, caricandola al primo uso."""
+        loaded = self.tables.get(table_name)
+        if loaded is not None: return loaded
+        pk_name = self.table_details_map[table_name]['pk_name']
+        column_names = list(dict.fromkeys([pk_name] + [edge[0] for edge in self.fk_edges.get(table_name, ())]))
+        q = "`" 
+        select_columns = ", ".join(f"{q}{c}{q}" for c in column_names)
+        rows = self.connection.execute(text(f"SELECT {select_columns} FROM {q}{table_name}{q}")).fetchall()
+        columns = list(zip(*rows)) if rows else [() for _ in column_names]
+        column_arrays = {name: _to_object_array(values) for name, values in zip(column_names, columns)}
+        loaded = (_ColumnarKeyIndex(list(columns[0])), column_arrays)
+        self.tables[table_name] = loaded
+        self.rows_loaded += len(rows)
+        return loaded
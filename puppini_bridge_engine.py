@@ -1,14 +1,132 @@
 import sqlalchemy
-from sqlalchemy import create_engine, MetaData, Table, Column, String, Integer, Date, inspect, text 
-from sqlalchemy.schema import CreateTable 
+from sqlalchemy import create_engine, MetaData, Table, Column, String, Integer, Boolean, Date, DateTime, inspect, text, event 
+from sqlalchemy.schema import CreateTable, CreateIndex 
 from sqlalchemy.exc import SQLAlchemyError
 import re
-from collections import deque 
+import os
+import sys
+import gzip
+import pickle
+import hashlib
+import json
+import time
+import itertools
+import math
+from contextlib import nullcontext
+from collections import deque, OrderedDict
+from datetime import date, datetime
+from decimal import Decimal
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+try:
+    import pyarrow as pa
+except ImportError:
+    pa = None
+
+from puppini_bridge_dimensions import _DimensionChainCache, _ColumnarDimensions, _to_object_array
+from puppini_bridge_metrics import PopulationMetrics, _with_metrics
+from puppini_bridge_plan import PopulationPlan, PopulationEstimate, BridgeVerification, _format_bytes
+from puppini_bridge_writers import _BridgeRowWriter, _BridgeFileWriter, _PipelinedBridgeWriter, _iter_in_thread, _rows_per_packet
+
+POPULATE_STRATEGIES = ("rows", "set", "vectorized")
+DDL_MODES = ("default", "online", "generated")
+# Clausole provate in ordine per aggiungere le colonne PBK_ senza bloccare la tabella (ddl_mode='online').
+ONLINE_ADD_COLUMN_CLAUSES = (", ALGORITHM=INSTANT", ", ALGORITHM=INPLACE, LOCK=NONE", "")
+ROW_FORMATS = ("DYNAMIC", "COMPACT", "COMPRESSED")
+EXPORT_FORMATS = ("csv", "parquet")
+AGGREGATE_FUNCTIONS = ("sum", "count")
+ANALYSIS_CACHE_VERSION = 1
+# Tabelle di servizio della bridge (<bridge><suffisso>), mai trattate come tabelle sorgente.
+SERVICE_TABLE_SUFFIXES = {'watermark': "_Watermark", 'checkpoint': "_Checkpoint", 'estimate': "_Estimate",
+                          'shadow': "__new", 'old': "__old"}
+
+
+def _parse_mysql_column_type(dialect, column_type):
+    """
+    Converte un COLUMN_TYPE di information_schema (es. 'int(11) unsigned', 'decimal(10,2)',
+    "enum('a','b')") nel tipo SQLAlchemy che il dialetto MySQL otterrebbe da SHOW CREATE TABLE.
+    """
+    from sqlalchemy.dialects.mysql import DATETIME, TIME, TIMESTAMP, SET
+    match = re.match(r"^\s*(\w+)\s*(?:\((.*)\))?\s*(.*)$", column_type, re.DOTALL)
+    type_name, type_args_str, type_options = match.group(1).lower(), match.group(2), match.group(3).lower()
+    col_type = dialect.ischema_names.get(type_name, sqlalchemy.types.NullType)
+    if not type_args_str:
+        type_args = []
+    elif type_args_str.startswith("'"):
+        type_args = [v.replace("''", "'") for v in re.findall(r"'((?:[^']|'')*)'", type_args_str)]
+    else:
+        type_args = [int(v) for v in re.findall(r"\d+", type_args_str)]
+    type_kw = {}
+    if issubclass(col_type, (DATETIME, TIME, TIMESTAMP)) and type_args:
+        type_kw['fsp'] = type_args.pop(0)
+    for option in ("unsigned", "zerofill"):
+        if option in type_options.split():
+            type_kw[option] = True
+    if issubclass(col_type, SET) and "" in type_args:
+        type_kw['retrieve_as_bitwise'] = True
+    try:
+        return col_type(*type_args, **type_kw)
+    except TypeError:
+        return col_type()
+
+
+# Byte per riga di InnoDB oltre ai valori: intestazione del record, DB_TRX_ID, DB_ROLL_PTR e DB_ROW_ID (la bridge non ha PK).
+INNODB_ROW_OVERHEAD_BYTES = 24
+
+
+def _estimate_storage_bytes(col_type):
+    """Stima i byte occupati su disco da un valore non NULL della colonna (formati di MySQL/InnoDB)."""
+    if isinstance(col_type, sqlalchemy.types.String):
+        return (col_type.length or 255) // 2 + 2
+    if isinstance(col_type, sqlalchemy.types.Boolean):
+        return 1
+    if isinstance(col_type, sqlalchemy.types.Integer):
+        if isinstance(col_type, sqlalchemy.types.BigInteger): return 8
+        if isinstance(col_type, sqlalchemy.types.SmallInteger): return 2
+        return 4
+    if isinstance(col_type, sqlalchemy.types.Float):
+        return 8
+    if isinstance(col_type, sqlalchemy.types.Numeric):
+        return ((getattr(col_type, 'precision', None) or 10) * 4 + 8) // 9 + 1
+    if isinstance(col_type, sqlalchemy.types.DateTime):
+        return 8
+    if isinstance(col_type, (sqlalchemy.types.Date, sqlalchemy.types.Time)):
+        return 3
+    return 8
+
+
+def _aggregate_bridge_rows(bridge_rows, column_names, aggregate):
+    """Aggrega in memoria le righe bridge di una stage per Stage e group_by, con SUM/COUNT delle misure come in SQL."""
+    positions = {name: position for position, name in enumerate(column_names)}
+    key_positions = [positions[name] for name in ['Stage'] + aggregate['group_by']]
+    measure_specs = [(positions[name], function == "count") for name, function in aggregate['measures']]
+    groups = {}
+    for row_values in bridge_rows:
+        key = tuple(row_values[position] for position in key_positions)
+        totals = groups.get(key)
+        if totals is None:
+            totals = groups[key] = [0 if is_count else None for _, is_count in measure_specs]
+        for i, (position, is_count) in enumerate(measure_specs):
+            value = row_values[position]
+            if value is None: continue
+            if is_count: totals[i] += 1
+            elif totals[i] is None: totals[i] = value
+            else: totals[i] += value
+    for key, totals in groups.items():
+        yield list(key) + totals
+
 
 class PuppiniBridgeManager:
-    def __init__(self, driver, hostname, port, database_name, username, password, silent=False): 
+    def __init__(self, driver, hostname, port, database_name, username, password, silent=False, analysis_cache_path=None, pool_size=5,
+                 metrics_callback=None): 
         """
         Inizializza il manager con i parametri di connessione al database.
+        analysis_cache_path salva su disco lo schema riflesso; metrics_callback riceve le metriche di ogni stage.
         """
         self.driver = driver
         self.hostname = hostname
@@ -17,6 +135,15 @@ class PuppiniBridgeManager:
         self.username = username
         self.password = password
         self.silent = silent 
+        self.analysis_cache_path = analysis_cache_path
+        self._schema_snapshot = None
+        self.pool_size = pool_size
+        self.metrics_callback = metrics_callback
+        self.last_metrics = None
+        self.last_export_files = None
+        self.last_estimate = None
+        self.last_verification = None
+        self._active_metrics = None
         
         if self.driver != "mysql":
             if not self.silent:
@@ -25,8 +152,10 @@ class PuppiniBridgeManager:
                       "La compatibilità con altri driver non è garantita per tutte le funzionalità.")
 
         self.engine = self._create_db_engine()
+        event.listen(self.engine, "before_cursor_execute", self._count_statement)
         self.inspector = inspect(self.engine)
         self.metadata = MetaData() 
+        self.last_dimension_cache_stats = None
 
     def get_abbreviation(self, table_name: str) -> str: 
         """
@@ -52,13 +181,41 @@ class PuppiniBridgeManager:
                  return parts[0][0].upper() + parts[1][0].upper() + parts[2][:2].capitalize()
             return parts[0][0].upper() + parts[-1][:3].capitalize()
 
+    def _count_statement(self, conn, cursor, statement, parameters, context, executemany):
+        if self._active_metrics is not None: self._active_metrics.count_statement()
+
+    def _phase(self, name, stage=None):
+        """Misura una fase dell'operazione in corso (no-op se nessuna metrica è attiva)."""
+        return self._active_metrics.phase(name, stage) if self._active_metrics is not None else nullcontext()
+
+    def _stage(self, table_name):
+        return self._active_metrics.stage(table_name) if self._active_metrics is not None else nullcontext()
+
+    def _record_rows(self, table_name, rows_read=0, rows_written=0):
+        if self._active_metrics is not None: self._active_metrics.add_rows(table_name, rows_read, rows_written)
+
     def _create_db_engine(self):
-        """Crea e restituisce un engine SQLAlchemy."""
+        """
+        Crea e restituisce un engine SQLAlchemy.
+        Con driver 'sqlite' database_name è il percorso del file e le scritture partono con BEGIN IMMEDIATE.
+        """
         try:
-            connection_string = f"{self.driver}://{self.username}:{self.password}@{self.hostname}:{self.port}/{self.database_name}"
-            
-            if not self.silent: print(f"Tentativo di connessione con: {connection_string.replace(self.password, '****')}")
-            engine = create_engine(connection_string)
+            if self.driver == "sqlite":
+                connection_string = f"sqlite:///{self.database_name}"
+                if not self.silent: print(f"Tentativo di connessione con: {connection_string}")
+                engine = create_engine(connection_string, connect_args={"timeout": 300})
+
+                @event.listens_for(engine, "connect")
+                def disable_pysqlite_begin(dbapi_connection, connection_record):
+                    dbapi_connection.isolation_level = None
+
+                @event.listens_for(engine, "begin")
+                def begin_immediate(conn):
+                    conn.exec_driver_sql("BEGIN" if conn.get_execution_options().get("puppini_read_only") else "BEGIN IMMEDIATE")
+            else:
+                connection_string = f"{self.driver}://{self.username}:{self.password}@{self.hostname}:{self.port}/{self.database_name}"
+                if not self.silent: print(f"Tentativo di connessione con: {connection_string.replace(self.password, '****')}")
+                engine = create_engine(connection_string, pool_size=self.pool_size, max_overflow=self.pool_size)
             with engine.connect() as conn:
                 if not self.silent: print(f"Connessione al database '{self.database_name}' riuscita.")
             return engine
@@ -66,11 +223,147 @@ class PuppiniBridgeManager:
             if not self.silent: print(f"Errore durante la creazione dell'engine SQLAlchemy: {e}")
             raise
 
+    def _connect_read_only(self):
+        """Connessione usata solo per letture, che su SQLite non prende il lock di scrittura all'inizio della transazione."""
+        return self.engine.connect().execution_options(puppini_read_only=True)
+
+    def _get_schema_fingerprint(self):
+        """
+        Calcola un'impronta economica dello schema (una sola query): cambia quando cambiano tabelle,
+        colonne, tipi o vincoli. Restituisce None se il driver non la supporta.
+        """
+        try:
+            with self.engine.connect() as connection:
+                if self.driver == "mysql":
+                    fingerprint_rows = connection.execute(text("""
+                        SELECT
+                          (SELECT COUNT(*) FROM information_schema.COLUMNS WHERE TABLE_SCHEMA = :schema),
+                          (SELECT SUM(CRC32(CONCAT_WS('|', TABLE_NAME, COLUMN_NAME, ORDINAL_POSITION, COLUMN_TYPE, COLUMN_KEY,
+                                                  IS_NULLABLE)))
+                             FROM information_schema.COLUMNS WHERE TABLE_SCHEMA = :schema),
+                          (SELECT COUNT(*) FROM information_schema.KEY_COLUMN_USAGE WHERE TABLE_SCHEMA = :schema),
+                          (SELECT SUM(CRC32(CONCAT_WS('|', TABLE_NAME, CONSTRAINT_NAME, COLUMN_NAME, ORDINAL_POSITION,
+                                                  REFERENCED_TABLE_NAME, REFERENCED_COLUMN_NAME)))
+                             FROM information_schema.KEY_COLUMN_USAGE WHERE TABLE_SCHEMA = :schema),
+                          (SELECT SUM(CRC32(CONCAT_WS('|', TABLE_NAME, TABLE_TYPE, CREATE_TIME)))
+                             FROM information_schema.TABLES WHERE TABLE_SCHEMA = :schema)
+                    """), {"schema": self.database_name}).all()
+                elif self.engine.dialect.name == "sqlite":
+                    fingerprint_rows = connection.execute(text("SELECT type, name, tbl_name, sql FROM sqlite_master "
+                                                               "ORDER BY type, name")).all()
+                else:
+                    return None
+        except Exception as e_fingerprint:
+            if not self.silent: print(f"  AVVISO: impossibile calcolare l'impronta dello schema: {e_fingerprint}")
+            return None
+        return hashlib.sha1(repr([tuple(row) for row in fingerprint_rows]).encode("utf-8")).hexdigest()
+
+    def _reflect_schema_mysql(self):
+        """Riflette tutto lo schema MySQL con due query su information_schema invece dell'inspector per tabella."""
+        def as_str(value):
+            return value.decode("utf-8") if isinstance(value, (bytes, bytearray)) else value
+
+        tables = {}
+        with self.engine.connect() as connection:
+            column_rows = connection.execute(text("""
+                SELECT c.TABLE_NAME, c.COLUMN_NAME, c.COLUMN_TYPE
+                FROM information_schema.COLUMNS c
+                JOIN information_schema.TABLES t ON t.TABLE_SCHEMA = c.TABLE_SCHEMA AND t.TABLE_NAME = c.TABLE_NAME
+                WHERE c.TABLE_SCHEMA = :schema AND t.TABLE_TYPE = 'BASE TABLE'
+                ORDER BY c.TABLE_NAME, c.ORDINAL_POSITION
+            """), {"schema": self.database_name}).all()
+            constraint_rows = connection.execute(text("""
+                SELECT tc.TABLE_NAME, tc.CONSTRAINT_NAME, tc.CONSTRAINT_TYPE, k.COLUMN_NAME,
+                       k.REFERENCED_TABLE_NAME, k.REFERENCED_COLUMN_NAME
+                FROM information_schema.TABLE_CONSTRAINTS tc
+                JOIN information_schema.KEY_COLUMN_USAGE k
+                  ON k.CONSTRAINT_SCHEMA = tc.CONSTRAINT_SCHEMA AND k.TABLE_NAME = tc.TABLE_NAME AND k.CONSTRAINT_NAME = tc.CONSTRAINT_NAME
+                WHERE tc.TABLE_SCHEMA = :schema AND tc.CONSTRAINT_TYPE IN ('PRIMARY KEY', 'FOREIGN KEY')
+                ORDER BY tc.TABLE_NAME, tc.CONSTRAINT_NAME, k.ORDINAL_POSITION
+            """), {"schema": self.database_name}).all()
+
+        for table_name, column_name, column_type in column_rows:
+            table_name, column_name = as_str(table_name), as_str(column_name)
+            table_entry = tables.setdefault(table_name, {'columns': [], 'pk': [], 'fks': []})
+            table_entry['columns'].append({'name': column_name, 'type': _parse_mysql_column_type(self.engine.dialect, as_str(column_type))})
+
+        fks_by_name = {}
+        for table_name, constraint_name, constraint_type, column_name, referred_table, referred_column in constraint_rows:
+            table_entry = tables.get(as_str(table_name))
+            if table_entry is None: continue
+            if as_str(constraint_type) == 'PRIMARY KEY':
+                table_entry['pk'].append(as_str(column_name))
+                continue
+            fk_key = (as_str(table_name), as_str(constraint_name))
+            fk_entry = fks_by_name.get(fk_key)
+            if fk_entry is None:
+                fk_entry = {'name': as_str(constraint_name), 'constrained_columns': [],
+                            'referred_table': as_str(referred_table), 'referred_columns': []}
+                fks_by_name[fk_key] = fk_entry
+                table_entry['fks'].append(fk_entry)
+            fk_entry['constrained_columns'].append(as_str(column_name))
+            fk_entry['referred_columns'].append(as_str(referred_column))
+
+        return {'table_names': sorted(tables), 'tables': tables}
+
+    def _reflect_schema_inspector(self):
+        """Riflessione generica tramite le API multi-tabella dell'inspector (get_multi_*)."""
+        inspector = inspect(self.engine)
+        table_names = inspector.get_table_names()
+        multi_columns = inspector.get_multi_columns()
+        multi_pks = inspector.get_multi_pk_constraint()
+        multi_fks = inspector.get_multi_foreign_keys()
+        tables = {}
+        for table_name in table_names:
+            key = (None, table_name)
+            tables[table_name] = {
+                'columns': [{'name': c['name'], 'type': c['type']} for c in multi_columns.get(key, [])],
+                'pk': list((multi_pks.get(key) or {}).get('constrained_columns') or []),
+                'fks': [{'name': fk_info.get('name'), 'constrained_columns': fk_info['constrained_columns'],
+                         'referred_table': fk_info['referred_table'], 'referred_columns': fk_info.get('referred_columns')}
+                        for fk_info in multi_fks.get(key, [])]
+            }
+        return {'table_names': table_names, 'tables': tables}
+
+    def _get_schema_snapshot(self):
+        """Schema riflesso {'table_names', 'tables'}, riusato finché l'impronta dello schema non cambia."""
+        with self._phase("fingerprint"):
+            fingerprint = self._get_schema_fingerprint()
+        if fingerprint and self._schema_snapshot and self._schema_snapshot.get('fingerprint') == fingerprint:
+            return self._schema_snapshot
+
+        cache_key = {'version': ANALYSIS_CACHE_VERSION, 'driver': self.driver, 'database_name': self.database_name,
+                     'fingerprint': fingerprint}
+        if fingerprint and self.analysis_cache_path and os.path.exists(self.analysis_cache_path):
+            try:
+                with open(self.analysis_cache_path, "rb") as cache_file:
+                    cached_snapshot = pickle.load(cache_file)
+                if all(cached_snapshot.get(k) == v for k, v in cache_key.items()):
+                    if not self.silent: print(f"  Schema letto dalla cache di analisi '{self.analysis_cache_path}' (impronta invariata).")
+                    self._schema_snapshot = cached_snapshot
+                    return cached_snapshot
+            except Exception as e_cache:
+                if not self.silent: print(f"  AVVISO: cache di analisi '{self.analysis_cache_path}' non leggibile, ignorata: {e_cache}")
+
+        if not self.silent: print("  Riflessione dello schema...")
+        with self._phase("reflection"):
+            snapshot = self._reflect_schema_mysql() if self.driver == "mysql" else self._reflect_schema_inspector()
+        snapshot.update(cache_key)
+        self._schema_snapshot = snapshot if fingerprint else None
+        if fingerprint and self.analysis_cache_path:
+            try:
+                with open(self.analysis_cache_path, "wb") as cache_file:
+                    pickle.dump(snapshot, cache_file)
+            except Exception as e_cache:
+                if not self.silent: print(f"  AVVISO: impossibile scrivere la cache di analisi '{self.analysis_cache_path}': {e_cache}")
+        return snapshot
+
     def _get_source_table_names(self, bridge_table_name_to_exclude="Puppini_Bridge"):
-        """Recupera i nomi delle tabelle sorgente, escludendo la tabella bridge."""
+        """Recupera i nomi delle tabelle sorgente, escludendo la tabella bridge e le sue tabelle di servizio (SERVICE_TABLE_SUFFIXES)."""
         try:
-            all_tables = self.inspector.get_table_names()
-            return [name for name in all_tables if name.lower() != bridge_table_name_to_exclude.lower()]
+            all_tables = self._get_schema_snapshot()['table_names']
+            excluded_names = {(bridge_table_name_to_exclude + suffix).lower() for suffix in [""] + list(SERVICE_TABLE_SUFFIXES.values())}
+            return [name for name in all_tables if name.lower() not in excluded_names]
         except Exception as e:
             if not self.silent: print(f"Errore nel recuperare i nomi delle tabelle: {e}")
             raise
@@ -81,6 +374,7 @@ class PuppiniBridgeManager:
         Restituisce una mappa con i dettagli e le definizioni delle colonne per Puppini_Bridge.
         """
         source_table_names = self._get_source_table_names(bridge_table_name_to_exclude)
+        schema_tables = self._get_schema_snapshot()['tables']
         
         pbk_column_defs = []
         numeric_column_defs = []
@@ -91,9 +385,8 @@ class PuppiniBridgeManager:
             current_details = {'pk_name': None, 'pk_type': None, 'fks': [], 'numerics': []}
             if not self.silent: print(f"  Analisi tabella sorgente (interna): {table_name}")
             
-            columns_raw = self.inspector.get_columns(table_name)
-            pk_constraint = self.inspector.get_pk_constraint(table_name)
-            pk_names = pk_constraint.get('constrained_columns', [])
+            columns_raw = schema_tables[table_name]['columns']
+            pk_names = schema_tables[table_name]['pk']
 
             if len(pk_names) == 1:
                 pk_col_name = pk_names[0]
@@ -111,7 +404,7 @@ class PuppiniBridgeManager:
                  print(f"    AVVISO (interna): La tabella '{table_name}' non ha PK. PBK_{table_name} non aggiunta automaticamente alla bridge.")
 
 
-            actual_fks = self.inspector.get_foreign_keys(table_name)
+            actual_fks = schema_tables[table_name]['fks']
             source_table_fk_col_names = set()
             for fk_info in actual_fks:
                 constrained_col = fk_info['constrained_columns'][0]
@@ -126,11 +419,11 @@ class PuppiniBridgeManager:
 
                 bridge_referred_pk_col_name = f"PBK_{referred_table}"
                 if bridge_referred_pk_col_name not in bridge_column_names_set:
-                    ref_pk_constr = self.inspector.get_pk_constraint(referred_table)
-                    ref_pk_names = ref_pk_constr.get('constrained_columns', [])
+                    referred_schema = schema_tables.get(referred_table, {'columns': [], 'pk': []})
+                    ref_pk_names = referred_schema['pk']
                     if len(ref_pk_names) == 1:
                         ref_pk_col_name = ref_pk_names[0]
-                        ref_pk_col_detail_obj = next((c for c in self.inspector.get_columns(referred_table) if c['name'] == ref_pk_col_name), None)
+                        ref_pk_col_detail_obj = next((c for c in referred_schema['columns'] if c['name'] == ref_pk_col_name), None)
                         if ref_pk_col_detail_obj:
                             pbk_column_defs.append(Column(bridge_referred_pk_col_name, ref_pk_col_detail_obj['type'], nullable=True))
                             bridge_column_names_set.add(bridge_referred_pk_col_name)
@@ -163,17 +456,239 @@ class PuppiniBridgeManager:
         
         return ordered_bridge_columns, bridge_column_names_set, table_details_map, source_table_names
 
-    def create_puppini_bridge(self, bridge_table_name="Puppini_Bridge", to_sql=False):
-        if not self.silent: print(f"Processo creazione per '{bridge_table_name}' (to_sql={to_sql})...")
+    def _get_bridge_index_columns(self, bridge_table_obj, partition_by_stage=False):
+        """Colonne da indicizzare nella bridge: tutte le PBK_ e, se la tabella non è partizionata per Stage, Stage."""
+        return [column.name for column in bridge_table_obj.columns
+                if column.name.startswith("PBK_") or (column.name == 'Stage' and not partition_by_stage)]
+
+    def _apply_bridge_layout(self, bridge_table_obj, stage_names, narrow_stage=False):
+        """Con narrow_stage=True la colonna Stage diventa VARCHAR della lunghezza del nome di stage più lungo."""
+        if narrow_stage and stage_names:
+            bridge_table_obj.c['Stage'].type = String(max(len(stage_name) for stage_name in stage_names))
+
+    def _get_bridge_create_sql(self, bridge_table_obj, stage_names, partition_by_stage=False, row_format=None):
+        """CREATE TABLE della bridge con ROW_FORMAT e PARTITION BY LIST COLUMNS(Stage) (opzioni solo MySQL)."""
+        create_sql = str(CreateTable(bridge_table_obj).compile(self.engine)).strip()
+        if (partition_by_stage or row_format) and self.driver != "mysql":
+            if not self.silent: print(f"  AVVISO: partizionamento e ROW_FORMAT sono supportati solo su MySQL, ignorati per "
+                                      f"'{bridge_table_obj.name}'.")
+            return create_sql
+        q = "`" 
+        if row_format:
+            create_sql += f" ROW_FORMAT={row_format}"
+        if partition_by_stage and stage_names:
+            partitions = []
+            for position, stage_name in enumerate(stage_names):
+                stage_literal = str(sqlalchemy.literal(stage_name, String).compile(self.engine, compile_kwargs={"literal_binds": True}))
+                partitions.append(f"PARTITION {q}p{position}_{stage_name[:50]}{q} VALUES IN ({stage_literal})")
+            create_sql += f"\nPARTITION BY LIST COLUMNS({q}Stage{q}) (\n\t" + ",\n\t".join(partitions) + "\n)"
+        return create_sql
+
+    def _get_bridge_index_sql(self, bridge_table_obj, index_columns, index_names=None):
+        """CREATE INDEX per ogni colonna indicata (nome IX_<tabella>_<colonna> salvo index_names)."""
+        index_names = index_names or {}
+        return [str(CreateIndex(sqlalchemy.Index(index_names.get(column_name, f"IX_{bridge_table_obj.name}_{column_name}"),
+                                                 bridge_table_obj.c[column_name])).compile(self.engine)).strip()
+                for column_name in index_columns]
+
+    def _get_bridge_stage_partitions(self, connection, bridge_table_name):
+        """Partizioni LIST COLUMNS(Stage) della bridge come {stage: nome_partizione}; vuoto se non è partizionata o non è MySQL."""
+        if self.driver != "mysql": return {}
+        partitions = {}
+        for partition_name, description in connection.execute(text(
+                "SELECT PARTITION_NAME, PARTITION_DESCRIPTION FROM information_schema.PARTITIONS "
+                "WHERE TABLE_SCHEMA = :schema AND TABLE_NAME = :table_name AND PARTITION_NAME IS NOT NULL"),
+                {"schema": self.database_name, "table_name": bridge_table_name}):
+            stage_name = (description or "").strip()
+            if len(stage_name) >= 2 and stage_name[0] == stage_name[-1] == "'":
+                stage_name = stage_name[1:-1].replace("''", "'")
+            partitions[stage_name] = partition_name
+        return partitions
+
+    def _get_bridge_alter_sql(self, connection, bridge_table_obj, stage_names):
+        """
+        ALTER TABLE che adeguano una bridge esistente alle stage indicate senza ricrearla.
+        Restituisce (statement, nomi delle colonne aggiunte).
+        """
+        q = "`"
+        bridge_table_name = bridge_table_obj.name
+        schema_arg = self.database_name if self.driver == "mysql" else None
+        existing_columns = {column['name']: column for column in sqlalchemy.inspect(connection).get_columns(bridge_table_name,
+                                                                                                            schema=schema_arg)}
+        new_columns = [column for column in bridge_table_obj.columns if column.name not in existing_columns]
+        clauses = [f"ADD COLUMN {q}{column.name}{q} {column.type.compile(dialect=self.engine.dialect)}" for column in new_columns]
+        stage_length = getattr(existing_columns.get('Stage', {}).get('type'), 'length', None)
+        longest_stage = max((len(stage_name) for stage_name in stage_names), default=0)
+        if self.driver == "mysql" and stage_length and longest_stage > stage_length:
+            clauses.append(f"MODIFY COLUMN {q}Stage{q} VARCHAR({longest_stage}) NOT NULL")
+        if self.driver == "mysql":
+            # Su MySQL un solo ALTER per tutte le colonne: una sola modifica del dizionario (o ricostruzione) della tabella.
+            alter_sql_list = [f"ALTER TABLE {q}{bridge_table_name}{q} " + ", ".join(clauses)] if clauses else []
+        else:
+            alter_sql_list = [f"ALTER TABLE {q}{bridge_table_name}{q} {clause}" for clause in clauses]
+        partitions = self._get_bridge_stage_partitions(connection, bridge_table_name)
+        if partitions:
+            for position, stage_name in enumerate([name for name in stage_names if name not in partitions], start=len(partitions)):
+                stage_literal = str(sqlalchemy.literal(stage_name, String).compile(self.engine, compile_kwargs={"literal_binds": True}))
+                alter_sql_list.append(f"ALTER TABLE {q}{bridge_table_name}{q} ADD PARTITION (PARTITION {q}p{position}_{stage_name[:50]}{q} "
+                                      f"VALUES IN ({stage_literal}))")
+        return alter_sql_list, [column.name for column in new_columns]
+
+    def _get_stage_reset_sql(self, plan, table_name, partitions):
+        """Statement che svuota una stage della bridge: TRUNCATE PARTITION o DELETE ... WHERE Stage."""
+        q = "`"
+        if table_name in partitions:
+            return f"ALTER TABLE {q}{plan.bridge_table_name}{q} TRUNCATE PARTITION {q}{partitions[table_name]}{q}"
+        delete_stmt = plan.bridge_table.delete().where(plan.bridge_table.c.Stage == table_name)
+        return str(delete_stmt.compile(self.engine, compile_kwargs={"literal_binds": True}))
+
+    def _delete_selected_stages(self, connection, plan, partitions=None):
+        """Svuota senza commit le stage selezionate: DELETE, o TRUNCATE PARTITION per le stage in partitions."""
+        partitions = partitions or {}
+        for table_name in plan.source_tables:
+            with self._phase("delete", table_name):
+                result = connection.execute(text(self._get_stage_reset_sql(plan, table_name, partitions)))
+            if not self.silent:
+                removed = "partizione svuotata" if table_name in partitions else f"rimosse {result.rowcount} righe"
+                print(f"  Stage {table_name}: {removed}.")
+
+    def _reset_selected_stages(self, plan):
+        """
+        Svuota e conferma le stage di plan.stage_selection prima del popolamento parallelo, i cui task hanno
+        transazioni proprie: finché il ripopolamento non termina le stage sono vuote o parziali nella bridge.
+        """
+        try:
+            with self.engine.connect() as connection:
+                self._delete_selected_stages(connection, plan, self._get_bridge_stage_partitions(connection, plan.bridge_table_name))
+                connection.commit()
+            return True
+        except Exception as e_reset:
+            if not self.silent: print(f"ERRORE durante lo svuotamento delle stage {', '.join(plan.source_tables)}: {e_reset}")
+            return False
+
+    def _rollback_failed_stage_rebuild(self, connection, plan, errors):
+        """
+        Con una selezione di stage svuotate nella stessa transazione del ripopolamento, se alcune scritture sono
+        fallite annulla la transazione, così le stage restano com'erano invece che parziali. Restituisce True se ha annullato.
+        """
+        if not errors or plan.stage_selection is None: return False
+        connection.rollback()
+        if not self.silent:
+            print(f"ERRORE: {errors} errori nel ripopolamento delle stage {', '.join(plan.stage_selection)}, transazione "
+                  f"annullata: stage invariate.")
+        return True
+
+    def _iter_backfill_ranges(self, connection, table_name, pk_col_name, backfill_chunk_size, range_low=None):
+        """
+        Intervalli di PK (da_escluso o None, a_incluso) di al massimo backfill_chunk_size righe, calcolati
+        per keyset sull'indice della PK (vale anche per PK non intere e con buchi), a partire da range_low escluso.
+        """
+        q = "`" 
+        while True:
+            where_sql = f" WHERE {q}{pk_col_name}{q} > :range_low" if range_low is not None else ""
+            range_high = connection.execute(text(f"SELECT {q}{pk_col_name}{q} FROM {q}{table_name}{q}{where_sql} "
+                                                 f"ORDER BY {q}{pk_col_name}{q} LIMIT 1 OFFSET :offset"),
+                                            {'range_low': range_low, 'offset': max(1, int(backfill_chunk_size)) - 1}).scalar()
+            if range_high is None:
+                range_high = connection.execute(text(f"SELECT MAX({q}{pk_col_name}{q}) FROM {q}{table_name}{q}{where_sql}"),
+                                                {'range_low': range_low}).scalar()
+                if range_high is not None: yield range_low, range_high
+                return
+            yield range_low, range_high
+            range_low = range_high
+
+    def _get_backfill_update_sql(self, table_name, pk_col_name, source_pbk_col_name, range_low, range_high, literal=False):
+        """UPDATE di backfill della colonna PBK_ per un intervallo di PK (con literal=True i valori sono inline, per --to-sql)."""
+        q = "`" 
+        def value(name, v):
+            if not literal: return f":{name}"
+            return str(sqlalchemy.literal(v).compile(self.engine, compile_kwargs={"literal_binds": True}))
+        conditions = [f"{q}{pk_col_name}{q} <= {value('range_high', range_high)}", f"{q}{source_pbk_col_name}{q} IS NULL"]
+        if range_low is not None:
+            conditions.insert(0, f"{q}{pk_col_name}{q} > {value('range_low', range_low)}")
+        return f"UPDATE {q}{table_name}{q} SET {q}{source_pbk_col_name}{q} = {q}{pk_col_name}{q} WHERE {' AND '.join(conditions)}"
+
+    def _add_source_pbk_column_online(self, connection, table_name, pk_col_name, pk_col_type_sql, backfill_chunk_size, throttle_ms):
+        """Aggiunge PBK_<tabella> con ALGORITHM=INSTANT/INPLACE e la valorizza a blocchi di PK, un commit per blocco."""
+        q = "`" 
+        source_pbk_col_name = f"PBK_{table_name}"
+        existing_columns = {c['name'] for c in self._get_schema_snapshot()['tables'][table_name]['columns']}
+        if source_pbk_col_name in existing_columns:
+            if not self.silent: print(f"    {table_name}: colonna {source_pbk_col_name} già presente, ripresa del backfill.")
+        else:
+            with self._phase("ddl", table_name):
+                for position, algorithm_clause in enumerate(ONLINE_ADD_COLUMN_CLAUSES):
+                    try:
+                        connection.execute(text(f"ALTER TABLE {q}{table_name}{q} ADD COLUMN {q}{source_pbk_col_name}{q} "
+                                                f"{pk_col_type_sql}{algorithm_clause}"))
+                        connection.commit()
+                        if not self.silent: print(f"    {table_name}: colonna {source_pbk_col_name} "
+                                                  f"aggiunta{algorithm_clause.replace(', ', ' con ', 1)}.")
+                        break
+                    except Exception as e_alter:
+                        connection.rollback()
+                        if position == len(ONLINE_ADD_COLUMN_CLAUSES) - 1: raise
+                        if not self.silent: print(f"    {table_name}: ALTER con {algorithm_clause.strip(', ')} non supportato "
+                                                  f"({str(e_alter).splitlines()[0]}), nuovo tentativo.")
+
+        rows_updated = 0
+        chunks = 0
+        with self._phase("backfill", table_name):
+            for range_low, range_high in self._iter_backfill_ranges(connection, table_name, pk_col_name, backfill_chunk_size):
+                result = connection.execute(text(self._get_backfill_update_sql(table_name, pk_col_name, source_pbk_col_name,
+                                                                               range_low, range_high)),
+                                            {'range_low': range_low, 'range_high': range_high})
+                connection.commit()
+                rows_updated += result.rowcount
+                chunks += 1
+                if throttle_ms > 0: time.sleep(throttle_ms / 1000)
+        self._record_rows(table_name, rows_written=rows_updated)
+        if not self.silent: print(f"    {table_name}: valorizzate {rows_updated} righe di {source_pbk_col_name} in {chunks} blocchi.")
+
+    @_with_metrics("create")
+    def create_puppini_bridge(self, bridge_table_name="Puppini_Bridge", to_sql=False, ddl_mode="default", backfill_chunk_size=10000,
+                              throttle_ms=0, partition_by_stage=False, index_pbk=False, row_format=None, narrow_stage=False,
+                              stages=None, exclude_stages=None):
+        """
+        Crea la Puppini Bridge e aggiunge a ogni tabella sorgente la colonna PBK_<tabella> = PK.
+        Con stages/exclude_stages una bridge esistente è adeguata invece che ricreata.
+        Con to_sql=True restituisce gli statement invece di eseguirli.
+        """
+        if ddl_mode not in DDL_MODES:
+            raise ValueError(f"Modalità DDL non supportata: '{ddl_mode}'. Valori ammessi: {', '.join(DDL_MODES)}")
+        if row_format is not None and row_format not in ROW_FORMATS:
+            raise ValueError(f"ROW_FORMAT non supportato: '{row_format}'. Valori ammessi: {', '.join(ROW_FORMATS)}")
+        if not self.silent: print(f"Processo creazione per '{bridge_table_name}' (to_sql={to_sql}, ddl_mode={ddl_mode})...")
         ordered_columns, _, table_details_map, source_tables = self._get_table_analysis_details(bridge_table_name)
+        selected_stages = self._resolve_stage_selection(source_tables, stages, exclude_stages)
+        schema_arg_for_has_table = self.database_name if self.driver == "mysql" else None
+        alter_bridge = selected_stages is not None and sqlalchemy.inspect(self.engine).has_table(bridge_table_name,
+                                                                                                 schema=schema_arg_for_has_table)
+        if selected_stages is not None and not self.silent:
+            print(f"  Stage selezionate: {', '.join(selected_stages) or 'nessuna'}" +
+                  ("." if alter_bridge else f"; '{bridge_table_name}' non esiste e viene creata per intero."))
         
         create_bridge_sql_str = f"-- Nessuna colonna significativa definita per {bridge_table_name}."
+        create_index_sql_list = []
+        alter_bridge_sql_list = []
         if ordered_columns and len(ordered_columns) > 1: 
             local_metadata = MetaData()
             puppini_bridge_table = Table(bridge_table_name, local_metadata, *ordered_columns)
             try:
-                create_bridge_sql_str = str(CreateTable(puppini_bridge_table).compile(self.engine))
-                if not self.silent: print(f"SQL CREATE TABLE generato per '{bridge_table_name}'.")
+                self._apply_bridge_layout(puppini_bridge_table, source_tables, narrow_stage)
+                index_columns = self._get_bridge_index_columns(puppini_bridge_table, partition_by_stage)
+                if alter_bridge:
+                    with self.engine.connect() as alter_connection:
+                        alter_bridge_sql_list, new_columns = self._get_bridge_alter_sql(alter_connection,
+                                                                                        puppini_bridge_table, selected_stages)
+                    index_columns = [column_name for column_name in index_columns if column_name in new_columns]
+                    create_bridge_sql_str = (";\n".join(alter_bridge_sql_list) if alter_bridge_sql_list
+                                             else f"-- Nessuna colonna o partizione da aggiungere a {bridge_table_name}.")
+                else:
+                    create_bridge_sql_str = self._get_bridge_create_sql(puppini_bridge_table, source_tables, partition_by_stage, row_format)
+                if index_pbk:
+                    create_index_sql_list = self._get_bridge_index_sql(puppini_bridge_table, index_columns)
+                if not self.silent: print(f"SQL {'ALTER' if alter_bridge else 'CREATE'} TABLE generato per '{bridge_table_name}'.")
             except Exception as e:
                 if not self.silent: print(f"Errore durante la generazione di CREATE TABLE SQL: {e}")
                 create_bridge_sql_str = f"-- ERRORE nella generazione di CREATE TABLE SQL: {e}"
@@ -181,8 +696,11 @@ class PuppiniBridgeManager:
             print(f"AVVISO: Nessuna colonna significativa (oltre a Stage) definita per '{bridge_table_name}'.")
 
         modify_source_sql_commands_list = []
+        online_source_columns = []
         if not self.silent: print("  Generazione SQL per aggiungere colonne PBK_ alle tabelle sorgente...")
+        schema_tables = self._get_schema_snapshot()['tables'] if selected_stages is not None else {}
         for table_name in source_tables:
+            if selected_stages is not None and table_name not in selected_stages: continue
             details = table_details_map.get(table_name)
             if details and details.get('pk_name') and details.get('pk_type'):
                 pk_col_name = details['pk_name']
@@ -190,14 +708,45 @@ class PuppiniBridgeManager:
                 try:
                     pk_col_type_sql = str(pk_col_type_obj.compile(dialect=self.engine.dialect))
                     source_pbk_col_name = f"PBK_{table_name}"
+                    # Solo con una selezione di stage: una sorgente che ha già PBK_ viene riallineata
+                    # invece di ricevere un secondo ADD COLUMN.
+                    source_has_pbk = source_pbk_col_name in {c['name'] for c in schema_tables.get(table_name, {}).get('columns', [])}
                     
                     q = "`" # Default per MySQL
 
+                    if ddl_mode == "online":
+                        # Eseguita a blocchi più sotto; con to_sql gli UPDATE per intervallo di PK sono generati qui.
+                        online_source_columns.append((table_name, pk_col_name, pk_col_type_sql))
+                        if to_sql:
+                            modify_source_sql_commands_list.append(f"-- Comandi per la tabella {table_name} (se ALGORITHM=INSTANT non è "
+                                                                   f"supportato: ALGORITHM=INPLACE, LOCK=NONE)")
+                            if not source_has_pbk:
+                                modify_source_sql_commands_list.append(
+                                    f"ALTER TABLE {q}{table_name}{q} ADD COLUMN {q}{source_pbk_col_name}{q} "
+                                    f"{pk_col_type_sql}{ONLINE_ADD_COLUMN_CLAUSES[0]};")
+                            with self.engine.connect() as range_connection:
+                                for range_low, range_high in self._iter_backfill_ranges(range_connection, table_name,
+                                                                                        pk_col_name, backfill_chunk_size):
+                                    modify_source_sql_commands_list.append(self._get_backfill_update_sql(
+                                        table_name, pk_col_name, source_pbk_col_name, range_low, range_high, literal=True) + ";")
+                                    modify_source_sql_commands_list.append("COMMIT;")
+                        continue
+                    if ddl_mode == "generated":
+                        if source_has_pbk:
+                            modify_source_sql_commands_list.append(f"-- {table_name}: colonna generata {source_pbk_col_name} già presente")
+                            continue
+                        sql_add_col = (f"ALTER TABLE {q}{table_name}{q} ADD COLUMN {q}{source_pbk_col_name}{q} {pk_col_type_sql} "
+                                       f"GENERATED ALWAYS AS ({q}{pk_col_name}{q}) STORED;")
+                        modify_source_sql_commands_list.append(f"-- Comandi per la tabella {table_name}")
+                        modify_source_sql_commands_list.append(sql_add_col)
+                        continue
+
                     sql_add_col = f"ALTER TABLE {q}{table_name}{q} ADD COLUMN {q}{source_pbk_col_name}{q} {pk_col_type_sql};"
                     sql_update_col = f"UPDATE {q}{table_name}{q} SET {q}{source_pbk_col_name}{q} = {q}{pk_col_name}{q};"
                     
                     modify_source_sql_commands_list.append(f"-- Comandi per la tabella {table_name}")
-                    modify_source_sql_commands_list.append(sql_add_col)
+                    if not source_has_pbk:
+                        modify_source_sql_commands_list.append(sql_add_col)
                     modify_source_sql_commands_list.append(sql_update_col)
                 except Exception as e_compile_type:
                      if not self.silent: print(f"    ERRORE durante la compilazione del tipo per PK di {table_name}: {e_compile_type}")
@@ -205,6 +754,7 @@ class PuppiniBridgeManager:
         if to_sql:
             return {
                 'create_bridge_sql': create_bridge_sql_str,
+                'create_index_sql': create_index_sql_list,
                 'modify_source_tables_sql': modify_source_sql_commands_list
             }
         else: 
@@ -212,25 +762,38 @@ class PuppiniBridgeManager:
             try:
                 with self.engine.connect() as connection:
                     q_ident = "`" 
-                    
-                    schema_arg_for_has_table = self.database_name if self.driver == "mysql" else None
 
-                    if sqlalchemy.inspect(self.engine).has_table(bridge_table_name, schema=schema_arg_for_has_table):
-                        if not self.silent: print(f"  Tabella '{bridge_table_name}' esistente. Eliminazione...")
-                        connection.execute(text(f"DROP TABLE IF EXISTS {q_ident}{bridge_table_name}{q_ident}")) 
-                        if not self.silent: print(f"  Tabella '{bridge_table_name}' eliminata.")
-                    
-                    if not create_bridge_sql_str.startswith("--"):
-                        if not self.silent: print(f"  Creazione tabella '{bridge_table_name}'...")
-                        connection.execute(text(create_bridge_sql_str))
-                        if not self.silent: print(f"  Tabella '{bridge_table_name}' creata.")
-                    elif not self.silent:
-                        print(f"  SQL per creare '{bridge_table_name}' non valido, saltato.")
+                    if alter_bridge:
+                        if not self.silent: print(f"  Adeguamento di '{bridge_table_name}' ({len(alter_bridge_sql_list)} ALTER TABLE, "
+                                                  f"{len(create_index_sql_list)} indici)...")
+                        for alter_sql in alter_bridge_sql_list + create_index_sql_list:
+                            connection.execute(text(alter_sql))
+                    else:
+                        if sqlalchemy.inspect(self.engine).has_table(bridge_table_name, schema=schema_arg_for_has_table):
+                            if not self.silent: print(f"  Tabella '{bridge_table_name}' esistente. Eliminazione...")
+                            connection.execute(text(f"DROP TABLE IF EXISTS {q_ident}{bridge_table_name}{q_ident}")) 
+                            if not self.silent: print(f"  Tabella '{bridge_table_name}' eliminata.")
+                        # I checkpoint di un populate precedente descrivono la bridge eliminata: --resume ripartirà da zero.
+                        connection.execute(text(f"DROP TABLE IF EXISTS "
+                                                f"{q_ident}{bridge_table_name}{SERVICE_TABLE_SUFFIXES['checkpoint']}{q_ident}"))
+                        
+                        if not create_bridge_sql_str.startswith("--"):
+                            if not self.silent: print(f"  Creazione tabella '{bridge_table_name}'...")
+                            connection.execute(text(create_bridge_sql_str))
+                            for index_sql in create_index_sql_list:
+                                connection.execute(text(index_sql))
+                            if not self.silent: print(f"  Tabella '{bridge_table_name}' creata ({len(create_index_sql_list)} indici).")
+                        elif not self.silent:
+                            print(f"  SQL per creare '{bridge_table_name}' non valido, saltato.")
 
                     if not self.silent: print("  Modifica tabelle sorgenti (aggiunta PBK_)...")
                     for cmd_str in modify_source_sql_commands_list:
                         if not cmd_str.startswith("--"):
                             connection.execute(text(cmd_str))
+                    connection.commit()
+                    for table_name, pk_col_name, pk_col_type_sql in online_source_columns:
+                        self._add_source_pbk_column_online(connection, table_name, pk_col_name, pk_col_type_sql,
+                                                           backfill_chunk_size, throttle_ms)
                     if not self.silent: print("  Modifica tabelle sorgenti completata.")
                     
                     connection.commit()
@@ -240,166 +803,1966 @@ class PuppiniBridgeManager:
                 if not self.silent: print(f"ERRORE durante l'esecuzione diretta di create_puppini_bridge: {e_exec}")
                 return False
 
-    def populate_puppini_bridge(self, bridge_table_name="Puppini_Bridge", to_sql=False):
-        if not self.silent: print(f"Processo popolamento per '{bridge_table_name}' (to_sql={to_sql})...")
+    def _get_reachable_pbk_columns(self, table_name, table_details_map):
+        """Restituisce le colonne PBK_ delle tabelle raggiungibili da table_name seguendo almeno una FK."""
+        reachable_pbk_cols = set()
+        stack = [table_name]
+        seen_tables = set()
+        while stack:
+            current_table = stack.pop()
+            if current_table in seen_tables: continue
+            seen_tables.add(current_table)
+            for fk_info in table_details_map.get(current_table, {}).get('fks', []):
+                reachable_pbk_cols.add(f"PBK_{fk_info['referred_table']}")
+                stack.append(fk_info['referred_table'])
+        return reachable_pbk_cols
+
+    def _build_stage_traversal_paths(self, table_name, table_details_map, bridge_cols_set):
+        """
+        Compila la catena di FK di una tabella sorgente nell'ordine della BFS del popolamento riga per riga.
+        Restituisce (joins, pbk_sources, has_relevant_cycle).
+        """
+        source_details = table_details_map[table_name]
+        root = {'alias': 's', 'table': table_name, 'pk_name': source_details['pk_name'],
+                'parent_alias': None, 'fk_column': None, 'path_tables': {table_name}}
+        nodes = [root]
+        pbk_sources = {}
+        decided_pbk_cols = {f"PBK_{table_name}"}
+        has_relevant_cycle = False
+        queue = deque([root])
+        while queue:
+            node = queue.popleft()
+            node_details = table_details_map.get(node['table'])
+            for fk_info in node_details.get('fks', []):
+                referred_table = fk_info['referred_table']
+                bridge_col_for_fk = f"PBK_{referred_table}"
+                if bridge_col_for_fk in bridge_cols_set and bridge_col_for_fk not in decided_pbk_cols:
+                    # Al primo livello la riga sorgente esiste sempre: la colonna è decisa senza condizioni.
+                    condition_alias = None if node is root else node['alias']
+                    pbk_sources.setdefault(bridge_col_for_fk, []).append((condition_alias, node['alias'], fk_info['column_name']))
+                    if condition_alias is None:
+                        decided_pbk_cols.add(bridge_col_for_fk)
+                referred_details = table_details_map.get(referred_table)
+                if referred_details and referred_details.get('pk_name') and referred_table in node['path_tables']:
+                    # Ciclo: la BFS riga per riga ripasserebbe da referred_table con un altro valore.
+                    # È innocuo solo se tutte le PBK_ raggiungibili da lì sono già decise al primo livello.
+                    reachable_pbk_cols = self._get_reachable_pbk_columns(referred_table, table_details_map) & bridge_cols_set
+                    if not reachable_pbk_cols <= decided_pbk_cols:
+                        has_relevant_cycle = True
+                elif referred_details and referred_details.get('pk_name'):
+                    child = {'alias': f"j{len(nodes)}", 'table': referred_table, 'pk_name': referred_details['pk_name'],
+                             'parent_alias': node['alias'], 'fk_column': fk_info['column_name'],
+                             'path_tables': node['path_tables'] | {referred_table}}
+                    nodes.append(child)
+                    queue.append(child)
+
+        # Si tengono solo i join da cui dipende almeno una colonna PBK_ (e i loro antenati).
+        nodes_by_alias = {n['alias']: n for n in nodes}
+        needed_aliases = {'s'}
+        for sources in pbk_sources.values():
+            for condition_alias, value_alias, _ in sources:
+                for alias in (condition_alias, value_alias):
+                    while alias and alias not in needed_aliases:
+                        needed_aliases.add(alias)
+                        alias = nodes_by_alias[alias]['parent_alias']
+        joins = [{k: v for k, v in n.items() if k != 'path_tables'} for n in nodes if n['alias'] in needed_aliases]
+        return joins, pbk_sources, has_relevant_cycle
+
+    @_with_metrics("plan")
+    def build_population_plan(self, bridge_table_name="Puppini_Bridge", aggregate_stages=None, stages=None, exclude_stages=None):
+        """Compila dall'analisi dello schema il PopulationPlan eseguito da tutti i backend."""
         ordered_columns, bridge_cols_set, table_details_map, source_tables = self._get_table_analysis_details(bridge_table_name)
+        selected_stages = self._resolve_stage_selection(source_tables, stages, exclude_stages)
+        bridge_positions = {column.name: position for position, column in enumerate(ordered_columns)}
 
-        if not ordered_columns or len(ordered_columns) <= 1:
-            if not self.silent: print(f"AVVISO: Struttura di '{bridge_table_name}' non definita correttamente. Popolamento non possibile.")
-            return [f"-- Struttura di {bridge_table_name} non definita correttamente."] if to_sql else False
+        fk_edges = {}
+        for table_name, details in table_details_map.items():
+            edges = []
+            for fk_info in details.get('fks', []):
+                referred_table = fk_info['referred_table']
+                referred_details = table_details_map.get(referred_table)
+                bridge_col_for_fk = f"PBK_{referred_table}"
+                edges.append((fk_info['column_name'], referred_table, bridge_col_for_fk if bridge_col_for_fk in bridge_cols_set else None,
+                              bool(referred_details and referred_details.get('pk_name'))))
+            fk_edges[table_name] = tuple(edges)
+        cyclic_tables = [table_name for table_name in sorted(table_details_map)
+                         if f"PBK_{table_name}" in self._get_reachable_pbk_columns(table_name, table_details_map)]
 
-        local_metadata = MetaData()
-        puppini_bridge_table_obj = Table(bridge_table_name, local_metadata, *ordered_columns) 
-        
+        stages = OrderedDict()
+        for table_name in source_tables:
+            details = table_details_map.get(table_name)
+            if not details or not details.get('pk_name'):
+                stages[table_name] = {'table': table_name, 'populatable': False}
+                continue
+            joins, pbk_sources, has_relevant_cycle = self._build_stage_traversal_paths(table_name, table_details_map, bridge_cols_set)
+            table_abbr = self.get_abbreviation(table_name)
+            numeric_columns = [(f"{table_abbr}_{n}", n) for n in details.get('numerics', []) if f"{table_abbr}_{n}" in bridge_cols_set]
+            own_pbk_column = f"PBK_{table_name}" if f"PBK_{table_name}" in bridge_cols_set else None
+            stage_column_names = {'Stage', f"PBK_{table_name}"} | {bridge_col for bridge_col, _ in numeric_columns} | \
+                                 self._get_reachable_pbk_columns(table_name, table_details_map)
+            bridge_columns = [column.name for column in ordered_columns if column.name in stage_column_names]
+            fk_columns = [edge[0] for edge in fk_edges[table_name]]
+            projected_columns = list(dict.fromkeys([details['pk_name']] + fk_columns + details.get('numerics', [])))
+            source_positions = {name: position for position, name in enumerate(projected_columns)}
+            stages[table_name] = {
+                'table': table_name,
+                'populatable': True,
+                'pk_name': details['pk_name'],
+                'own_pbk_column': own_pbk_column,
+                'bridge_columns': bridge_columns,
+                'column_positions': {name: bridge_positions[name] for name in bridge_columns},
+                'projected_columns': projected_columns,
+                'source_positions': source_positions,
+                'fk_columns': fk_columns,
+                'numeric_columns': numeric_columns,
+                'row_layout': self._get_stage_row_layout(table_name, details['pk_name'], own_pbk_column, bridge_columns, source_positions,
+                                                         fk_columns, numeric_columns),
+                'joins': joins,
+                'pbk_sources': pbk_sources,
+                'has_relevant_cycle': has_relevant_cycle,
+                'aggregate': None,
+            }
+        for table_name, aggregate_spec in (aggregate_stages or {}).items():
+            if table_name not in stages or not stages[table_name]['populatable']:
+                raise ValueError(f"Stage da aggregare non valida: '{table_name}' non è una tabella sorgente con PK.")
+            stages[table_name]['aggregate'] = self._get_stage_aggregate(table_name, stages[table_name], aggregate_spec)
+        plan = PopulationPlan(bridge_table_name, ordered_columns, bridge_cols_set, table_details_map, source_tables,
+                              fk_edges, stages, cyclic_tables,
+                              dialect=self.engine.dialect)
+        return plan.select_stages(selected_stages) if selected_stages is not None else plan
+
+    def _resolve_stage_selection(self, source_tables, stages=None, exclude_stages=None):
+        """
+        Stage selezionate da stages (solo queste) ed exclude_stages (tutte tranne queste), nell'ordine di source_tables;
+        None se nessuna delle due è indicata. I nomi che non sono tabelle sorgente sollevano ValueError.
+        """
+        if not stages and not exclude_stages: return None
+        unknown_stages = [name for name in list(stages or []) + list(exclude_stages or []) if name not in source_tables]
+        if unknown_stages:
+            raise ValueError(f"Stage non valide: {', '.join(unknown_stages)}. Tabelle sorgente: {', '.join(source_tables)}")
+        return [table_name for table_name in source_tables
+                if (not stages or table_name in stages) and table_name not in (exclude_stages or [])]
+
+    def _get_stage_aggregate(self, table_name, stage, aggregate_spec):
+        """
+        Valida l'aggregazione di una stage (colonne PBK_ di raggruppamento e misure sum/count).
+        Restituisce il dict aggregate del piano (group_by, measures, columns).
+        """
+        if isinstance(aggregate_spec, dict):
+            group_by, measure_functions = list(aggregate_spec.get('group_by') or []), dict(aggregate_spec.get('measures') or {})
+        else:
+            group_by, measure_functions = list(aggregate_spec or []), {}
+        if not group_by:
+            raise ValueError(f"Aggregazione di '{table_name}': indicare almeno una colonna PBK_ di raggruppamento.")
+        invalid_columns = [name for name in group_by if not name.startswith("PBK_") or name not in stage['bridge_columns']]
+        if invalid_columns:
+            allowed_columns = ', '.join(name for name in stage['bridge_columns'] if name.startswith('PBK_'))
+            raise ValueError(f"Aggregazione di '{table_name}': colonne di raggruppamento non valide {invalid_columns} "
+                             f"(ammesse le PBK_ della stage: {allowed_columns}).")
+        numeric_bridge_columns = [bridge_col for bridge_col, _ in stage['numeric_columns']]
+        invalid_measures = [name for name in measure_functions if name not in numeric_bridge_columns]
+        if invalid_measures:
+            raise ValueError(f"Aggregazione di '{table_name}': misure non valide {invalid_measures} "
+                             f"(ammesse: {', '.join(numeric_bridge_columns) or 'nessuna'}).")
+        invalid_functions = sorted({function for function in measure_functions.values() if function not in AGGREGATE_FUNCTIONS})
+        if invalid_functions:
+            raise ValueError(f"Aggregazione di '{table_name}': funzioni non supportate {invalid_functions}. Valori ammessi: "
+                             f"{', '.join(AGGREGATE_FUNCTIONS)}")
+        measures = [(name, measure_functions.get(name, "sum")) for name in numeric_bridge_columns]
+        return {'group_by': group_by, 'measures': measures, 'columns': ['Stage'] + group_by + [name for name, _ in measures]}
+
+    def _iter_stage_output_rows(self, plan, table_name, bridge_rows):
+        """
+        Colonne e righe che una stage scrive nella bridge: le righe bridge (nell'ordine di bridge_columns) così come sono,
+        o per una stage aggregata le righe raggruppate in memoria da _aggregate_bridge_rows.
+        """
+        stage = plan.stages[table_name]
+        if not stage['aggregate']:
+            return stage['bridge_columns'], bridge_rows
+        return stage['aggregate']['columns'], _aggregate_bridge_rows(bridge_rows, stage['bridge_columns'], stage['aggregate'])
+
+    def _get_stage_row_layout(self, table_name, pk_name, own_pbk_column, bridge_columns, source_positions, fk_columns, numeric_columns):
+        """Indici precalcolati con cui una riga sorgente diventa una riga bridge."""
+        stage_positions = {name: position for position, name in enumerate(bridge_columns)}
+        return {
+            'template': tuple(table_name if name == 'Stage' else None for name in bridge_columns),
+            'pk_index': source_positions[pk_name],
+            'own_pbk_position': stage_positions.get(own_pbk_column),
+            'numeric_positions': [(stage_positions[bridge_col], source_positions[numeric_col])
+                                  for bridge_col, numeric_col in numeric_columns],
+            'fk_indexes': [source_positions[fk_column] for fk_column in fk_columns],
+            'pbk_positions': {name: position for name, position in stage_positions.items()
+                              if name.startswith("PBK_") and name != f"PBK_{table_name}"},
+        }
+
+    def _get_source_range_conditions(self, source_alias, source_range):
+        """
+        Condizioni SQLAlchemy per le righe di source_alias con la colonna di source_range in (da_escluso, a_incluso],
+        dove un estremo None non pone limiti da quel lato, o con source_range=(colonna, valori) tra i valori indicati.
+        """
+        if len(source_range) == 2:
+            return [source_alias.c[source_range[0]].in_(source_range[1])]
+        range_column, range_low, range_high = source_range
+        conditions = []
+        if range_high is not None:
+            conditions.append(source_alias.c[range_column] <= range_high)
+        if range_low is not None:
+            conditions.append(source_alias.c[range_column] > range_low)
+        return conditions
+
+    def _build_set_based_select(self, plan, table_name, source_range=None):
+        """
+        SELECT ... FROM stage LEFT JOIN ... delle righe bridge di una tabella sorgente, limitato a source_range.
+        Restituisce (colonne_bridge, select).
+        """
+        stage = plan.stages[table_name]
+        joins, pbk_sources = stage['joins'], stage['pbk_sources']
+        numeric_source_by_bridge_col = dict(stage['numeric_columns'])
+
+        needed_columns = {join['alias']: [join['pk_name']] for join in joins}
+        for join in joins[1:]:
+            needed_columns[join['parent_alias']].append(join['fk_column'])
+        for sources in pbk_sources.values():
+            for _, value_alias, value_column in sources:
+                needed_columns[value_alias].append(value_column)
+        needed_columns['s'].extend(numeric_source_by_bridge_col.values())
+        if source_range:
+            needed_columns['s'].append(source_range[0])
+
+        aliases = {}
+        for join in joins:
+            unique_columns = list(dict.fromkeys(needed_columns[join['alias']]))
+            aliases[join['alias']] = sqlalchemy.table(join['table'], *(sqlalchemy.column(c) for c in unique_columns)).alias(join['alias'])
+
+        from_clause = aliases['s']
+        for join in joins[1:]:
+            joined = aliases[join['alias']]
+            from_clause = from_clause.outerjoin(joined, joined.c[join['pk_name']] == aliases[join['parent_alias']].c[join['fk_column']])
+
+        pk_names_by_alias = {join['alias']: join['pk_name'] for join in joins}
+        target_columns = []
+        select_exprs = []
+        for bridge_col in plan.bridge_table.columns:
+            col_name = bridge_col.name
+            if col_name == 'Stage':
+                expr = sqlalchemy.literal(table_name, type_=bridge_col.type)
+            elif col_name == stage['own_pbk_column']:
+                expr = aliases['s'].c[stage['pk_name']]
+            elif col_name in pbk_sources:
+                sources = pbk_sources[col_name]
+                if sources[0][0] is None:
+                    # FK diretta della stage: è sempre la prima sorgente e l'unica.
+                    expr = aliases[sources[0][1]].c[sources[0][2]]
+                else:
+                    # Vince il primo cammino (in ordine BFS) il cui join ha trovato la riga, anche se il valore è NULL.
+                    expr = sqlalchemy.case(*(
+                        (aliases[condition_alias].c[pk_names_by_alias[condition_alias]].is_not(None), aliases[value_alias].c[value_column])
+                        for condition_alias, value_alias, value_column in sources))
+            else:
+                numeric_col_name = numeric_source_by_bridge_col.get(col_name)
+                if numeric_col_name is None:
+                    continue
+                expr = aliases['s'].c[numeric_col_name]
+            target_columns.append(bridge_col)
+            select_exprs.append(expr)
+
+        aggregate = stage['aggregate']
+        if aggregate:
+            select_exprs = [expr.label(bridge_col.name) for bridge_col, expr in zip(target_columns, select_exprs)]
+        select_stmt = sqlalchemy.select(*select_exprs).select_from(from_clause)
+        if source_range:
+            select_stmt = select_stmt.where(*self._get_source_range_conditions(aliases['s'], source_range))
+        if not aggregate:
+            return target_columns, select_stmt
+
+        # Stage aggregata: il GROUP BY lo esegue il DB sulle righe bridge calcolate dal SELECT della stage.
+        bridge_rows = select_stmt.subquery('b')
+        measure_functions = dict(aggregate['measures'])
+        aggregate_exprs = []
+        for col_name in aggregate['columns']:
+            if col_name == 'Stage':
+                aggregate_exprs.append(sqlalchemy.literal(table_name, type_=plan.bridge_table.c['Stage'].type))
+            elif col_name in measure_functions:
+                aggregate_exprs.append(getattr(sqlalchemy.func, measure_functions[col_name])(bridge_rows.c[col_name]))
+            else:
+                aggregate_exprs.append(bridge_rows.c[col_name])
+        aggregate_select = sqlalchemy.select(*aggregate_exprs).group_by(*(bridge_rows.c[col_name] for col_name in aggregate['group_by']))
+        return [plan.bridge_table.c[col_name] for col_name in aggregate['columns']], aggregate_select
+
+    def _build_set_based_insert(self, plan, table_name, source_range=None):
+        """INSERT INTO ... SELECT di una tabella sorgente (vedi _build_set_based_select)."""
+        target_columns, select_stmt = self._build_set_based_select(plan, table_name, source_range)
+        return plan.bridge_table.insert().from_select(target_columns, select_stmt)
+
+    def _get_set_based_statements(self, plan, as_select=False):
+        """Lista (tabella_sorgente, INSERT ... SELECT) delle stage popolabili; None per quelle con un ciclo rilevante."""
+        statements = []
+        for table_name in plan.source_tables:
+            if not self._is_populatable_stage(plan, table_name): continue
+            if plan.stages[table_name]['has_relevant_cycle']:
+                # Un join a profondità fissa non riproduce la risalita di una gerarchia ricorsiva:
+                # per questa stage si resta sulla BFS riga per riga, che dà il risultato esatto.
+                if not self.silent: print(f"    AVVISO: ciclo nel grafo delle FK raggiungibile da {table_name}, popolamento riga per riga.")
+                statements.append((table_name, None))
+                continue
+            build_statement = self._build_set_based_select if as_select else self._build_set_based_insert
+            statements.append((table_name, build_statement(plan, table_name)))
+        return statements
+
+    def _populate_set_based(self, plan, dimension_cache_mb=256, preload_dimensions=False, batch_size=1000, read_chunk_size=10000):
+        """
+        Popolamento lato server: un solo INSERT ... SELECT per tabella sorgente, i join li esegue il DB.
+        Esegue gli statement e restituisce True/False.
+        """
+        bridge_table_name = plan.bridge_table_name
+        statements = self._get_set_based_statements(plan)
+        dimension_cache = None
+        errors = 0
+        with self.engine.connect() as connection:
+            if plan.stage_selection is not None: self._delete_selected_stages(connection, plan)
+            for table_name, stmt in statements:
+                if stmt is None:
+                    if dimension_cache is None:
+                        dimension_cache = self._create_dimension_cache(connection, plan, dimension_cache_mb, preload_dimensions)
+                    bridge_writer = self._create_bridge_writer(connection, plan, batch_size)
+                    self._write_stage_row_by_row(connection, plan, table_name, dimension_cache, bridge_writer, read_chunk_size)
+                    errors += bridge_writer.errors
+                    continue
+                if not self.silent: print(f"  Popolamento set-based da tabella sorgente: {table_name}")
+                try:
+                    with self._stage(table_name), self._phase("insert", table_name):
+                        result = connection.execute(stmt)
+                    self._record_rows(table_name, rows_written=result.rowcount)
+                    if not self.silent: print(f"    Inserite {result.rowcount} righe da {table_name}.")
+                except Exception as e_pop:
+                    errors += 1
+                    if not self.silent: print(f"    ERRORE durante INSERT ... SELECT da {table_name}: {e_pop}")
+            if dimension_cache is not None: self._report_dimension_cache(dimension_cache.stats())
+            if self._rollback_failed_stage_rebuild(connection, plan, errors): return False
+            try:
+                with self._phase("commit"):
+                    connection.commit()
+            except Exception as e_commit:
+                if not self.silent: print(f"ERRORE durante il commit del popolamento di '{bridge_table_name}': {e_commit}")
+                return False
+        if not self.silent: print(f"Popolamento set-based di '{bridge_table_name}' completato ({errors} tabelle con errori).")
+        return errors == 0
+
+    def _create_dimension_cache(self, connection, plan, dimension_cache_mb, preload_dimensions, preloaded_rows=None):
+        """
+        Crea la cache delle catene di dimensioni per un run, precaricando le dimensioni se richiesto.
+        preloaded_rows permette di condividere (in sola lettura) le dimensioni già precaricate da un'altra cache.
+        """
+        dimension_cache = _DimensionChainCache(connection, plan, max_mb=dimension_cache_mb, silent=self.silent)
+        if preloaded_rows is not None:
+            dimension_cache.preloaded_rows = preloaded_rows
+        elif preload_dimensions:
+            referred_tables = sorted({edge[1] for edges in plan.fk_edges.values() for edge in edges})
+            if not self.silent: print(f"  Precaricamento di {len(referred_tables)} tabelle di dimensione...")
+            dimension_cache.preload_tables(referred_tables)
+        return dimension_cache
+
+    def _report_dimension_cache(self, dimension_cache_stats):
+        self.last_dimension_cache_stats = dimension_cache_stats
+        if self._active_metrics is not None: self._active_metrics.dimension_cache = dict(dimension_cache_stats)
+        if not self.silent:
+            stats = self.last_dimension_cache_stats
+            print(f"  Cache catene dimensioni: {stats['hits']} hit, {stats['misses']} miss, {stats['evictions']} rimozioni LRU, "
+                  f"{stats['entries']} voci (~{stats['approx_bytes'] / (1024 * 1024):.1f} MB), {stats['queries']} query.")
+
+    def _get_max_packet_bytes(self, connection):
+        """Restituisce max_allowed_packet del server MySQL, None per gli altri driver o se non leggibile."""
+        if self.driver != "mysql": return None
+        try:
+            return int(connection.execute(text("SELECT @@max_allowed_packet")).scalar())
+        except Exception as e_packet:
+            if not self.silent: print(f"  AVVISO: impossibile leggere max_allowed_packet: {e_packet}")
+            return None
+
+    def _create_bridge_writer(self, connection, plan, batch_size):
+        max_packet_bytes = self._get_max_packet_bytes(connection)
+        return _BridgeRowWriter(connection, plan.bridge_table, batch_size=batch_size, max_packet_bytes=max_packet_bytes, silent=self.silent,
+                                metrics=self._active_metrics)
+
+    def _is_populatable_stage(self, plan, table_name):
+        if not plan.stages[table_name]['populatable']:
+            if not self.silent: print(f"    Tabella {table_name} non ha PK o dettagli, saltata.")
+            return False
+        return True
+
+    def _iter_stage_source_chunks(self, connection, plan, table_name, read_chunk_size=10000, source_range=None, prefetch_chunks=0):
+        """
+        Legge in streaming le colonne proiettate di una tabella sorgente, a blocchi di read_chunk_size righe.
+        source_range limita le righe lette; con prefetch_chunks > 0 la lettura avviene in un thread.
+        """
+        if prefetch_chunks > 0:
+            yield from _iter_in_thread(lambda: self._iter_stage_source_chunks(None, plan, table_name, read_chunk_size,
+                                                                              source_range), prefetch_chunks)
+            return
         q = "`" 
+        select_columns = ", ".join(f"{q}{c}{q}" for c in plan.stages[table_name]['projected_columns'])
+        where_sql, where_params = "", {}
+        if source_range and len(source_range) == 2:
+            where_sql = f" WHERE {q}{source_range[0]}{q} IN :range_values"
+            where_params['range_values'] = list(source_range[1])
+        elif source_range:
+            range_column, range_low, range_high = source_range
+            conditions = []
+            if range_high is not None:
+                conditions.append(f"{q}{range_column}{q} <= :range_high")
+                where_params['range_high'] = range_high
+            if range_low is not None:
+                conditions.append(f"{q}{range_column}{q} > :range_low")
+                where_params['range_low'] = range_low
+            if conditions: where_sql = " WHERE " + " AND ".join(conditions)
+        rows_read = 0
+        read_seconds = 0.0
+        read_connection = self._connect_read_only() if self.driver == "mysql" or connection is None else None
+        try:
+            started = time.perf_counter()
+            select_stmt = sqlalchemy.text(f"SELECT {select_columns} FROM {q}{table_name}{q}{where_sql}")
+            if 'range_values' in where_params:
+                select_stmt = select_stmt.bindparams(sqlalchemy.bindparam('range_values', expanding=True))
+            result = (read_connection or connection).execution_options(stream_results=True, yield_per=read_chunk_size).execute(
+                select_stmt, where_params)
+            partitions = result.partitions(read_chunk_size)
+            while True:
+                source_rows = next(partitions, None)
+                read_seconds += time.perf_counter() - started
+                if source_rows is None: break
+                rows_read += len(source_rows)
+                yield source_rows
+                started = time.perf_counter()
+        finally:
+            if read_connection is not None: read_connection.close()
+        if self._active_metrics is not None:
+            self._active_metrics.add_phase("read", read_seconds, table_name)
+            self._active_metrics.add_rows(table_name, rows_read=rows_read)
+        if not self.silent: print(f"    Lette {rows_read} righe da {table_name}.")
 
-        compiled_insert_sql_list = []
+    def _iter_stage_bridge_rows(self, connection, plan, table_name, dimension_cache, read_chunk_size=10000,
+                                source_range=None, prefetch_chunks=0):
+        """Genera in streaming le righe bridge di una stage, risolvendo le catene di dimensioni con dimension_cache."""
+        row_layout = plan.stages[table_name]['row_layout']
+        row_template = list(row_layout['template'])
+        pk_index = row_layout['pk_index']
+        own_pbk_position = row_layout['own_pbk_position']
+        numeric_positions = row_layout['numeric_positions']
+        fk_indexes = row_layout['fk_indexes']
+        pbk_positions = row_layout['pbk_positions']
+        compose = dimension_cache.compose
+        perf_counter = time.perf_counter
+        traverse_seconds = 0.0
 
-        with self.engine.connect() as connection: 
-            for table_name in source_tables:
-                if not self.silent: print(f"  Preparazione dati da tabella sorgente: {table_name}")
-                source_table_details = table_details_map.get(table_name)
-                if not source_table_details or not source_table_details.get('pk_name'):
-                    if not self.silent: print(f"    Tabella {table_name} non ha PK o dettagli, saltata.")
+        for source_rows in self._iter_stage_source_chunks(connection, plan, table_name, read_chunk_size, source_range, prefetch_chunks):
+            for source_row in source_rows:
+                bridge_row = row_template.copy()
+                current_row_pk_value = source_row[pk_index]
+                if own_pbk_position is not None:
+                    bridge_row[own_pbk_position] = current_row_pk_value
+                for stage_position, source_index in numeric_positions:
+                    bridge_row[stage_position] = source_row[source_index]
+
+                started = perf_counter()
+                resolved_pbk_values, _ = compose(table_name, [source_row[fk_index] for fk_index in fk_indexes],
+                                                 {(table_name, current_row_pk_value)})
+                traverse_seconds += perf_counter() - started
+                for bridge_col_name, (_, pbk_value) in resolved_pbk_values.items():
+                    stage_position = pbk_positions.get(bridge_col_name)
+                    if stage_position is not None:
+                        bridge_row[stage_position] = pbk_value
+                yield bridge_row
+        if self._active_metrics is not None: self._active_metrics.add_phase("traverse", traverse_seconds, table_name)
+
+    def _write_stage_row_by_row(self, connection, plan, table_name, dimension_cache, bridge_writer,
+                                read_chunk_size=10000, source_range=None,
+                                prefetch_chunks=0):
+        """
+        Pipeline di esecuzione diretta per una stage: le righe generate vanno al bridge_writer
+        (_BridgeRowWriter o _PipelinedBridgeWriter) senza compilare SQL con literal e senza conservarle in liste.
+        """
+        if not self.silent: print(f"  Preparazione dati da tabella sorgente: {table_name}")
+        if not self._is_populatable_stage(plan, table_name): return
+
+        with self._stage(table_name):
+            bridge_rows = self._iter_stage_bridge_rows(connection, plan, table_name, dimension_cache, read_chunk_size,
+                                                       source_range, prefetch_chunks)
+            output_columns, output_rows = self._iter_stage_output_rows(plan, table_name, bridge_rows)
+            bridge_writer.start_stage(table_name, output_columns)
+            rows_written_before = bridge_writer.rows_written
+            for bridge_row in output_rows:
+                bridge_writer.add(bridge_row)
+            bridge_writer.flush()
+        if not self.silent: print(f"    Scritte {bridge_writer.rows_written - rows_written_before} righe in blocchi da max "
+                                  f"{bridge_writer.rows_per_batch}.")
+
+    def _get_vectorized_dimension_tables(self, plan, table_names):
+        """Tabelle di dimensione raggiunte dai join delle stage indicate (da caricare in forma colonnare)."""
+        return sorted({join['table'] for table_name in table_names for join in plan.stages[table_name]['joins'][1:]})
+
+    def _create_columnar_dimensions(self, connection, plan, table_names):
+        """Carica in forma colonnare le dimensioni necessarie alle stage indicate."""
+        columnar_dimensions = _ColumnarDimensions(connection, plan, silent=self.silent)
+        dimension_tables = self._get_vectorized_dimension_tables(plan, table_names)
+        with self._phase("load_dimensions"):
+            columnar_dimensions.load_tables(dimension_tables)
+        if not self.silent: print(f"  Caricate in forma colonnare {len(dimension_tables)} tabelle di dimensione "
+                                  f"({columnar_dimensions.rows_loaded} righe).")
+        return columnar_dimensions
+
+    def _iter_stage_bridge_columns(self, connection, plan, table_name, columnar_dimensions, read_chunk_size=10000, source_range=None,
+                                   prefetch_chunks=0):
+        """Trasforma la stage a blocchi con lookup vettoriali, restituendo (dict colonna -> array, righe)."""
+        stage = plan.stages[table_name]
+        joins, pbk_sources = stage['joins'], stage['pbk_sources']
+        source_positions = stage['source_positions']
+        traverse_seconds = 0.0
+
+        for source_rows in self._iter_stage_source_chunks(connection, plan, table_name, read_chunk_size, source_range, prefetch_chunks):
+            started = time.perf_counter()
+            row_count = len(source_rows)
+            source_columns = [_to_object_array(values) for values in zip(*source_rows)]
+            positions_by_alias = {}
+            arrays_by_alias = {}
+
+            def take(alias, column_name):
+                if alias == 's': return source_columns[source_positions[column_name]]
+                positions = positions_by_alias[alias]
+                values = np.full(row_count, None, dtype=object)
+                found = positions >= 0
+                values[found] = arrays_by_alias[alias][column_name][positions[found]]
+                return values
+
+            for join in joins[1:]:
+                key_index, arrays_by_alias[join['alias']] = columnar_dimensions.table(join['table'])
+                positions_by_alias[join['alias']] = key_index.lookup(take(join['parent_alias'], join['fk_column']))
+
+            column_arrays = {'Stage': itertools.repeat(table_name, row_count)}
+            if stage['own_pbk_column'] is not None:
+                column_arrays[stage['own_pbk_column']] = source_columns[source_positions[stage['pk_name']]]
+            for bridge_col_name, numeric_col_name in stage['numeric_columns']:
+                column_arrays[bridge_col_name] = source_columns[source_positions[numeric_col_name]]
+            for bridge_col_name, sources in pbk_sources.items():
+                if sources[0][0] is None:
+                    column_arrays[bridge_col_name] = take(sources[0][1], sources[0][2])
                     continue
-                
-                source_table_pk_name = source_table_details['pk_name']
-                result = connection.execute(sqlalchemy.text(f"SELECT * FROM {q}{table_name}{q}"))
-                source_rows = result.mappings().all()
-                if not self.silent: print(f"    Lette {len(source_rows)} righe da {table_name}.")
-
-                for i, source_row_data in enumerate(source_rows):
-                    insert_values_for_bridge = {'Stage': table_name}
-                    current_row_pk_value = source_row_data.get(source_table_pk_name)
-                    bridge_pk_col_for_source = f"PBK_{table_name}"
-                    if bridge_pk_col_for_source in bridge_cols_set:
-                        insert_values_for_bridge[bridge_pk_col_for_source] = current_row_pk_value
-
-                    table_abbr = self.get_abbreviation(table_name) 
-                    for numeric_col_name in source_table_details.get('numerics', []):
-                        numeric_value = source_row_data.get(numeric_col_name)
-                        bridge_numeric_col_name = f"{table_abbr}_{numeric_col_name}"
-                        if bridge_numeric_col_name in bridge_cols_set:
-                            insert_values_for_bridge[bridge_numeric_col_name] = numeric_value
-                    
-                    populated_pbk_cols_for_this_bridge_row = {bridge_pk_col_for_source} 
-                    queue = deque()
-                    for fk_info in source_table_details.get('fks', []):
-                        fk_col_name_in_source = fk_info['column_name']
-                        referred_table = fk_info['referred_table']
-                        fk_value_in_source_row = source_row_data.get(fk_col_name_in_source)
-                        bridge_col_for_fk = f"PBK_{referred_table}"
-                        if bridge_col_for_fk in bridge_cols_set and bridge_col_for_fk not in populated_pbk_cols_for_this_bridge_row:
-                            insert_values_for_bridge[bridge_col_for_fk] = fk_value_in_source_row
-                            populated_pbk_cols_for_this_bridge_row.add(bridge_col_for_fk)
-                        if fk_value_in_source_row is not None:
-                             referred_table_pk_details = table_details_map.get(referred_table)
-                             if referred_table_pk_details and referred_table_pk_details.get('pk_name'):
-                                queue.append((referred_table, fk_value_in_source_row))
-                                
-                    visited_for_traversal = set() 
-                    while queue:
-                        current_traverse_table_name, current_traverse_pk_value = queue.popleft()
-                        if (current_traverse_table_name, current_traverse_pk_value) in visited_for_traversal: continue
-                        visited_for_traversal.add((current_traverse_table_name, current_traverse_pk_value))
-                        traverse_table_details = table_details_map.get(current_traverse_table_name)
-                        if not traverse_table_details or not traverse_table_details.get('pk_name'): continue
-                        
-                        stmt_text_select = f"SELECT * FROM {q}{current_traverse_table_name}{q} WHERE {q}{traverse_table_details['pk_name']}{q} = :pk_val"
-                        traverse_row_result = connection.execute(text(stmt_text_select), {"pk_val": current_traverse_pk_value})
-                        traverse_row_data = traverse_row_result.mappings().first() 
-
-                        if traverse_row_data:
-                            for fk_info in traverse_table_details.get('fks', []):
-                                fk_col_name_in_traverse = fk_info['column_name']
-                                next_referred_table = fk_info['referred_table']
-                                fk_value_in_traverse_row = traverse_row_data.get(fk_col_name_in_traverse)
-                                bridge_col_for_next_fk = f"PBK_{next_referred_table}"
-                                if bridge_col_for_next_fk in bridge_cols_set and bridge_col_for_next_fk not in populated_pbk_cols_for_this_bridge_row:
-                                    insert_values_for_bridge[bridge_col_for_next_fk] = fk_value_in_traverse_row
-                                    populated_pbk_cols_for_this_bridge_row.add(bridge_col_for_next_fk)
-                                if fk_value_in_traverse_row is not None:
-                                    next_referred_table_pk_details = table_details_map.get(next_referred_table)
-                                    if next_referred_table_pk_details and next_referred_table_pk_details.get('pk_name'):
-                                        if (next_referred_table, fk_value_in_traverse_row) not in visited_for_traversal: 
-                                            queue.append((next_referred_table, fk_value_in_traverse_row))
-                    try:
-                        stmt = puppini_bridge_table_obj.insert().values(**insert_values_for_bridge)
-                        compiled_stmt_str = str(stmt.compile(self.engine, compile_kwargs={"literal_binds": True}))
-                        compiled_insert_sql_list.append(compiled_stmt_str)
-                        
-                        if not to_sql: 
-                            connection.execute(stmt) 
-                    except Exception as e_pop:
-                        error_msg = f"    ERRORE durante preparazione/esecuzione INSERT per riga {i+1} da {table_name}: {e_pop}"
-                        if not self.silent: print(error_msg)
-                        if not self.silent: print(f"      Dati: {insert_values_for_bridge}")
-                        if to_sql: compiled_insert_sql_list.append(f"-- ERRORE: {error_msg}")
-            
-            if not to_sql:
+                values = np.full(row_count, None, dtype=object)
+                decided = np.zeros(row_count, dtype=bool)
+                for condition_alias, value_alias, value_column in sources:
+                    chosen = (positions_by_alias[condition_alias] >= 0) & ~decided
+                    values[chosen] = take(value_alias, value_column)[chosen]
+                    decided |= chosen
+                column_arrays[bridge_col_name] = values
+            traverse_seconds += time.perf_counter() - started
+            yield column_arrays, row_count
+        if self._active_metrics is not None: self._active_metrics.add_phase("traverse", traverse_seconds, table_name)
+
+    def _write_stage_vectorized(self, connection, plan, table_name, columnar_dimensions, bridge_writer,
+                                read_chunk_size=10000, source_range=None,
+                                prefetch_chunks=0):
+        """Pipeline vettoriale di esecuzione diretta per una stage: i blocchi colonnari vanno al bridge_writer."""
+        if not self.silent: print(f"  Preparazione vettoriale dati da tabella sorgente: {table_name}")
+        if not self._is_populatable_stage(plan, table_name): return
+
+        with self._stage(table_name):
+            column_chunks = self._iter_stage_bridge_columns(connection, plan, table_name, columnar_dimensions,
+                                                            read_chunk_size, source_range,
+                                                            prefetch_chunks)
+            if plan.stages[table_name]['aggregate']:
+                # Stage aggregata: i blocchi colonnari già risolti sono raggruppati in memoria invece di essere scritti.
+                bridge_columns = plan.stages[table_name]['bridge_columns']
+                bridge_rows = (bridge_row for column_arrays, row_count in column_chunks
+                               for bridge_row in zip(*(column_arrays[name] if name in column_arrays else itertools.repeat(None, row_count)
+                                                       for name in bridge_columns)))
+                output_columns, output_rows = self._iter_stage_output_rows(plan, table_name, bridge_rows)
+                bridge_writer.start_stage(table_name, output_columns)
+                rows_written_before = bridge_writer.rows_written
+                for bridge_row in output_rows:
+                    bridge_writer.add(bridge_row)
+            else:
+                bridge_writer.start_stage(table_name, plan.stages[table_name]['bridge_columns'])
+                rows_written_before = bridge_writer.rows_written
+                for column_arrays, row_count in column_chunks:
+                    bridge_writer.add_columns(column_arrays, row_count)
+            bridge_writer.flush()
+        if not self.silent: print(f"    Scritte {bridge_writer.rows_written - rows_written_before} righe in blocchi da max "
+                                  f"{bridge_writer.rows_per_batch}.")
+
+    def _populate_vectorized(self, plan, dimension_cache_mb=256, preload_dimensions=False, batch_size=1000, read_chunk_size=10000):
+        """Popolamento vettoriale con dimensioni colonnari; le stage con un ciclo rilevante restano riga per riga."""
+        bridge_table_name = plan.bridge_table_name
+        vectorized_stages = [table_name for table_name in plan.source_tables
+                             if plan.stages[table_name]['populatable'] and not plan.stages[table_name]['has_relevant_cycle']]
+        with self.engine.connect() as connection:
+            if plan.stage_selection is not None: self._delete_selected_stages(connection, plan)
+            columnar_dimensions = self._create_columnar_dimensions(connection, plan, vectorized_stages)
+            dimension_cache = None
+            bridge_writer = self._create_bridge_writer(connection, plan, batch_size)
+            for table_name in plan.source_tables:
+                if table_name in vectorized_stages:
+                    self._write_stage_vectorized(connection, plan, table_name, columnar_dimensions, bridge_writer, read_chunk_size)
+                    continue
+                if plan.stages[table_name]['populatable'] and not self.silent:
+                    print(f"    AVVISO: ciclo nel grafo delle FK raggiungibile da {table_name}, popolamento riga per riga.")
+                if dimension_cache is None:
+                    dimension_cache = self._create_dimension_cache(connection, plan, dimension_cache_mb, preload_dimensions)
+                self._write_stage_row_by_row(connection, plan, table_name, dimension_cache, bridge_writer, read_chunk_size)
+            if dimension_cache is not None: self._report_dimension_cache(dimension_cache.stats())
+            if self._rollback_failed_stage_rebuild(connection, plan, bridge_writer.errors): return False
+            try:
+                with self._phase("commit"):
+                    connection.commit()
+            except Exception as e_commit:
+                if not self.silent: print(f"ERRORE durante il commit del popolamento di '{bridge_table_name}': {e_commit}")
+                return False
+        if not self.silent: print(f"Popolamento vettoriale di '{bridge_table_name}' completato "
+                                  f"({bridge_writer.errors} blocchi con errori).")
+        return bridge_writer.errors == 0
+
+    def _get_checkpoint_table(self, checkpoint_table_name):
+        """Tabella dei checkpoint del populate: per ogni stage l'ultima PK confermata, le righe scritte e se è completata."""
+        return Table(checkpoint_table_name, MetaData(),
+                     Column('Stage', String(255), primary_key=True),
+                     Column('Last_PK', String(255)),
+                     Column('Rows_Written', Integer, nullable=False),
+                     Column('Completed', Boolean, nullable=False),
+                     Column('Updated_At', DateTime))
+
+    def _save_checkpoint(self, connection, checkpoint_table_obj, table_name, last_pk, rows_written, completed):
+        connection.execute(checkpoint_table_obj.delete().where(checkpoint_table_obj.c.Stage == table_name))
+        connection.execute(checkpoint_table_obj.insert().values(Stage=table_name, Last_PK=str(last_pk) if last_pk is not None else None,
+                                                                Rows_Written=rows_written, Completed=completed,
+                                                                Updated_At=sqlalchemy.func.now()))
+
+    def _build_checkpoint_delete(self, plan, table_name, last_pk):
+        """DELETE delle righe bridge della stage oltre l'ultima PK confermata (tutta la stage se last_pk è None)."""
+        bridge_table = plan.bridge_table
+        own_pbk_column = plan.stages[table_name]['own_pbk_column']
+        if last_pk is None or own_pbk_column is None:
+            return self._build_incremental_delete(plan, table_name, None)
+        return bridge_table.delete().where(bridge_table.c['Stage'] == table_name, bridge_table.c[own_pbk_column] > last_pk)
+
+    def _populate_checkpointed(self, plan, strategy="rows", dimension_cache_mb=256, preload_dimensions=False,
+                               batch_size=1000, read_chunk_size=10000,
+                               commit_every=100000, resume=False):
+        """
+        Popolamento con un commit ogni commit_every righe sorgente e un checkpoint per stage.
+        Con resume=True riprende dall'ultimo checkpoint.
+        """
+        bridge_table_name = plan.bridge_table_name
+        checkpoint_table_obj = self._get_checkpoint_table(f"{bridge_table_name}{SERVICE_TABLE_SUFFIXES['checkpoint']}")
+        errors = 0
+        with self.engine.connect() as connection:
+            checkpoint_table_obj.create(connection, checkfirst=True)
+            if resume:
+                checkpoints = {row.Stage: row for row in connection.execute(sqlalchemy.select(checkpoint_table_obj))}
+                if not self.silent: print(f"  Ripresa da checkpoint: "
+                                          f"{sum(1 for row in checkpoints.values() if row.Completed)} stage completate, "
+                                          f"{sum(1 for row in checkpoints.values() if not row.Completed)} in corso.")
+            elif plan.stage_selection is not None:
+                # Stage e checkpoint azzerati con lo stesso commit: se il popolamento si ferma, resume riprende da qui.
+                self._delete_selected_stages(connection, plan, self._get_bridge_stage_partitions(connection, bridge_table_name))
+                connection.execute(checkpoint_table_obj.delete().where(checkpoint_table_obj.c.Stage.in_(plan.stage_selection)))
+                checkpoints = {}
+            else:
+                connection.execute(checkpoint_table_obj.delete())
+                checkpoints = {}
+            connection.commit()
+            dimension_cache = None
+            columnar_dimensions = None
+            for table_name in plan.source_tables:
+                if not self._is_populatable_stage(plan, table_name): continue
+                checkpoint = checkpoints.get(table_name)
+                if checkpoint is not None and checkpoint.Completed:
+                    if not self.silent: print(f"  Stage {table_name}: già completata ({checkpoint.Rows_Written} righe), saltata.")
+                    continue
+                pk_name = plan.stages[table_name]['pk_name']
+                last_pk = checkpoint.Last_PK if checkpoint is not None else None
+                rows_written = checkpoint.Rows_Written if checkpoint is not None else 0
+                use_set_based = strategy == "set" and not plan.stages[table_name]['has_relevant_cycle']
+                use_vectorized = strategy == "vectorized" and not plan.stages[table_name]['has_relevant_cycle']
                 try:
+                    with self._stage(table_name):
+                        if resume:
+                            with self._phase("delete", table_name):
+                                result = connection.execute(self._build_checkpoint_delete(plan, table_name, last_pk))
+                            if not self.silent:
+                                print(f"  Stage {table_name}: ripresa " + (f"dopo {pk_name} = {last_pk}"
+                                                                           if last_pk is not None else "dall'inizio") +
+                                      f", rimosse {result.rowcount} righe bridge di blocchi non confermati.")
+                        bridge_writer = self._create_bridge_writer(connection, plan, batch_size) if not use_set_based else None
+                        if plan.stages[table_name]['aggregate']:
+                            # I gruppi attraversano gli intervalli di PK: la stage aggregata è confermata in un solo blocco.
+                            stage_ranges = [(None, None)]
+                        else:
+                            stage_ranges = self._iter_backfill_ranges(connection, table_name, pk_name, commit_every, last_pk)
+                        for range_low, range_high in stage_ranges:
+                            source_range = (pk_name, range_low, range_high)
+                            if use_set_based:
+                                with self._phase("insert", table_name):
+                                    result = connection.execute(self._build_set_based_insert(plan, table_name, source_range))
+                                self._record_rows(table_name, rows_written=result.rowcount)
+                                chunk_rows_written = result.rowcount
+                            else:
+                                rows_written_before = bridge_writer.rows_written
+                                if use_vectorized:
+                                    if columnar_dimensions is None:
+                                        vectorized_stages = [t for t in plan.source_tables
+                                                             if plan.stages[t]['populatable'] and not plan.stages[t]['has_relevant_cycle']]
+                                        columnar_dimensions = self._create_columnar_dimensions(connection, plan, vectorized_stages)
+                                    self._write_stage_vectorized(connection, plan, table_name, columnar_dimensions, bridge_writer,
+                                                                 read_chunk_size, source_range)
+                                else:
+                                    if dimension_cache is None:
+                                        dimension_cache = self._create_dimension_cache(connection, plan,
+                                                                                       dimension_cache_mb, preload_dimensions)
+                                    self._write_stage_row_by_row(connection, plan, table_name, dimension_cache, bridge_writer,
+                                                                 read_chunk_size, source_range)
+                                if bridge_writer.errors:
+                                    raise RuntimeError(f"{bridge_writer.errors} blocchi di INSERT falliti")
+                                chunk_rows_written = bridge_writer.rows_written - rows_written_before
+                            rows_written += chunk_rows_written
+                            if range_high is None: continue
+                            self._save_checkpoint(connection, checkpoint_table_obj, table_name, range_high, rows_written, False)
+                            with self._phase("commit", table_name):
+                                connection.commit()
+                            last_pk = range_high
+                            if not self.silent: print(f"    Checkpoint {table_name}: {pk_name} fino a {range_high}, "
+                                                      f"{rows_written} righe confermate.")
+                        self._save_checkpoint(connection, checkpoint_table_obj, table_name, last_pk, rows_written, True)
+                        with self._phase("commit", table_name):
+                            connection.commit()
+                except Exception as e_stage:
+                    connection.rollback()
+                    errors += 1
+                    if not self.silent:
+                        print(f"    ERRORE durante il popolamento di {table_name}, checkpoint fermo a " +
+                              (f"{pk_name} = {last_pk}" if last_pk is not None else "inizio stage") + f": {e_stage}")
+            if dimension_cache is not None: self._report_dimension_cache(dimension_cache.stats())
+        if not self.silent:
+            print(f"Popolamento con checkpoint di '{bridge_table_name}' completato ({errors} stage con errori)." +
+                  (" Rieseguire con resume per riprendere dai checkpoint." if errors else ""))
+        return errors == 0
+
+    def _check_pipeline_support(self, connection):
+        """
+        La pipeline legge e scrive in parallelo su connessioni diverse: su SQLite è possibile solo in
+        journal_mode=WAL, perché con il rollback journal la transazione di scrittura blocca le letture.
+        """
+        if self.driver != "sqlite": return True
+        journal_mode = str(connection.exec_driver_sql("PRAGMA journal_mode").scalar()).lower()
+        if journal_mode == "wal": return True
+        if not self.silent: print(f"  AVVISO: la pipeline su SQLite richiede journal_mode=WAL (attuale: {journal_mode}), "
+                                  f"popolamento sequenziale.")
+        return False
+
+    def _populate_pipelined(self, plan, strategy="rows", dimension_cache_mb=256, preload_dimensions=False,
+                            batch_size=1000, read_chunk_size=10000,
+                            pipeline_depth=4):
+        """Popolamento in pipeline lettura -> trasformazione -> scrittura su thread e connessioni distinte."""
+        bridge_table_name = plan.bridge_table_name
+        vectorized_stages = set()
+        if strategy == "vectorized":
+            vectorized_stages = {table_name for table_name in plan.source_tables
+                                 if plan.stages[table_name]['populatable'] and not plan.stages[table_name]['has_relevant_cycle']}
+        with self._connect_read_only() as connection:
+            columnar_dimensions = self._create_columnar_dimensions(connection, plan, vectorized_stages) if vectorized_stages else None
+            dimension_cache = None
+            if any(plan.stages[table_name]['populatable'] and table_name not in vectorized_stages for table_name in plan.source_tables):
+                dimension_cache = self._create_dimension_cache(connection, plan, dimension_cache_mb, preload_dimensions)
+            def create_writer(write_connection):
+                if plan.stage_selection is not None: self._delete_selected_stages(write_connection, plan)
+                return self._create_bridge_writer(write_connection, plan, batch_size)
+
+            bridge_writer = _PipelinedBridgeWriter(self.engine.connect, create_writer, batch_size, pipeline_depth, self._active_metrics)
+            try:
+                for table_name in plan.source_tables:
+                    if table_name in vectorized_stages:
+                        self._write_stage_vectorized(connection, plan, table_name, columnar_dimensions, bridge_writer, read_chunk_size,
+                                                     prefetch_chunks=pipeline_depth)
+                        continue
+                    if strategy == "vectorized" and plan.stages[table_name]['populatable'] and not self.silent:
+                        print(f"    AVVISO: ciclo nel grafo delle FK raggiungibile da {table_name}, popolamento riga per riga.")
+                    self._write_stage_row_by_row(connection, plan, table_name, dimension_cache, bridge_writer, read_chunk_size,
+                                                 prefetch_chunks=pipeline_depth)
+                with self._phase("commit"):
+                    bridge_writer.commit()
+            except Exception as e_pipeline:
+                if not self.silent: print(f"ERRORE durante il popolamento in pipeline di '{bridge_table_name}', scritture "
+                                          f"annullate: {e_pipeline}")
+                return False
+            finally:
+                bridge_writer.close()
+            if dimension_cache is not None: self._report_dimension_cache(dimension_cache.stats())
+        if not self.silent: print(f"Popolamento in pipeline di '{bridge_table_name}' completato.")
+        return True
+
+    def _check_populate_strategy(self, strategy):
+        if strategy not in POPULATE_STRATEGIES:
+            raise ValueError(f"Strategia di popolamento non supportata: '{strategy}'. Valori ammessi: {', '.join(POPULATE_STRATEGIES)}")
+        if strategy == "vectorized" and np is None:
+            raise ImportError("La strategia 'vectorized' richiede NumPy (pip install numpy).")
+
+    def _iter_stage_row_by_row_sql(self, connection, plan, table_name, dimension_cache, batch_size=1000,
+                                   max_packet_bytes=None, read_chunk_size=10000):
+        """Genera gli INSERT multi-riga con literal di una stage, senza eseguirli."""
+        if not self.silent: print(f"  Preparazione dati da tabella sorgente: {table_name}")
+        if not self._is_populatable_stage(plan, table_name): return
+
+        bridge_rows = self._iter_stage_bridge_rows(connection, plan, table_name, dimension_cache, read_chunk_size)
+        stage_columns, output_rows = self._iter_stage_output_rows(plan, table_name, bridge_rows)
+        rows_per_statement = _rows_per_packet(plan.bridge_table, table_name, stage_columns, batch_size, max_packet_bytes)
+        pending_rows = []
+        rows_done = 0
+
+        def compile_pending():
+            try:
+                stmt = plan.bridge_table.insert().values(pending_rows)
+                return str(stmt.compile(self.engine, compile_kwargs={"literal_binds": True}))
+            except Exception as e_pop:
+                error_msg = (f"    ERRORE durante preparazione INSERT per le righe {rows_done + 1}-{rows_done + len(pending_rows)} "
+                             f"da {table_name}: {e_pop}")
+                if not self.silent: print(error_msg)
+                return f"-- ERRORE: {error_msg}"
+
+        yield f"-- Popolamento per la tabella {table_name}"
+        for bridge_row in output_rows:
+            pending_rows.append(dict(zip(stage_columns, bridge_row)))
+            if len(pending_rows) >= rows_per_statement:
+                yield compile_pending()
+                rows_done += len(pending_rows)
+                pending_rows = []
+        if pending_rows:
+            yield compile_pending()
+
+    def iter_populate_sql(self, bridge_table_name="Puppini_Bridge", strategy="rows",
+                          dimension_cache_mb=256, preload_dimensions=False, batch_size=1000, read_chunk_size=10000, aggregate_stages=None,
+                          stages=None, exclude_stages=None, plan=None):
+        """Genera in streaming l'SQL di popolamento come coppie (tabella_sorgente, sql)."""
+        self._check_populate_strategy(strategy)
+        plan = plan or self.build_population_plan(bridge_table_name, aggregate_stages, stages, exclude_stages)
+
+        if not plan.is_valid:
+            if not self.silent: print(f"AVVISO: Struttura di '{plan.bridge_table_name}' non definita correttamente. "
+                                      f"Popolamento non possibile.")
+            yield None, f"-- Struttura di {plan.bridge_table_name} non definita correttamente."
+            return
+
+        if strategy == "set":
+            statements = self._get_set_based_statements(plan)
+        else:
+            statements = [(table_name, None) for table_name in plan.source_tables]
+
+        with self.engine.connect() as connection: 
+            dimension_cache = None
+            max_packet_bytes = self._get_max_packet_bytes(connection)
+            partitions = self._get_bridge_stage_partitions(connection, plan.bridge_table_name) if plan.stage_selection is not None else {}
+            for table_name, stmt in statements:
+                if plan.stage_selection is not None and plan.stages[table_name]['populatable']:
+                    yield table_name, self._get_stage_reset_sql(plan, table_name, partitions)
+                if stmt is not None:
+                    yield table_name, f"-- Popolamento set-based per la tabella {table_name}"
+                    yield table_name, str(stmt.compile(self.engine, compile_kwargs={"literal_binds": True}))
+                    continue
+                if dimension_cache is None:
+                    dimension_cache = self._create_dimension_cache(connection, plan, dimension_cache_mb, preload_dimensions)
+                for sql in self._iter_stage_row_by_row_sql(connection, plan, table_name, dimension_cache, batch_size,
+                                                           max_packet_bytes, read_chunk_size):
+                    yield table_name, sql
+            if dimension_cache is not None: self._report_dimension_cache(dimension_cache.stats())
+
+    @_with_metrics("populate_sql")
+    def write_populate_sql(self, output_path=None, shard_by_stage=False, compress=False, **populate_options):
+        """Scrive in streaming l'SQL di popolamento su stdout o su file e restituisce il numero di statement."""
+        compress = compress or bool(output_path and output_path.endswith(".gz") and not shard_by_stage)
+        if shard_by_stage and not output_path:
+            raise ValueError("shard_by_stage richiede una directory di output (output_path).")
+
+        def open_output(path):
+            if compress: return gzip.open(path, "wt", encoding="utf-8")
+            return open(path, "w", encoding="utf-8")
+
+        statements_written = 0
+        current_stage = None
+        current_file = None
+        shard_index = 0
+        if shard_by_stage:
+            os.makedirs(output_path, exist_ok=True)
+        elif output_path:
+            current_file = open_output(output_path)
+        try:
+            for table_name, sql in self.iter_populate_sql(**populate_options):
+                if shard_by_stage and table_name is not None and table_name != current_stage:
+                    if current_file is not None: current_file.close()
+                    shard_index += 1
+                    current_stage = table_name
+                    current_file = open_output(os.path.join(output_path,
+                                                            f"{shard_index:03d}_{table_name}.sql" + (".gz" if compress else "")))
+                out = current_file if current_file is not None else sys.stdout
+                sql = sql.strip()
+                out.write(sql)
+                if not sql.startswith("--") and not sql.endswith(";"): out.write(";")
+                out.write("\n")
+                if not sql.startswith("--"): statements_written += 1
+        finally:
+            if current_file is not None: current_file.close()
+        if not self.silent: print(f"Scritti {statements_written} comandi SQL di popolamento.")
+        return statements_written
+
+    def _get_stage_chunks(self, connection, plan, table_name, chunk_rows):
+        """Divide una stage in intervalli di PK di al massimo chunk_rows righe: lista di (intervallo o None, righe)."""
+        pk_name = plan.table_details_map[table_name]['pk_name']
+        q = "`" 
+        row_count = connection.execute(text(f"SELECT COUNT(*) FROM {q}{table_name}{q}")).scalar() or 0
+        # I gruppi di una stage aggregata attraversano gli intervalli di PK: la stage resta un solo task.
+        if chunk_rows <= 0 or row_count <= chunk_rows or plan.stages[table_name]['aggregate']:
+            return [(None, row_count)]
+        chunks = []
+        for range_low, range_high in self._iter_backfill_ranges(connection, table_name, pk_name, chunk_rows):
+            chunks.append(((pk_name, range_low, range_high), min(chunk_rows, row_count - len(chunks) * chunk_rows)))
+        return chunks
+
+    def _populate_stage_chunk(self, plan, table_name, source_range, stage_strategy, dimension_cache_mb, preloaded_rows,
+                              batch_size, read_chunk_size,
+                              columnar_dimensions=None):
+        """Popola una stage, o un suo intervallo di PK, con connessione e transazione proprie."""
+        range_label = f" (PK in ({source_range[1]}, {source_range[2]}])" if source_range else ""
+        with self.engine.connect() as connection:
+            if stage_strategy == "vectorized":
+                bridge_writer = self._create_bridge_writer(connection, plan, batch_size)
+                with self._stage(table_name):
+                    self._write_stage_vectorized(connection, plan, table_name, columnar_dimensions, bridge_writer,
+                                                 read_chunk_size, source_range)
+                    if bridge_writer.errors:
+                        raise RuntimeError(f"{bridge_writer.errors} blocchi di INSERT falliti{range_label}")
+                    with self._phase("commit", table_name):
+                        connection.commit()
+                return None
+            if stage_strategy == "set":
+                if not self.silent: print(f"  Popolamento set-based da tabella sorgente: {table_name}{range_label}")
+                with self._stage(table_name):
+                    with self._phase("insert", table_name):
+                        result = connection.execute(self._build_set_based_insert(plan, table_name, source_range))
+                    self._record_rows(table_name, rows_written=result.rowcount)
+                    if not self.silent: print(f"    Inserite {result.rowcount} righe da {table_name}{range_label}.")
+                    with self._phase("commit", table_name):
+                        connection.commit()
+                return None
+            dimension_cache = self._create_dimension_cache(connection, plan, dimension_cache_mb, False, preloaded_rows)
+            bridge_writer = self._create_bridge_writer(connection, plan, batch_size)
+            with self._stage(table_name):
+                self._write_stage_row_by_row(connection, plan, table_name, dimension_cache, bridge_writer, read_chunk_size, source_range)
+                if bridge_writer.errors:
+                    raise RuntimeError(f"{bridge_writer.errors} blocchi di INSERT falliti{range_label}")
+                with self._phase("commit", table_name):
                     connection.commit()
-                    if not self.silent: print(f"Popolamento diretto di '{bridge_table_name}' completato.")
-                    return True
-                except Exception as e_commit:
-                    if not self.silent: print(f"ERRORE durante il commit del popolamento di '{bridge_table_name}': {e_commit}")
-                    return False
-        
+            return dimension_cache.stats()
+
+    def _populate_parallel(self, plan, strategy="rows", workers=4, chunk_rows=1000000, dimension_cache_mb=256, preload_dimensions=False,
+                           batch_size=1000, read_chunk_size=10000):
+        """Popolamento diretto con workers thread: ogni stage o intervallo di PK è un task con connessione propria."""
+        bridge_table_name = plan.bridge_table_name
+        if plan.stage_selection is not None:
+            if not self.silent: print("  AVVISO: con workers le stage sono svuotate prima del ripopolamento e restano "
+                                      "parziali fino al termine.")
+            if not self._reset_selected_stages(plan): return False
+        if strategy == "set":
+            set_based_stages = {table_name for table_name, stmt in self._get_set_based_statements(plan) if stmt is not None}
+        else:
+            set_based_stages = set()
+        if strategy == "vectorized":
+            vectorized_stages = {table_name for table_name in plan.source_tables
+                                 if plan.stages[table_name]['populatable'] and not plan.stages[table_name]['has_relevant_cycle']}
+        else:
+            vectorized_stages = set()
+
+        tasks = []
+        preloaded_rows = None
+        columnar_dimensions = None
+        with self.engine.connect() as connection:
+            for table_name in plan.source_tables:
+                if not self._is_populatable_stage(plan, table_name): continue
+                for source_range, weight in self._get_stage_chunks(connection, plan, table_name, chunk_rows):
+                    tasks.append((weight, table_name, source_range))
+            if preload_dimensions and len(set_based_stages) + len(vectorized_stages) < len({t[1] for t in tasks}):
+                preloaded_rows = self._create_dimension_cache(connection, plan, 0, True).preloaded_rows
+            if vectorized_stages:
+                columnar_dimensions = self._create_columnar_dimensions(connection, plan, vectorized_stages)
+        tasks.sort(key=lambda task: -task[0])
+        if not self.silent: print(f"  Popolamento parallelo: {len(tasks)} task su {workers} worker.")
+
+        errors = 0
+        cache_stats = []
+        stage_strategies = {table_name: "set" if table_name in set_based_stages else "vectorized" if table_name in vectorized_stages
+                            else "rows" for table_name in plan.source_tables}
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = {executor.submit(self._populate_stage_chunk, plan, table_name, source_range, stage_strategies[table_name],
+                                       dimension_cache_mb, preloaded_rows, batch_size, read_chunk_size, columnar_dimensions):
+                       (table_name, source_range) for _, table_name, source_range in tasks}
+            for future in as_completed(futures):
+                table_name, source_range = futures[future]
+                try:
+                    task_cache_stats = future.result()
+                    if task_cache_stats is not None: cache_stats.append(task_cache_stats)
+                except Exception as e_task:
+                    errors += 1
+                    range_label = f" (PK in ({source_range[1]}, {source_range[2]}])" if source_range else ""
+                    if not self.silent: print(f"    ERRORE durante il popolamento di {table_name}{range_label}: {e_task}")
+        if cache_stats:
+            self._report_dimension_cache({key: sum(stats[key] for stats in cache_stats) for key in cache_stats[0]})
+        if not self.silent:
+            print(f"Popolamento parallelo di '{bridge_table_name}' completato ({errors} task con errori).")
+            if errors and plan.stage_selection is not None:
+                print(f"ERRORE: le stage {', '.join(plan.stage_selection)} sono state svuotate e ripopolate solo in parte, "
+                      f"rieseguire il populate.")
+        return errors == 0
+
+    @_with_metrics("populate")
+    def populate_puppini_bridge(self, bridge_table_name="Puppini_Bridge", to_sql=False, strategy="rows",
+                                dimension_cache_mb=256, preload_dimensions=False, batch_size=1000, read_chunk_size=10000,
+                                workers=1, chunk_rows=1000000, pipeline=False, pipeline_depth=4, commit_every=0, resume=False,
+                                aggregate_stages=None, stages=None, exclude_stages=None, plan=None):
+        """
+        Popola la Puppini Bridge con la strategy indicata ('rows', 'set' o 'vectorized').
+        Con to_sql=True restituisce la lista degli statement invece di eseguirli.
+        """
+        self._check_populate_strategy(strategy)
+        if not self.silent: print(f"Processo popolamento per '{bridge_table_name}' (to_sql={to_sql}, strategy={strategy})...")
+
+        plan = plan or self.build_population_plan(bridge_table_name, aggregate_stages, stages, exclude_stages)
         if to_sql:
-            if not self.silent: print(f"Generati {len(compiled_insert_sql_list)} comandi SQL INSERT (restituiti).")
+            compiled_insert_sql_list = [sql for _, sql in self.iter_populate_sql(bridge_table_name, strategy,
+                                                                                 dimension_cache_mb, preload_dimensions,
+                                                                                  batch_size, read_chunk_size, plan=plan)]
+            if not self.silent: print(f"Generati {len(compiled_insert_sql_list)} comandi SQL (restituiti).")
             return compiled_insert_sql_list
-        else: 
+
+        if not plan.is_valid:
+            if not self.silent: print(f"AVVISO: Struttura di '{bridge_table_name}' non definita correttamente. Popolamento non possibile.")
+            return False
+        if plan.stage_selection is not None:
+            if not self.silent: print(f"  Ripopolamento delle sole stage: {', '.join(plan.stage_selection) or 'nessuna'}.")
+
+        if commit_every > 0 or resume:
+            if (workers > 1 or pipeline) and not self.silent:
+                print("  AVVISO: il popolamento con checkpoint è sequenziale, workers e pipeline ignorati.")
+            return self._populate_checkpointed(plan, strategy, dimension_cache_mb, preload_dimensions, batch_size, read_chunk_size,
+                                               commit_every if commit_every > 0 else 100000, resume)
+        if pipeline:
+            if workers > 1 or strategy == "set":
+                if not self.silent: print("  AVVISO: la pipeline si applica solo con workers=1 e strategy 'rows' o 'vectorized', ignorata.")
+            else:
+                with self._connect_read_only() as connection:
+                    pipeline_supported = self._check_pipeline_support(connection)
+                if pipeline_supported:
+                    return self._populate_pipelined(plan, strategy, dimension_cache_mb, preload_dimensions, batch_size,
+                                                    read_chunk_size, pipeline_depth)
+        if workers > 1:
+            return self._populate_parallel(plan, strategy, workers, chunk_rows, dimension_cache_mb, preload_dimensions,
+                                           batch_size, read_chunk_size)
+        if strategy == "set":
+            return self._populate_set_based(plan, dimension_cache_mb, preload_dimensions, batch_size, read_chunk_size)
+        if strategy == "vectorized":
+            return self._populate_vectorized(plan, dimension_cache_mb, preload_dimensions, batch_size, read_chunk_size)
+
+        with self.engine.connect() as connection: 
+            if plan.stage_selection is not None: self._delete_selected_stages(connection, plan)
+            dimension_cache = self._create_dimension_cache(connection, plan, dimension_cache_mb, preload_dimensions)
+            bridge_writer = self._create_bridge_writer(connection, plan, batch_size)
+            for table_name in plan.source_tables:
+                self._write_stage_row_by_row(connection, plan, table_name, dimension_cache, bridge_writer, read_chunk_size)
+            self._report_dimension_cache(dimension_cache.stats())
+            if self._rollback_failed_stage_rebuild(connection, plan, bridge_writer.errors): return False
+            try:
+                with self._phase("commit"):
+                    connection.commit()
+                if not self.silent: print(f"Popolamento diretto di '{bridge_table_name}' completato "
+                                          f"({bridge_writer.errors} blocchi con errori).")
+                return bridge_writer.errors == 0
+            except Exception as e_commit:
+                if not self.silent: print(f"ERRORE durante il commit del popolamento di '{bridge_table_name}': {e_commit}")
+                return False
+
+    def _write_stage_set_based_select(self, connection, plan, table_name, bridge_columns, select_stmt,
+                                      bridge_writer, read_chunk_size=10000):
+        """Legge in streaming il SELECT set-based di una stage (i join li esegue il DB) e ne passa le righe al bridge_writer."""
+        if not self.silent: print(f"  Lettura set-based da tabella sorgente: {table_name}")
+        rows_read = 0
+        with self._stage(table_name):
+            bridge_writer.start_stage(table_name, [col.name for col in bridge_columns])
+            result = connection.execution_options(stream_results=True, yield_per=read_chunk_size).execute(select_stmt)
+            for bridge_rows in result.partitions(read_chunk_size):
+                rows_read += len(bridge_rows)
+                for bridge_row in bridge_rows:
+                    bridge_writer.add(bridge_row)
+            bridge_writer.flush()
+        self._record_rows(table_name, rows_read=rows_read)
+        if not self.silent: print(f"    Lette {rows_read} righe da {table_name}.")
+
+    def _get_load_data_sql(self, bridge_table_name, column_names, path):
+        """
+        LOAD DATA LOCAL INFILE di un CSV scritto da _BridgeFileWriter. I campi passano da variabili utente:
+        il campo vuoto diventa NULL (tranne Stage) e MySQL converte date ISO e decimali nel tipo della colonna.
+        """
+        q = "`"
+        file_literal = os.path.abspath(path).replace(os.sep, "/").replace("\\", "\\\\").replace("'", "''")
+        variables = ", ".join(f"@c{i}" for i in range(1, len(column_names) + 1))
+        assignments = ", ".join(f"{q}{name}{q} = @c{i}" if name == "Stage" else f"{q}{name}{q} = NULLIF(@c{i}, '')"
+                                for i, name in enumerate(column_names, start=1))
+        return (f"LOAD DATA LOCAL INFILE '{file_literal}' INTO TABLE {q}{bridge_table_name}{q} CHARACTER SET utf8mb4 "
+                f"FIELDS TERMINATED BY ',' OPTIONALLY ENCLOSED BY '\"' ESCAPED BY '' LINES TERMINATED BY '\\n' IGNORE 1 LINES "
+                f"({variables}) SET {assignments}")
+
+    def _load_export_files(self, bridge_table_name, files, load_sql_list):
+        """
+        Carica nella bridge i CSV esportati con LOAD DATA LOCAL INFILE, in un'unica transazione. Usa un engine
+        dedicato con local_infile attivo, così le altre connessioni del manager restano senza (va abilitato anche sul server).
+        """
+        if self.driver != "mysql":
+            if not self.silent: print(f"ERRORE: LOAD DATA INFILE richiede MySQL (driver '{self.driver}'); i file esportati "
+                                      f"non sono stati caricati.")
+            return False
+        load_engine = create_engine(self.engine.url, connect_args={"local_infile": 1}, pool_size=1, max_overflow=0)
+        try:
+            with load_engine.connect() as connection:
+                for (table_name, path), load_sql in zip(files, load_sql_list):
+                    with self._stage(table_name), self._phase("load", table_name):
+                        result = connection.execution_options(no_parameters=True).exec_driver_sql(load_sql)
+                    if not self.silent: print(f"    Caricate {result.rowcount} righe da {path}.")
+                with self._phase("commit"):
+                    connection.commit()
+        except Exception as e_load:
+            if not self.silent: print(f"ERRORE durante LOAD DATA INFILE in '{bridge_table_name}': {e_load}")
+            return False
+        finally:
+            load_engine.dispose()
+        if not self.silent: print(f"Caricamento di {len(files)} file in '{bridge_table_name}' completato.")
+        return True
+
+    @_with_metrics("export")
+    def export_puppini_bridge(self, output_dir, bridge_table_name="Puppini_Bridge", file_format="csv", load=False,
+                              to_sql=False, strategy="rows", dimension_cache_mb=256, preload_dimensions=False, batch_size=1000,
+                              read_chunk_size=10000, aggregate_stages=None, plan=None):
+        """
+        Esporta le righe della Puppini Bridge su file, uno per stage, ed eventualmente le carica con LOAD DATA.
+        Restituisce True/False, o con to_sql=True la lista dei comandi LOAD DATA.
+        """
+        self._check_populate_strategy(strategy)
+        if file_format not in EXPORT_FORMATS:
+            raise ValueError(f"Formato di export non supportato: '{file_format}'. Valori ammessi: {', '.join(EXPORT_FORMATS)}")
+        if file_format == "parquet" and pa is None:
+            raise ImportError("L'export Parquet richiede pyarrow (pip install pyarrow).")
+        if (load or to_sql) and file_format != "csv":
+            raise ValueError("LOAD DATA INFILE è supportato solo per file_format='csv'.")
+        if not self.silent: print(f"Processo export per '{bridge_table_name}' in '{output_dir}' (format={file_format}, "
+                                  f"strategy={strategy})...")
+
+        self.last_export_files = []
+        plan = plan or self.build_population_plan(bridge_table_name, aggregate_stages)
+        if not plan.is_valid:
+            if not self.silent: print(f"AVVISO: Struttura di '{bridge_table_name}' non definita correttamente. Export non possibile.")
+            return [] if to_sql else False
+
+        file_writer = _BridgeFileWriter(output_dir, plan.bridge_table, file_format, batch_size, silent=self.silent,
+                                        metrics=self._active_metrics)
+        try:
+            with self._connect_read_only() as connection:
+                dimension_cache = None
+                if strategy == "set":
+                    statements = self._get_set_based_statements(plan, as_select=True)
+                else:
+                    statements = [(table_name, None) for table_name in plan.source_tables]
+                vectorized_stages = []
+                if strategy == "vectorized":
+                    vectorized_stages = [table_name for table_name in plan.source_tables
+                                         if plan.stages[table_name]['populatable'] and not plan.stages[table_name]['has_relevant_cycle']]
+                    columnar_dimensions = self._create_columnar_dimensions(connection, plan, vectorized_stages)
+                for table_name, set_based_select in statements:
+                    if set_based_select is not None:
+                        self._write_stage_set_based_select(connection, plan, table_name, *set_based_select, file_writer, read_chunk_size)
+                        continue
+                    if table_name in vectorized_stages:
+                        self._write_stage_vectorized(connection, plan, table_name, columnar_dimensions, file_writer, read_chunk_size)
+                        continue
+                    if strategy == "vectorized" and plan.stages[table_name]['populatable'] and not self.silent:
+                        print(f"    AVVISO: ciclo nel grafo delle FK raggiungibile da {table_name}, export riga per riga.")
+                    if dimension_cache is None:
+                        dimension_cache = self._create_dimension_cache(connection, plan, dimension_cache_mb, preload_dimensions)
+                    self._write_stage_row_by_row(connection, plan, table_name, dimension_cache, file_writer, read_chunk_size)
+                if dimension_cache is not None: self._report_dimension_cache(dimension_cache.stats())
+        finally:
+            file_writer.close()
+        self.last_export_files = list(file_writer.files)
+        if not self.silent:
+            print(f"Export di '{bridge_table_name}' completato: {file_writer.rows_written} righe in {len(file_writer.files)} file "
+                  f"({file_writer.errors} blocchi con errori).")
+
+        load_sql_list = [self._get_load_data_sql(bridge_table_name, file_writer.column_names, path) for _, path in file_writer.files]
+        if to_sql:
+            return load_sql_list
+        if file_writer.errors:
+            if load and not self.silent: print("  AVVISO: export con errori, file non caricati nella bridge.")
+            return False
+        if not load:
+            return True
+        return self._load_export_files(bridge_table_name, file_writer.files, load_sql_list)
+
+    def _get_table_row_counts(self, connection, table_names):
+        """
+        Righe delle tabelle indicate: su MySQL TABLE_ROWS di information_schema.TABLES (stima di InnoDB, una sola
+        query, senza leggere le tabelle), altrove o per le tabelle mancanti COUNT(*).
+        """
+        q = "`"
+        row_counts = {}
+        if self.driver == "mysql":
+            for table_name, table_rows in connection.execute(text(
+                    "SELECT TABLE_NAME, TABLE_ROWS FROM information_schema.TABLES WHERE TABLE_SCHEMA = :schema"),
+                    {"schema": self.database_name}):
+                table_name = table_name.decode("utf-8") if isinstance(table_name, (bytes, bytearray)) else table_name
+                if table_name in table_names and table_rows is not None: row_counts[table_name] = int(table_rows)
+        for table_name in table_names:
+            if table_name not in row_counts:
+                row_counts[table_name] = int(connection.execute(text(f"SELECT COUNT(*) FROM {q}{table_name}{q}")).scalar())
+        return row_counts
+
+    def _explain_stage(self, connection, plan, table_name):
+        """
+        Piano del DB (EXPLAIN su MySQL, EXPLAIN QUERY PLAN su SQLite) per il SELECT set-based di una stage.
+        Restituisce (righe descrittive, numero di tabelle in join lette per intero invece che tramite indice).
+        """
+        if plan.stages[table_name]['has_relevant_cycle'] or self.driver not in ("mysql", "sqlite"): return [], 0
+        _, select_stmt = self._build_set_based_select(plan, table_name)
+        select_sql = str(select_stmt.compile(self.engine, compile_kwargs={"literal_binds": True}))
+        explain_lines, full_scans = [], 0
+        try:
+            if self.driver == "mysql":
+                for row in connection.execute(text(f"EXPLAIN {select_sql}")).mappings():
+                    explain_lines.append(f"{row['table']}: type={row['type']}, key={row['key']}, rows={row['rows']}")
+                    if row['type'] == "ALL" and row['table'] != "s": full_scans += 1
+            else:
+                for row in connection.execute(text(f"EXPLAIN QUERY PLAN {select_sql}")):
+                    explain_lines.append(row[-1])
+                    if row[-1].startswith("SCAN ") and not row[-1].startswith("SCAN s"): full_scans += 1
+        except Exception as e_explain:
+            explain_lines.append(f"non disponibile: {e_explain}")
+        return explain_lines, full_scans
+
+    def _estimate_stage_row_bytes(self, plan, table_name):
+        """Byte stimati di una riga bridge della stage: overhead InnoDB, bitmap dei NULL e valori delle colonne che la stage valorizza."""
+        stage = plan.stages[table_name]
+        column_names = stage['aggregate']['columns'] if stage['aggregate'] else stage['bridge_columns']
+        value_bytes = sum(len(table_name.encode("utf-8")) + 1 if name == 'Stage'
+                          else _estimate_storage_bytes(plan.bridge_table.c[name].type)
+                          for name in column_names)
+        return INNODB_ROW_OVERHEAD_BYTES + (len(plan.bridge_table.columns) + 7) // 8 + value_bytes
+
+    @_with_metrics("estimate")
+    def estimate_puppini_bridge(self, bridge_table_name="Puppini_Bridge", strategies=POPULATE_STRATEGIES, sample_rows=1000, batch_size=1000,
+                                read_chunk_size=10000, dimension_cache_mb=256, preload_dimensions=False, aggregate_stages=None, plan=None):
+        """Stima righe, dimensione e costo di ogni strategia popolando un campione in una tabella temporanea."""
+        for strategy in strategies:
+            if strategy != "vectorized": self._check_populate_strategy(strategy)
+        strategies = [strategy for strategy in POPULATE_STRATEGIES if strategy in strategies
+                      and (strategy != "vectorized" or np is not None)]
+        sample_rows = max(1, int(sample_rows))
+        if not self.silent: print(f"Processo stima per '{bridge_table_name}' (strategie {', '.join(strategies)}, campione di "
+                                  f"{sample_rows} righe per stage)...")
+
+        plan = plan or self.build_population_plan(bridge_table_name, aggregate_stages)
+        if not plan.is_valid:
+            if not self.silent: print(f"AVVISO: Struttura di '{bridge_table_name}' non definita correttamente. Stima non possibile.")
+            return False
+        sample_table_name = f"{bridge_table_name}{SERVICE_TABLE_SUFFIXES['estimate']}"
+        sample_plan = plan.for_table(sample_table_name)
+        populatable_stages = [table_name for table_name in plan.source_tables if plan.stages[table_name]['populatable']]
+        metrics = self._active_metrics
+        q = "`"
+
+        def statements_so_far():
+            return metrics.statements if metrics is not None else 0
+
+        def per_strategy():
+            return {strategy: {'statements': 0, 'seconds': 0.0} for strategy in strategies}
+
+        stages = []
+        fixed = per_strategy()
+        notes = []
+        with self._connect_read_only() as connection:
+            referred_tables = sorted({edge[1] for edges in plan.fk_edges.values() for edge in edges})
+            row_counts = self._get_table_row_counts(connection, sorted(set(populatable_stages) | set(referred_tables)))
+            # Le query di risalita di 'rows' sono miss della cache: al più una per riga di dimensione, non una per riga sorgente.
+            max_traverse_statements = sum(row_counts[table_name] for table_name in referred_tables)
+            create_sql = str(CreateTable(sample_plan.bridge_table).compile(self.engine)).strip()
+            create_sql = create_sql.replace("CREATE TABLE", "CREATE TEMPORARY TABLE", 1)
+            connection.execute(text(create_sql))
+            try:
+                dimension_cache = None
+                columnar_dimensions = None
+                if "rows" in strategies or any(plan.stages[t]['has_relevant_cycle'] for t in populatable_stages):
+                    statements_before, started = statements_so_far(), time.perf_counter()
+                    dimension_cache = self._create_dimension_cache(connection, plan, dimension_cache_mb, preload_dimensions)
+                    if "rows" in fixed:
+                        fixed["rows"] = {'statements': statements_so_far() - statements_before, 'seconds': time.perf_counter() - started}
+                if "vectorized" in strategies:
+                    vectorized_stages = [t for t in populatable_stages if not plan.stages[t]['has_relevant_cycle']]
+                    statements_before, started = statements_so_far(), time.perf_counter()
+                    columnar_dimensions = self._create_columnar_dimensions(connection, plan, vectorized_stages)
+                    fixed["vectorized"] = {'statements': statements_so_far() - statements_before, 'seconds': time.perf_counter() - started}
+
+                for table_name in populatable_stages:
+                    stage = plan.stages[table_name]
+                    source_rows = row_counts[table_name]
+                    sample_range = next(iter(self._iter_backfill_ranges(connection, table_name, stage['pk_name'], sample_rows)), None)
+                    sampled_rows = 0
+                    if sample_range is not None:
+                        sampled_rows = int(connection.execute(text(f"SELECT COUNT(*) FROM {q}{table_name}{q} WHERE "
+                                                                   f"{q}{stage['pk_name']}{q} <= :range_high"),
+                                                              {'range_high': sample_range[1]}).scalar())
+                    source_range = (stage['pk_name'], None, sample_range[1]) if sample_range is not None else None
+                    scale = source_rows / sampled_rows if sampled_rows else 0.0
+                    explain_lines, full_scans = self._explain_stage(connection, plan, table_name)
+                    row_bytes = self._estimate_stage_row_bytes(plan, table_name)
+                    stage_estimate = {'table': table_name, 'source_rows': source_rows, 'bridge_rows': source_rows,
+                                      'aggregated': bool(stage['aggregate']),
+                                      'row_bytes': row_bytes, 'bridge_bytes': row_bytes * source_rows, 'sample_rows': sampled_rows,
+                                      'explain': explain_lines, 'full_scans': full_scans, 'strategies': per_strategy()}
+
+                    def run_sample(stage_strategy):
+                        """Popola il campione nella tabella temporanea: (statement eseguiti, secondi, writer o None per 'set')."""
+                        statements_before, started = statements_so_far(), time.perf_counter()
+                        bridge_writer = None
+                        if stage_strategy == "set":
+                            connection.execute(self._build_set_based_insert(sample_plan, table_name, source_range))
+                        else:
+                            bridge_writer = self._create_bridge_writer(connection, sample_plan, batch_size)
+                            if stage_strategy == "vectorized":
+                                self._write_stage_vectorized(connection, sample_plan, table_name, columnar_dimensions,
+                                                             bridge_writer, read_chunk_size,
+                                                             source_range)
+                            else:
+                                self._write_stage_row_by_row(connection, sample_plan, table_name, dimension_cache,
+                                                             bridge_writer, read_chunk_size,
+                                                             source_range)
+                        return statements_so_far() - statements_before, time.perf_counter() - started, bridge_writer
+
+                    measured = {}
+                    for strategy in strategies:
+                        stage_strategy = "rows" if stage['has_relevant_cycle'] else strategy
+                        if stage_strategy in measured or source_range is None:
+                            stage_estimate['strategies'][strategy] = dict(measured.get(stage_strategy, {'statements': 0, 'seconds': 0.0}))
+                            continue
+                        sample_statements, seconds, bridge_writer = run_sample(stage_strategy)
+                        if stage_strategy == "set":
+                            statements, seconds = 1, seconds * scale
+                        elif stage_strategy == "vectorized":
+                            write_statements = -(-source_rows // bridge_writer.rows_per_batch) * bridge_writer.STATEMENTS_PER_BATCH
+                            statements, seconds = 1 + write_statements, seconds * scale
+                        else:
+                            # Secondo passaggio a cache calda: il costo per riga senza miss, a cui si somma il costo dei miss stimati.
+                            traverse_statements = max(0, sample_statements - bridge_writer.batches * bridge_writer.STATEMENTS_PER_BATCH - 1)
+                            _, warm_seconds, _ = run_sample(stage_strategy)
+                            estimated_traverse = min(traverse_statements * scale, max(traverse_statements, max_traverse_statements))
+                            miss_factor = estimated_traverse / traverse_statements if traverse_statements else 0.0
+                            write_statements = -(-source_rows // bridge_writer.rows_per_batch) * bridge_writer.STATEMENTS_PER_BATCH
+                            statements = 1 + int(round(estimated_traverse)) + write_statements
+                            seconds = warm_seconds * scale + max(0.0, seconds - warm_seconds) * miss_factor
+                        measured[stage_strategy] = {'statements': statements, 'seconds': seconds}
+                        stage_estimate['strategies'][strategy] = dict(measured[stage_strategy])
+                    stages.append(stage_estimate)
+            finally:
+                connection.rollback()
+                connection.execute(text(f"DROP {'TEMPORARY ' if self.driver == 'mysql' else ''}TABLE IF EXISTS {q}{sample_table_name}{q}"))
+                connection.commit()
+
+        if any(stage['aggregated'] for stage in stages):
+            notes.append("per le stage aggregate righe, byte e INSERT sono un massimo: le righe bridge sono una per gruppo.")
+        if self.driver == "mysql":
+            notes.append("le righe sorgente di information_schema.TABLES sono una stima di InnoDB (aggiornabile con ANALYZE TABLE).")
+        estimate = PopulationEstimate(bridge_table_name, sample_rows, strategies, stages, fixed, notes)
+        self.last_estimate = estimate
+        if not self.silent: print(f"Stima completata: {estimate.bridge_rows} righe bridge, {_format_bytes(estimate.bridge_bytes)}.")
+        return estimate
+
+
+    def _get_bridge_index_names(self, plan, bridge_table_name, index_columns):
+        """
+        Nomi degli indici da creare sulla tabella ombra: IX_<bridge>_<colonna>. Dove i nomi degli indici
+        sono globali nello schema (non MySQL) e la bridge attuale li usa già, si usa il nome della tabella ombra.
+        """
+        index_names = {column: f"IX_{bridge_table_name}_{column}" for column in index_columns}
+        if self.driver == "mysql": return index_names
+        live_inspector = sqlalchemy.inspect(self.engine)
+        if not live_inspector.has_table(bridge_table_name): return index_names
+        used_names = {index['name'] for index in live_inspector.get_indexes(bridge_table_name)}
+        return {column: name if name not in used_names else f"IX_{plan.bridge_table_name}_{column}" for column, name in index_names.items()}
+
+    def _swap_bridge_tables(self, connection, bridge_table_name, shadow_table_name, old_table_name, bridge_exists):
+        """Scambia la tabella ombra con la bridge: su MySQL con un unico RENAME TABLE atomico, altrove in una transazione."""
+        q = "`" 
+        if self.driver == "mysql":
+            renames = [f"{q}{shadow_table_name}{q} TO {q}{bridge_table_name}{q}"]
+            if bridge_exists: renames.insert(0, f"{q}{bridge_table_name}{q} TO {q}{old_table_name}{q}")
+            connection.execute(text(f"RENAME TABLE {', '.join(renames)}"))
+        else:
+            if bridge_exists: connection.execute(text(f"ALTER TABLE {q}{bridge_table_name}{q} RENAME TO {q}{old_table_name}{q}"))
+            connection.execute(text(f"ALTER TABLE {q}{shadow_table_name}{q} RENAME TO {q}{bridge_table_name}{q}"))
+        connection.commit()
+
+    @_with_metrics("rebuild")
+    def rebuild_puppini_bridge(self, bridge_table_name="Puppini_Bridge", strategy="rows", dimension_cache_mb=256, preload_dimensions=False,
+                               batch_size=1000, read_chunk_size=10000, workers=1, chunk_rows=1000000, index_columns=None, keep_old=False,
+                               partition_by_stage=False, row_format=None, narrow_stage=False, pipeline=False, pipeline_depth=4,
+                               aggregate_stages=None):
+        """Ricostruisce la Puppini Bridge in una tabella ombra e la scambia con un RENAME TABLE atomico."""
+        self._check_populate_strategy(strategy)
+        if row_format is not None and row_format not in ROW_FORMATS:
+            raise ValueError(f"ROW_FORMAT non supportato: '{row_format}'. Valori ammessi: {', '.join(ROW_FORMATS)}")
+        shadow_table_name = f"{bridge_table_name}{SERVICE_TABLE_SUFFIXES['shadow']}"
+        old_table_name = f"{bridge_table_name}{SERVICE_TABLE_SUFFIXES['old']}"
+        if not self.silent: print(f"Processo ricostruzione di '{bridge_table_name}' tramite '{shadow_table_name}' (strategy={strategy})...")
+
+        plan = self.build_population_plan(bridge_table_name, aggregate_stages)
+        if not plan.is_valid:
+            if not self.silent: print(f"AVVISO: Struttura di '{bridge_table_name}' non definita correttamente. "
+                                      f"Ricostruzione non possibile.")
+            return False
+        shadow_plan = plan.for_table(shadow_table_name)
+        self._apply_bridge_layout(shadow_plan.bridge_table, plan.source_tables, narrow_stage)
+        if index_columns is None:
+            index_columns = self._get_bridge_index_columns(shadow_plan.bridge_table, partition_by_stage)
+        q = "`" 
+
+        with self.engine.connect() as connection:
+            connection.execute(text(f"DROP TABLE IF EXISTS {q}{old_table_name}{q}"))
+            connection.execute(text(f"DROP TABLE IF EXISTS {q}{shadow_table_name}{q}"))
+            connection.execute(text(self._get_bridge_create_sql(shadow_plan.bridge_table, plan.source_tables,
+                                                                partition_by_stage, row_format)))
+            connection.commit()
+        if not self.silent: print(f"  Tabella ombra '{shadow_table_name}' creata senza indici.")
+        index_names = self._get_bridge_index_names(shadow_plan, bridge_table_name, index_columns)
+
+        if not self.populate_puppini_bridge(shadow_table_name, strategy=strategy, dimension_cache_mb=dimension_cache_mb,
+                                            preload_dimensions=preload_dimensions,
+                                            batch_size=batch_size, read_chunk_size=read_chunk_size, workers=workers, chunk_rows=chunk_rows,
+                                            pipeline=pipeline, pipeline_depth=pipeline_depth, plan=shadow_plan):
+            if not self.silent: print(f"ERRORE durante il popolamento di '{shadow_table_name}': la bridge "
+                                      f"'{bridge_table_name}' resta invariata.")
+            return False
+
+        try:
+            with self.engine.connect() as connection:
+                with self._phase("index"):
+                    for column_name, index_sql in zip(index_columns, self._get_bridge_index_sql(shadow_plan.bridge_table,
+                                                                                                index_columns, index_names)):
+                        connection.execute(text(index_sql))
+                        if not self.silent: print(f"  Indice {index_names[column_name]} creato su {column_name}.")
+                    connection.commit()
+                schema_arg_for_has_table = self.database_name if self.driver == "mysql" else None
+                bridge_exists = sqlalchemy.inspect(self.engine).has_table(bridge_table_name, schema=schema_arg_for_has_table)
+                with self._phase("swap"):
+                    self._swap_bridge_tables(connection, bridge_table_name, shadow_table_name, old_table_name, bridge_exists)
+                if not self.silent: print(f"  Tabella '{shadow_table_name}' scambiata con '{bridge_table_name}'.")
+                if bridge_exists and not keep_old:
+                    connection.execute(text(f"DROP TABLE IF EXISTS {q}{old_table_name}{q}"))
+                    connection.commit()
+                    if not self.silent: print(f"  Vecchia bridge '{old_table_name}' eliminata.")
+        except Exception as e_swap:
+            if not self.silent: print(f"ERRORE durante indicizzazione o scambio di '{shadow_table_name}': {e_swap}")
             return False
+        if not self.silent: print(f"Ricostruzione di '{bridge_table_name}' completata.")
+        return True
 
+    # Colonne del valore del watermark, scelte in base al tipo Python restituito dal driver (datetime prima di date).
+    WATERMARK_VALUE_COLUMNS = (('Watermark_Integer', int), ('Watermark_Decimal', Decimal), ('Watermark_Float', float),
+                               ('Watermark_Datetime', datetime), ('Watermark_Date', date), ('Watermark_String', str))
 
-    def remove_foreign_keys(self, to_sql=False): # Aggiunto parametro to_sql
+    def _get_watermark_table(self, watermark_table_name):
+        """
+        Tabella dei watermark: per ogni stage e per ogni tabella da cui dipende (la stage stessa e le tabelle
+        raggiunte dai suoi join) la colonna usata e l'ultimo valore elaborato, nella colonna del suo tipo.
+        """
+        from sqlalchemy.dialects.mysql import DATETIME as MYSQL_DATETIME
+        return Table(watermark_table_name, MetaData(),
+                     Column('Stage', String(255), primary_key=True),
+                     Column('Source_Table', String(255), primary_key=True),
+                     Column('Watermark_Column', String(255), nullable=False),
+                     Column('Watermark_Integer', sqlalchemy.BigInteger),
+                     Column('Watermark_Decimal', sqlalchemy.Numeric(65, 30)),
+                     Column('Watermark_Float', sqlalchemy.Double),
+                     Column('Watermark_Datetime', DateTime().with_variant(MYSQL_DATETIME(fsp=6), "mysql")),
+                     Column('Watermark_Date', Date),
+                     Column('Watermark_String', String(255)),
+                     Column('Updated_At', DateTime))
+
+    def _get_watermark_values(self, watermark_value):
+        """Valori delle colonne Watermark_* per watermark_value (tutte NULL se la tabella era vuota)."""
+        values = {name: None for name, _ in self.WATERMARK_VALUE_COLUMNS}
+        if watermark_value is not None:
+            column_name = next((name for name, value_type in self.WATERMARK_VALUE_COLUMNS if isinstance(watermark_value, value_type)), None)
+            if column_name is None:
+                column_name, watermark_value = 'Watermark_String', str(watermark_value)
+            values[column_name] = watermark_value
+        return values
+
+    def _get_stored_watermark_value(self, watermark_row):
+        """Ultimo valore elaborato di una riga della tabella dei watermark (None se la tabella era vuota)."""
+        values = watermark_row._mapping
+        return next((values[name] for name, _ in self.WATERMARK_VALUE_COLUMNS if values[name] is not None), None)
+
+    def _get_changed_rows_condition(self, source_alias, watermark_column, pk_name, previous_value):
+        """Condizione delle righe nuove o modificate: > sulla PK, >= o NULL sulla colonna watermark."""
+        column = source_alias.c[watermark_column]
+        if previous_value is None:
+            return sqlalchemy.true()
+        if watermark_column == pk_name:
+            return column > previous_value
+        return sqlalchemy.or_(column >= previous_value, column.is_(None))
+
+    def _get_incremental_dependencies(self, plan, table_name):
+        """Tabelle, oltre alla stage, da cui dipendono le sue righe bridge."""
+        stage = plan.stages[table_name]
+        dependencies = [join['table'] for join in stage['joins'][1:]]
+        if stage['has_relevant_cycle']:
+            dependencies += [name[len("PBK_"):] for name in stage['bridge_columns']
+                             if name.startswith("PBK_") and plan.table_details_map.get(name[len("PBK_"):], {}).get('pk_name')]
+        return [name for name in dict.fromkeys(dependencies) if name != table_name]
+
+    def _build_incremental_keys_select(self, plan, table_name, watermarks):
+        """SELECT delle PK della stage da rigenerare: righe modificate o che raggiungono una dipendenza modificata."""
+        stage = plan.stages[table_name]
+        pk_name = stage['pk_name']
+        joins_by_alias = {join['alias']: join for join in stage['joins']}
+        children_fk_columns = {}
+        for join in stage['joins'][1:]:
+            children_fk_columns.setdefault(join['parent_alias'], []).append(join['fk_column'])
+
+        def changed_condition(source_alias, dependency_table):
+            watermark_column, previous_value = watermarks[dependency_table]
+            return self._get_changed_rows_condition(source_alias, watermark_column, plan.table_details_map[dependency_table]['pk_name'],
+                                                    previous_value)
+
+        def source_alias(join, extra_columns=()):
+            column_names = dict.fromkeys([join['pk_name'], *children_fk_columns.get(join['alias'], []), *extra_columns])
+            return sqlalchemy.table(join['table'], *(sqlalchemy.column(c) for c in column_names)).alias(join['alias'])
+
+        stage_alias = source_alias(joins_by_alias['s'], [watermarks[table_name][0]])
+        branches = [sqlalchemy.select(stage_alias.c[pk_name]).where(changed_condition(stage_alias, table_name))]
+        for join in stage['joins'][1:]:
+            if join['table'] not in watermarks: continue
+            path = [join]
+            while path[-1]['parent_alias'] is not None:
+                path.append(joins_by_alias[path[-1]['parent_alias']])
+            path.reverse()
+            aliases = {node['alias']: source_alias(node) for node in path[:-1]}
+            aliases[join['alias']] = source_alias(join, [watermarks[join['table']][0]])
+            from_clause = aliases['s']
+            for node in path[1:]:
+                join_condition = aliases[node['alias']].c[node['pk_name']] == aliases[node['parent_alias']].c[node['fk_column']]
+                from_clause = from_clause.join(aliases[node['alias']], join_condition)
+            branches.append(sqlalchemy.select(aliases['s'].c[pk_name]).select_from(from_clause)
+                            .where(changed_condition(aliases[join['alias']], join['table'])))
+        if stage['has_relevant_cycle']:
+            bridge_table = plan.bridge_table
+            own_pbk_column = bridge_table.c[f"PBK_{table_name}"]
+            for dependency_table in self._get_incremental_dependencies(plan, table_name):
+                if dependency_table not in watermarks or f"PBK_{dependency_table}" not in bridge_table.c: continue
+                dependency_pk = plan.table_details_map[dependency_table]['pk_name']
+                dependency_columns = dict.fromkeys([dependency_pk, watermarks[dependency_table][0]])
+                dependency_alias = sqlalchemy.table(dependency_table, *(sqlalchemy.column(c) for c in dependency_columns)).alias('d')
+                changed_pks = sqlalchemy.select(dependency_alias.c[dependency_pk]).where(
+                    changed_condition(dependency_alias, dependency_table))
+                branches.append(sqlalchemy.select(own_pbk_column).where(bridge_table.c['Stage'] == table_name,
+                                                                        bridge_table.c[f"PBK_{dependency_table}"].in_(changed_pks)))
+        return sqlalchemy.union(*branches) if len(branches) > 1 else branches[0]
+
+    def _iter_incremental_key_chunks(self, connection, keys_select, read_chunk_size):
+        """
+        Restituisce a blocchi di read_chunk_size le PK selezionate da keys_select. Su MySQL le legge in streaming
+        su una connessione dedicata; altrove le legge tutte prima delle scritture, che usano la stessa connessione.
+        """
+        if self.driver != "mysql":
+            keys = [row[0] for row in connection.execute(keys_select)]
+            for start in range(0, len(keys), read_chunk_size):
+                yield keys[start:start + read_chunk_size]
+            return
+        with self._connect_read_only() as read_connection:
+            result = read_connection.execution_options(stream_results=True, yield_per=read_chunk_size).execute(keys_select)
+            for key_rows in result.partitions(read_chunk_size):
+                yield [row[0] for row in key_rows]
+
+    def _build_incremental_delete(self, plan, table_name, source_keys=None):
+        """DELETE delle righe bridge della stage da rigenerare: senza source_keys l'intera stage, altrimenti per (Stage, PBK_<stage>)."""
+        bridge_table = plan.bridge_table
+        stage_filter = bridge_table.c['Stage'] == table_name
+        if source_keys is None:
+            return bridge_table.delete().where(stage_filter)
+        return bridge_table.delete().where(stage_filter, bridge_table.c[f"PBK_{table_name}"].in_(source_keys))
+
+    @_with_metrics("incremental")
+    def populate_incremental(self, bridge_table_name="Puppini_Bridge", strategy="rows", watermark_column=None,
+                             dimension_cache_mb=256, preload_dimensions=False, batch_size=1000, read_chunk_size=10000, plan=None):
+        """
+        Popola la Puppini Bridge con le sole righe nuove o modificate dall'ultima esecuzione.
+        Le righe eliminate dalle sorgenti non sono rilevate. Restituisce True se nessuna stage è fallita.
+        """
+        self._check_populate_strategy(strategy)
+        watermark_table_name = f"{bridge_table_name}{SERVICE_TABLE_SUFFIXES['watermark']}"
+        if not self.silent: print(f"Processo popolamento incrementale per '{bridge_table_name}' (strategy={strategy}, "
+                                  f"watermark={watermark_column or 'PK'})...")
+
+        plan = plan or self.build_population_plan(bridge_table_name)
+        if not plan.is_valid:
+            if not self.silent: print(f"AVVISO: Struttura di '{bridge_table_name}' non definita correttamente. Popolamento non possibile.")
+            return False
+        schema_arg_for_has_table = self.database_name if self.driver == "mysql" else None
+        inspector = sqlalchemy.inspect(self.engine)
+        if not inspector.has_table(bridge_table_name, schema=schema_arg_for_has_table):
+            if not self.silent: print(f"ERRORE: la tabella '{bridge_table_name}' non esiste; eseguire prima 'create'.")
+            return False
+
+        watermark_table_obj = self._get_watermark_table(watermark_table_name)
+        schema_tables = self._get_schema_snapshot()['tables']
+        q = "`" 
+        errors = 0
+        with self.engine.connect() as connection:
+            if inspector.has_table(watermark_table_name, schema=schema_arg_for_has_table) and \
+                    'Source_Table' not in {c['name'] for c in inspector.get_columns(watermark_table_name, schema=schema_arg_for_has_table)}:
+                if not self.silent: print(f"  AVVISO: '{watermark_table_name}' ha il formato precedente e viene ricreata: tutte le stage "
+                                          f"saranno ricaricate per intero.")
+                watermark_table_obj.drop(connection)
+            watermark_table_obj.create(connection, checkfirst=True)
+            connection.commit()
+            stored_watermarks = {}
+            for row in connection.execute(sqlalchemy.select(watermark_table_obj)):
+                stored_watermarks.setdefault(row.Stage, {})[row.Source_Table] = (row.Watermark_Column,
+                                                                                 self._get_stored_watermark_value(row))
+
+            watermark_highs = {}
+
+            def get_watermark(table_name):
+                """(colonna watermark, valore massimo attuale) di una tabella, calcolato una sola volta per esecuzione."""
+                if table_name not in watermark_highs:
+                    source_column_names = {c['name'] for c in schema_tables[table_name]['columns']}
+                    column_name = (watermark_column if watermark_column in source_column_names
+                                   else plan.table_details_map[table_name]['pk_name'])
+                    watermark_highs[table_name] = (column_name, connection.execute(
+                        text(f"SELECT MAX({q}{column_name}{q}) FROM {q}{table_name}{q}")).scalar())
+                return watermark_highs[table_name]
+
+            dimension_cache = None
+            columnar_dimensions = None
+            for table_name in plan.source_tables:
+                if not self._is_populatable_stage(plan, table_name): continue
+                stage = plan.stages[table_name]
+                current_watermarks = {name: get_watermark(name)
+                                      for name in [table_name] + self._get_incremental_dependencies(plan, table_name)}
+                previous_watermarks = stored_watermarks.get(table_name, {})
+                changed_columns = [name for name, (column_name, _) in current_watermarks.items()
+                                   if name in previous_watermarks and previous_watermarks[name][0] != column_name]
+                full_reload = table_name not in previous_watermarks or bool(changed_columns) or \
+                    any(name not in previous_watermarks for name in current_watermarks)
+                if not self.silent:
+                    if table_name not in previous_watermarks:
+                        print(f"  Stage {table_name}: prima esecuzione, ricarica completa.")
+                    elif changed_columns:
+                        print(f"  AVVISO: colonna watermark cambiata per {', '.join(changed_columns)}, ricarica completa di {table_name}.")
+                    elif full_reload:
+                        print(f"  Stage {table_name}: nuove tabelle raggiunte dai join, ricarica completa.")
+                    else:
+                        print(f"  Stage {table_name}: righe nuove o modificate" +
+                              (f" e righe che raggiungono righe nuove o modificate di {', '.join(list(current_watermarks)[1:])}"
+                               if len(current_watermarks) > 1 else "") + ".")
+                try:
+                    with self._stage(table_name):
+                        use_set_based = strategy == "set" and not stage['has_relevant_cycle']
+                        use_vectorized = strategy == "vectorized" and not stage['has_relevant_cycle']
+                        if use_vectorized and columnar_dimensions is None:
+                            columnar_dimensions = self._create_columnar_dimensions(
+                                connection, plan, [name for name in plan.source_tables
+                                                   if plan.stages[name]['populatable'] and not plan.stages[name]['has_relevant_cycle']])
+                        elif not use_set_based and not use_vectorized and dimension_cache is None:
+                            dimension_cache = self._create_dimension_cache(connection, plan, dimension_cache_mb, preload_dimensions)
+                        bridge_writer = None if use_set_based else self._create_bridge_writer(connection, plan, batch_size)
+
+                        def write_stage(source_range):
+                            if use_set_based:
+                                with self._phase("insert", table_name):
+                                    result = connection.execute(self._build_set_based_insert(plan, table_name, source_range))
+                                self._record_rows(table_name, rows_written=result.rowcount)
+                                if not self.silent: print(f"    Inserite {result.rowcount} righe da {table_name}.")
+                            elif use_vectorized:
+                                self._write_stage_vectorized(connection, plan, table_name, columnar_dimensions,
+                                                             bridge_writer, read_chunk_size,
+                                                             source_range)
+                            else:
+                                self._write_stage_row_by_row(connection, plan, table_name, dimension_cache, bridge_writer, read_chunk_size,
+                                                             source_range)
+                            if bridge_writer is not None and bridge_writer.errors:
+                                raise RuntimeError(f"{bridge_writer.errors} blocchi di INSERT falliti")
+
+                        if full_reload:
+                            with self._phase("delete", table_name):
+                                result = connection.execute(self._build_incremental_delete(plan, table_name))
+                            if not self.silent: print(f"    Rimosse {result.rowcount} righe bridge da rigenerare.")
+                            write_stage(None)
+                        else:
+                            keys_select = self._build_incremental_keys_select(
+                                plan, table_name, {name: (column_name, previous_watermarks[name][1])
+                                                   for name, (column_name, _) in current_watermarks.items()})
+                            regenerated_rows = 0
+                            for source_keys in self._iter_incremental_key_chunks(connection, keys_select, read_chunk_size):
+                                with self._phase("delete", table_name):
+                                    result = connection.execute(self._build_incremental_delete(plan, table_name, source_keys))
+                                if not self.silent: print(f"    Rimosse {result.rowcount} righe bridge da rigenerare.")
+                                write_stage((stage['pk_name'], source_keys))
+                                regenerated_rows += len(source_keys)
+                            if not self.silent: print(f"    Rigenerate {regenerated_rows} righe sorgente.")
+                        connection.execute(watermark_table_obj.delete().where(watermark_table_obj.c.Stage == table_name))
+                        connection.execute(watermark_table_obj.insert(), [
+                            {'Stage': table_name, 'Source_Table': name, 'Watermark_Column': column_name, 'Updated_At': datetime.now(),
+                             **self._get_watermark_values(watermark_value)}
+                            for name, (column_name, watermark_value) in current_watermarks.items()])
+                        with self._phase("commit", table_name):
+                            connection.commit()
+                except Exception as e_stage:
+                    connection.rollback()
+                    errors += 1
+                    if not self.silent: print(f"    ERRORE durante il popolamento incrementale di {table_name}, watermark "
+                                              f"non aggiornato: {e_stage}")
+            if dimension_cache is not None: self._report_dimension_cache(dimension_cache.stats())
+        if not self.silent: print(f"Popolamento incrementale di '{bridge_table_name}' completato ({errors} stage con errori).")
+        return errors == 0
+
+    def _get_bridge_verification_totals(self, connection, plan, stage_names, pbk_dimensions):
+        """Righe, SUM delle colonne numeriche e PBK_ orfane per stage, con una sola lettura della bridge."""
+        bridge = plan.bridge_table.alias('b')
+        numeric_columns = list(dict.fromkeys(bridge_col for table_name in stage_names
+                                             for bridge_col, _ in plan.stages[table_name]['numeric_columns']))
+        from_clause = bridge
+        orphan_exprs = []
+        for index, (col_name, (dimension_table, pk_name)) in enumerate(pbk_dimensions.items()):
+            dimension = sqlalchemy.table(dimension_table, sqlalchemy.column(pk_name)).alias(f"d{index}")
+            from_clause = from_clause.outerjoin(dimension, dimension.c[pk_name] == bridge.c[col_name])
+            orphan_exprs.append(sqlalchemy.func.sum(sqlalchemy.case(
+                (sqlalchemy.and_(bridge.c[col_name].is_not(None), dimension.c[pk_name].is_(None)), 1), else_=0)))
+        select_stmt = sqlalchemy.select(bridge.c.Stage, sqlalchemy.func.count(),
+                                        *(sqlalchemy.func.sum(bridge.c[c]) for c in numeric_columns),
+                                        *orphan_exprs).select_from(from_clause).group_by(bridge.c.Stage)
+        totals = {}
+        for row in connection.execute(select_stmt):
+            sums = row[2:2 + len(numeric_columns)]
+            orphans = row[2 + len(numeric_columns):]
+            totals[row[0]] = {'rows': int(row[1]), 'sums': dict(zip(numeric_columns, sums)),
+                              'orphans': {col_name: int(n or 0) for col_name, n in zip(pbk_dimensions, orphans) if n}}
+        return totals
+
+    def _get_source_verification_totals(self, connection, plan, table_name):
+        """Righe e totali (SUM, o COUNT per le misure count delle stage aggregate) delle colonne numeriche di una tabella sorgente."""
+        stage = plan.stages[table_name]
+        measure_functions = dict(stage['aggregate']['measures']) if stage['aggregate'] else {}
+        source = sqlalchemy.table(table_name, *(sqlalchemy.column(c) for _, c in stage['numeric_columns']))
+        exprs = [getattr(sqlalchemy.func, measure_functions.get(bridge_col, "sum"))(source.c[source_col])
+                 for bridge_col, source_col in stage['numeric_columns']]
+        row = connection.execute(sqlalchemy.select(sqlalchemy.func.count(), *exprs).select_from(source)).one()
+        return int(row[0]), list(row[1:])
+
+    @staticmethod
+    def _totals_match(source_total, bridge_total):
+        """Confronto dei totali: esatto per interi e DECIMAL, con tolleranza relativa se uno dei due è in virgola mobile."""
+        source_total = source_total if source_total is not None else 0
+        bridge_total = bridge_total if bridge_total is not None else 0
+        if isinstance(source_total, float) or isinstance(bridge_total, float):
+            return math.isclose(float(source_total), float(bridge_total), rel_tol=1e-9, abs_tol=1e-6)
+        return source_total == bridge_total
+
+    @_with_metrics("verify")
+    def verify_puppini_bridge(self, bridge_table_name="Puppini_Bridge", aggregate_stages=None, plan=None):
+        """Verifica la bridge popolata con query aggregate contro le sorgenti; restituisce un BridgeVerification."""
+        if not self.silent: print(f"Processo verifica per '{bridge_table_name}'...")
+        plan = plan or self.build_population_plan(bridge_table_name, aggregate_stages)
+        if not plan.is_valid:
+            if not self.silent: print(f"AVVISO: Struttura di '{bridge_table_name}' non definita correttamente. Verifica non possibile.")
+            return False
+        schema_arg_for_has_table = self.database_name if self.driver == "mysql" else None
+        if not sqlalchemy.inspect(self.engine).has_table(bridge_table_name, schema=schema_arg_for_has_table):
+            if not self.silent: print(f"ERRORE: la tabella '{bridge_table_name}' non esiste; eseguire prima 'create'.")
+            return False
+
+        stage_names = [table_name for table_name in plan.source_tables if plan.stages[table_name]['populatable']]
+        pbk_dimensions = {plan.stages[table_name]['own_pbk_column']: (table_name, plan.stages[table_name]['pk_name'])
+                          for table_name in stage_names if plan.stages[table_name]['own_pbk_column']}
+        stages = []
+        with self._connect_read_only() as connection:
+            with self._phase("read"):
+                bridge_totals = self._get_bridge_verification_totals(connection, plan, stage_names, pbk_dimensions)
+            for table_name in stage_names:
+                stage = plan.stages[table_name]
+                with self._stage(table_name), self._phase("read"):
+                    source_rows, source_totals = self._get_source_verification_totals(connection, plan, table_name)
+                bridge_stage = bridge_totals.get(table_name, {'rows': 0, 'sums': {}, 'orphans': {}})
+                totals = []
+                measure_functions = dict(stage['aggregate']['measures']) if stage['aggregate'] else {}
+                for (bridge_col, source_col), source_total in zip(stage['numeric_columns'], source_totals):
+                    bridge_total = bridge_stage['sums'].get(bridge_col)
+                    totals.append({'bridge_column': bridge_col, 'source_column': source_col,
+                                   'function': measure_functions.get(bridge_col, "sum"),
+                                   'source': source_total, 'bridge': bridge_total, 'ok': self._totals_match(source_total, bridge_total)})
+                rows_checked = not stage['aggregate']
+                rows_ok = not rows_checked or source_rows == bridge_stage['rows']
+                stage_ok = rows_ok and not bridge_stage['orphans'] and all(t['ok'] for t in totals)
+                stages.append({'table': table_name, 'ok': stage_ok, 'source_rows': source_rows, 'bridge_rows': bridge_stage['rows'],
+                               'rows_checked': rows_checked, 'orphans': bridge_stage['orphans'], 'totals': totals})
+                if not self.silent and not stage_ok: print(f"  AVVISO: differenze nella stage {table_name}.")
+            connection.rollback()
+
+        unknown_stages = {stage_name: totals['rows'] for stage_name, totals in bridge_totals.items() if stage_name not in stage_names}
+        verification = BridgeVerification(bridge_table_name, stages, unknown_stages)
+        self.last_verification = verification
+        if not self.silent:
+            failed = sum(1 for stage in stages if not stage['ok']) + len(unknown_stages)
+            print(f"Verifica completata: {len(stages)} stage, {failed} con differenze.")
+        return verification
+
+    def _get_fk_rules(self):
+        """Regole ON DELETE / ON UPDATE delle FK dello schema come {(tabella, vincolo): (delete_rule, update_rule)} (solo MySQL)."""
+        if self.driver != "mysql": return {}
+        with self.engine.connect() as connection:
+            rows = connection.execute(text(
+                "SELECT TABLE_NAME, CONSTRAINT_NAME, DELETE_RULE, UPDATE_RULE FROM information_schema.REFERENTIAL_CONSTRAINTS "
+                "WHERE CONSTRAINT_SCHEMA = :schema"), {"schema": self.database_name}).all()
+        as_str = lambda v: v.decode("utf-8") if isinstance(v, (bytes, bytearray)) else v
+        return {(as_str(table_name), as_str(constraint_name)): (as_str(delete_rule), as_str(update_rule))
+                for table_name, constraint_name, delete_rule, update_rule in rows}
+
+    def _get_drop_fk_sql(self, table_name, constraint_names):
+        """Un solo ALTER TABLE con un DROP FOREIGN KEY per ogni vincolo della tabella."""
+        q = "`"
+        return f"ALTER TABLE {q}{table_name}{q} " + ", ".join(f"DROP FOREIGN KEY {q}{name}{q}" for name in constraint_names) + ";"
+
+    def _get_add_fk_sql(self, table_name, fk_definitions):
+        """Un solo ALTER TABLE con un ADD CONSTRAINT ... FOREIGN KEY per ogni definizione (formato del backup di remove_foreign_keys)."""
+        q = "`"
+        clauses = []
+        for constraint_name, fk_info in fk_definitions:
+            columns = ", ".join(f"{q}{c}{q}" for c in fk_info['columns'])
+            referred_columns = ", ".join(f"{q}{c}{q}" for c in fk_info['referred_columns'])
+            clause = (f"ADD CONSTRAINT {q}{constraint_name}{q} FOREIGN KEY ({columns}) "
+                      f"REFERENCES {q}{fk_info['referred_table']}{q} ({referred_columns})")
+            if fk_info.get('on_delete'): clause += f" ON DELETE {fk_info['on_delete']}"
+            if fk_info.get('on_update'): clause += f" ON UPDATE {fk_info['on_update']}"
+            clauses.append(clause)
+        return f"ALTER TABLE {q}{table_name}{q} " + ", ".join(clauses) + ";"
+
+    def _execute_table_alters(self, alter_sql_by_table, workers=1, foreign_key_checks=True):
+        """Esegue un ALTER TABLE per tabella su al massimo workers connessioni; restituisce le tabelle con errori."""
+        def run_alter(table_name, alter_sql):
+            with self.engine.connect() as connection:
+                if not foreign_key_checks: connection.execute(text("SET foreign_key_checks = 0"))
+                try:
+                    with self._stage(table_name), self._phase("ddl", table_name):
+                        connection.execute(text(alter_sql))
+                    connection.commit()
+                finally:
+                    if not foreign_key_checks: connection.execute(text("SET foreign_key_checks = 1"))
+
+        errors = 0
+        with ThreadPoolExecutor(max_workers=max(1, int(workers))) as executor:
+            futures = {executor.submit(run_alter, table_name, alter_sql): table_name
+                       for table_name, alter_sql in alter_sql_by_table.items()}
+            for future in as_completed(futures):
+                table_name = futures[future]
+                try:
+                    future.result()
+                    if not self.silent: print(f"  {table_name}: ALTER TABLE eseguito.")
+                except Exception as e_alter:
+                    errors += 1
+                    if not self.silent: print(f"  ERRORE durante l'ALTER TABLE di {table_name}: {e_alter}")
+        return errors
+
+    @_with_metrics("remove_fks")
+    def remove_foreign_keys(self, to_sql=False, backup_path=None, workers=1):
         """
         Genera o esegue i comandi SQL ALTER TABLE per rimuovere tutte le FK dalle tabelle sorgente.
+        Con backup_path le definizioni sono prima salvate in JSON per restore_foreign_keys.
         Se to_sql è True, restituisce una lista di stringhe SQL ALTER TABLE.
         Se to_sql è False, esegue gli ALTER TABLE direttamente e restituisce True/False.
         """
-        if not self.silent: print(f"Processo rimozione Foreign Keys (to_sql={to_sql})...")
-        source_table_names = self._get_source_table_names()
-        alter_sql_commands = []
+        if not self.silent: print(f"Processo rimozione Foreign Keys (to_sql={to_sql}, workers={workers})...")
+        fk_definitions = self.analyze_naming_convention()
+        fk_rules = self._get_fk_rules()
+        constraints_by_table = OrderedDict()
+        for constraint_name, fk_info in fk_definitions.items():
+            fk_info['on_delete'], fk_info['on_update'] = fk_rules.get((fk_info['table'], constraint_name), (None, None))
+            constraints_by_table.setdefault(fk_info['table'], []).append(constraint_name)
+
+        # Attualmente gestisce solo MySQL, dato che la logica per SQL Server è stata rimossa prima
+        alter_sql_by_table = OrderedDict()
+        if self.driver == "mysql":
+            for table_name, constraint_names in constraints_by_table.items():
+                alter_sql_by_table[table_name] = self._get_drop_fk_sql(table_name, constraint_names)
+
+        if backup_path and fk_definitions:
+            with open(backup_path, "w", encoding="utf-8") as backup_file:
+                json.dump({'database': self.database_name, 'foreign_keys': fk_definitions}, backup_file, indent=2)
+            if not self.silent: print(f"  Definizioni di {len(fk_definitions)} FK salvate in '{backup_path}'.")
 
-        for table_name in source_table_names:
-            try:
-                fks = self.inspector.get_foreign_keys(table_name)
-                for fk_info in fks:
-                    constraint_name = fk_info.get('name')
-                    if constraint_name:
-                        sql_drop_fk = ""
-                        # Attualmente gestisce solo MySQL, dato che la logica per SQL Server è stata rimossa prima
-                        if self.driver == "mysql":
-                            q_table = "`"
-                            drop_syntax = f"DROP FOREIGN KEY `{constraint_name}`"
-                            sql_drop_fk = f"ALTER TABLE {q_table}{table_name}{q_table} {drop_syntax};"
-                        # Se si volesse aggiungere il supporto per altri DB qui, si farebbe con elif
-                        # elif self.driver == "altro_driver":
-                        #    ...
-                        
-                        if sql_drop_fk: 
-                            alter_sql_commands.append(sql_drop_fk)
-            except Exception as e_get_fks:
-                 if not self.silent: print(f"  ERRORE nel processare le FK per la tabella {table_name}: {e_get_fks}")
-        
         if to_sql:
-            if not self.silent: print(f"Generati {len(alter_sql_commands)} comandi SQL ALTER TABLE per DROP FK (restituiti).")
-            return alter_sql_commands
+            if not self.silent: print(f"Generati {len(alter_sql_by_table)} comandi SQL ALTER TABLE per DROP FK (restituiti).")
+            return list(alter_sql_by_table.values())
         else: # Esegui direttamente
-            if not self.silent: print("Esecuzione diretta rimozione Foreign Keys...")
-            try:
-                with self.engine.connect() as connection:
-                    for cmd_str in alter_sql_commands:
-                        if not cmd_str.startswith("--"): # Ignora commenti (es. per SQLite)
-                            # if not self.silent: print(f"    Esecuzione: {cmd_str[:100]}...") # Debug
-                            connection.execute(text(cmd_str))
-                    connection.commit()
-                if not self.silent: print("Rimozione Foreign Keys completata con successo.")
-                return True
-            except Exception as e_exec_drop:
-                if not self.silent: print(f"ERRORE durante l'esecuzione diretta della rimozione delle FK: {e_exec_drop}")
+            if not self.silent: print(f"Esecuzione diretta rimozione di {len(fk_definitions)} Foreign Keys da "
+                                      f"{len(alter_sql_by_table)} tabelle...")
+            errors = self._execute_table_alters(alter_sql_by_table, workers)
+            if errors:
+                if not self.silent: print(f"ERRORE durante l'esecuzione diretta della rimozione delle FK ({errors} tabelle con errori).")
                 return False
+            if not self.silent: print("Rimozione Foreign Keys completata con successo.")
+            return True
+
+    @_with_metrics("restore_fks")
+    def restore_foreign_keys(self, backup_path, to_sql=False, skip_validation=False, workers=1):
+        """
+        Ripristina le FK salvate da remove_foreign_keys, saltando quelle già presenti (solo MySQL).
+        Con to_sql=True restituisce gli statement invece di eseguirli, altrimenti True/False.
+        """
+        if not self.silent: print(f"Processo ripristino Foreign Keys da '{backup_path}' (to_sql={to_sql}, "
+                                  f"skip_validation={skip_validation}, workers={workers})...")
+        if self.driver != "mysql":
+            if not self.silent: print("AVVISO: il ripristino delle FK è supportato solo su MySQL.")
+            return [] if to_sql else False
+        with open(backup_path, encoding="utf-8") as backup_file:
+            fk_definitions = json.load(backup_file)['foreign_keys']
+
+        schema_tables = self._get_schema_snapshot()['tables']
+        definitions_by_table = OrderedDict()
+        existing = 0
+        for constraint_name, fk_info in fk_definitions.items():
+            table_entry = schema_tables.get(fk_info['table'])
+            if table_entry is None:
+                if not self.silent: print(f"  AVVISO: tabella {fk_info['table']} non trovata, FK {constraint_name} saltata.")
+                continue
+            if any(fk.get('name') == constraint_name for fk in table_entry['fks']):
+                existing += 1
+                continue
+            definitions_by_table.setdefault(fk_info['table'], []).append((constraint_name, fk_info))
+        if existing and not self.silent: print(f"  {existing} FK già presenti, saltate.")
+        alter_sql_by_table = OrderedDict((table_name, self._get_add_fk_sql(table_name, definitions))
+                                         for table_name, definitions in definitions_by_table.items())
+
+        if to_sql:
+            alter_sql_commands = list(alter_sql_by_table.values())
+            if skip_validation and alter_sql_commands:
+                alter_sql_commands = ["SET foreign_key_checks = 0;"] + alter_sql_commands + ["SET foreign_key_checks = 1;"]
+            if not self.silent: print(f"Generati {len(alter_sql_by_table)} comandi SQL ALTER TABLE per ADD FK (restituiti).")
+            return alter_sql_commands
+        if not self.silent: print(f"Esecuzione diretta ripristino di {sum(len(d) for d in definitions_by_table.values())} Foreign Keys su "
+                                  f"{len(alter_sql_by_table)} tabelle...")
+        errors = self._execute_table_alters(alter_sql_by_table, workers, foreign_key_checks=not skip_validation)
+        if errors:
+            if not self.silent: print(f"ERRORE durante il ripristino delle FK ({errors} tabelle con errori).")
+            return False
+        if not self.silent: print("Ripristino Foreign Keys completato con successo.")
+        return True
 
 
     def analyze_naming_convention(self):
@@ -409,11 +2772,12 @@ class PuppiniBridgeManager:
         """
         if not self.silent: print("Analisi convenzione di denominazione FK...")
         source_table_names = self._get_source_table_names()
+        schema_tables = self._get_schema_snapshot()['tables']
         fk_analysis = {}
 
         for table_name in source_table_names:
             try:
-                fks = self.inspector.get_foreign_keys(table_name)
+                fks = schema_tables[table_name]['fks']
                 for fk_info in fks:
                     constraint_name = fk_info.get('name')
                     constrained_columns = fk_info.get('constrained_columns')
@@ -0,0 +1,149 @@
+import functools
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from inspect import signature
+
+logger = logging.getLogger("puppini_bridge")
+
+
+class PopulationMetrics:
+    """Metriche di un'operazione del manager: tempi per fase, righe e statement SQL per stage. Thread-safe."""
+    def __init__(self, operation, attributes=None, callback=None):
+        self.operation = operation
+        self.attributes = attributes or {}
+        self.callback = callback
+        self.started_at = time.time()
+        self.duration_s = None
+        self.success = None
+        self.statements = 0
+        self.phases = OrderedDict()
+        self.stages = OrderedDict()
+        self.dimension_cache = None
+        self._started = time.perf_counter()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def _stage_entry(self, stage):
+        entry = self.stages.get(stage)
+        if entry is None:
+            entry = self.stages[stage] = {'rows_read': 0, 'rows_written': 0, 'statements': 0, 'seconds': 0.0, 'phases': OrderedDict()}
+        return entry
+
+    def add_phase(self, name, seconds, stage=None):
+        with self._lock:
+            self.phases[name] = self.phases.get(name, 0.0) + seconds
+            if stage is not None:
+                stage_phases = self._stage_entry(stage)['phases']
+                stage_phases[name] = stage_phases.get(name, 0.0) + seconds
+
+    def add_rows(self, stage, rows_read=0, rows_written=0):
+        with self._lock:
+            entry = self._stage_entry(stage)
+            entry['rows_read'] += rows_read
+            entry['rows_written'] += rows_written
+
+    def count_statement(self):
+        stage = getattr(self._local, 'stage', None)
+        with self._lock:
+            self.statements += 1
+            if stage is not None: self._stage_entry(stage)['statements'] += 1
+
+    @contextmanager
+    def phase(self, name, stage=None):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_phase(name, time.perf_counter() - started, stage)
+
+    @contextmanager
+    def stage(self, stage):
+        """Attribuisce alla stage gli statement eseguiti dal thread corrente e ne misura la durata."""
+        if getattr(self._local, 'stage', None) == stage:
+            yield
+            return
+        previous_stage = getattr(self._local, 'stage', None)
+        self._local.stage = stage
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._local.stage = previous_stage
+            with self._lock:
+                entry = self._stage_entry(stage)
+                entry['seconds'] += time.perf_counter() - started
+                stage_event = dict(entry, phases=dict(entry['phases']))
+            self._emit(dict(event='stage', operation=self.operation, stage=stage, **stage_event))
+
+    @contextmanager
+    def attribute(self, stage):
+        """Attribuisce alla stage gli statement del thread corrente senza misurarne la durata (thread ausiliari della pipeline)."""
+        previous_stage = getattr(self._local, 'stage', None)
+        self._local.stage = stage
+        try:
+            yield
+        finally:
+            self._local.stage = previous_stage
+
+    def finish(self, success):
+        self.duration_s = time.perf_counter() - self._started
+        self.success = success
+        self._emit(dict(event='summary', **self.to_dict()))
+
+    def to_dict(self):
+        with self._lock:
+            return {
+                'operation': self.operation,
+                'attributes': dict(self.attributes),
+                'started_at': time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(self.started_at)),
+                'duration_s': round(self.duration_s, 6) if self.duration_s is not None else None,
+                'success': self.success,
+                'statements': self.statements,
+                'phases': {name: round(seconds, 6) for name, seconds in self.phases.items()},
+                'stages': {stage: dict(entry, seconds=round(entry['seconds'], 6),
+                                       phases={n: round(v, 6) for n, v in entry['phases'].items()})
+                           for stage, entry in self.stages.items()},
+                'dimension_cache': self.dimension_cache,
+            }
+
+    def _emit(self, metrics_event):
+        logger.info(json.dumps(metrics_event, default=str))
+        if self.callback is not None:
+            try:
+                self.callback(metrics_event)
+            except Exception as e_callback:
+                logger.warning(f"Callback delle metriche fallita: {e_callback}")
+
+
+def _with_metrics(operation):
+    """Registra le metriche di un metodo pubblico del manager in last_metrics e le invia a metrics_callback."""
+    def decorator(method):
+        method_signature = signature(method)
+
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs):
+            active_metrics = self._active_metrics
+            if active_metrics is not None:
+                with active_metrics.phase(operation):
+                    return method(self, *args, **kwargs)
+            bound_arguments = method_signature.bind(self, *args, **kwargs)
+            bound_arguments.apply_defaults()
+            attributes = {name: value for name, value in bound_arguments.arguments.items()
+                          if name != 'self' and isinstance(value, (str, int, float, bool, type(None)))}
+            metrics = PopulationMetrics(operation, attributes, self.metrics_callback)
+            self._active_metrics = metrics
+            self.last_metrics = metrics
+            success = False
+            try:
+                result = method(self, *args, **kwargs)
+                success = result is not False
+                return result
+            finally:
+                self._active_metrics = None
+                metrics.finish(success)
+        return wrapper
+    return decorator
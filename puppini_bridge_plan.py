@@ -0,0 +1,232 @@
+import copy
+
+from sqlalchemy import MetaData, Table
+
+
+def _format_bytes(size):
+    for unit in ("B", "KB", "MB", "GB"):
+        if size < 1024: return f"{size:.1f} {unit}" if unit != "B" else f"{int(size)} B"
+        size /= 1024
+    return f"{size:.1f} TB"
+
+
+def _format_duration(seconds):
+    if seconds < 60: return f"{seconds:.1f} s"
+    minutes, seconds = divmod(int(round(seconds)), 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours}h {minutes:02d}m {seconds:02d}s" if hours else f"{minutes}m {seconds:02d}s"
+
+
+class PopulationPlan:
+    """
+    Piano di popolamento della Puppini Bridge, compilato da PuppiniBridgeManager.build_population_plan.
+    fk_edges e stages descrivono per ogni tabella archi FK, join, colonne e layout delle righe bridge.
+    """
+
+    def __init__(self, bridge_table_name, ordered_columns, bridge_cols_set, table_details_map, source_tables,
+                 fk_edges, stages, cyclic_tables,
+                 dialect=None):
+        self.bridge_table_name = bridge_table_name
+        self.is_valid = bool(ordered_columns) and len(ordered_columns) > 1
+        self.bridge_table = Table(bridge_table_name, MetaData(), *ordered_columns) if self.is_valid else None
+        self.bridge_cols_set = bridge_cols_set
+        self.table_details_map = table_details_map
+        self.source_tables = source_tables
+        self.fk_edges = fk_edges
+        self.stages = stages
+        self.cyclic_tables = cyclic_tables
+        self.dialect = dialect
+        self.stage_selection = None
+
+    def select_stages(self, stage_names):
+        """
+        Copia del piano che popola solo le stage indicate (nell'ordine di source_tables): i backend iterano
+        source_tables, mentre archi FK e dettagli delle tabelle restano quelli dell'intero schema.
+        """
+        plan = copy.copy(self)
+        plan.source_tables = [table_name for table_name in self.source_tables if table_name in stage_names]
+        plan.stage_selection = list(plan.source_tables)
+        return plan
+
+    def for_table(self, table_name):
+        """Copia del piano che scrive in un'altra tabella con le stesse colonne (es. la tabella ombra di rebuild)."""
+        plan = copy.copy(self)
+        plan.bridge_table_name = table_name
+        plan.bridge_table = self.bridge_table.to_metadata(MetaData(), name=table_name) if self.is_valid else None
+        return plan
+
+    def _type_sql(self, col_type):
+        try:
+            return str(col_type.compile(dialect=self.dialect))
+        except Exception:
+            return repr(col_type)
+
+    def to_dict(self):
+        """Rappresentazione serializzabile in JSON del piano."""
+        stages = []
+        for table_name, stage in self.stages.items():
+            if not stage['populatable']:
+                stages.append({'table': table_name, 'populatable': False})
+                continue
+            stages.append({
+                'table': table_name,
+                'populatable': True,
+                'pk_name': stage['pk_name'],
+                'set_based': not stage['has_relevant_cycle'],
+                'has_relevant_cycle': stage['has_relevant_cycle'],
+                'columns': [{'name': name, 'position': stage['column_positions'][name]} for name in stage['bridge_columns']],
+                'numeric_columns': [{'bridge_column': bridge_col, 'source_column': source_col}
+                                    for bridge_col, source_col in stage['numeric_columns']],
+                'joins': [dict(join) for join in stage['joins']],
+                'pbk_sources': {col_name: [{'condition_alias': condition_alias, 'value_alias': value_alias, 'value_column': value_column}
+                                           for condition_alias, value_alias, value_column in sources]
+                                for col_name, sources in stage['pbk_sources'].items()},
+                'aggregate': {'group_by': list(stage['aggregate']['group_by']),
+                              'measures': [{'column': name, 'function': function} for name, function in stage['aggregate']['measures']]}
+                             if stage['aggregate'] else None,
+            })
+        return {
+            'bridge_table': self.bridge_table_name,
+            'bridge_columns': [{'position': i, 'name': c.name, 'type': self._type_sql(c.type)}
+                               for i, c in enumerate(self.bridge_table.columns)] if self.is_valid else [],
+            'cyclic_tables': list(self.cyclic_tables),
+            'stages': stages,
+        }
+
+    def to_text(self):
+        """Rappresentazione testuale del piano, in stile EXPLAIN."""
+        if not self.is_valid:
+            return f"-- Struttura di {self.bridge_table_name} non definita correttamente: nessun piano di popolamento."
+        lines = [f"Piano di popolamento per '{self.bridge_table_name}' ({len(self.bridge_table.columns)} colonne, "
+                 f"{sum(1 for stage in self.stages.values() if stage['populatable'])} stage)"]
+        lines.append("Colonne bridge: " + ", ".join(f"[{i}] {c.name}" for i, c in enumerate(self.bridge_table.columns)))
+        lines.append("Tabelle in cicli di FK: " + (", ".join(self.cyclic_tables) if self.cyclic_tables else "nessuna"))
+        for table_name, stage in self.stages.items():
+            lines.append("")
+            if not stage['populatable']:
+                lines.append(f"Stage {table_name}: saltata (nessuna PK singola)")
+                continue
+            mode = "riga per riga (ciclo rilevante nel grafo delle FK)" if stage['has_relevant_cycle'] else "set-based o riga per riga"
+            lines.append(f"Stage {table_name} (PK {stage['pk_name']}) - {mode}")
+            positions = stage['column_positions']
+            if stage['own_pbk_column']:
+                lines.append(f"  [{positions[stage['own_pbk_column']]}] {stage['own_pbk_column']} <- s.{stage['pk_name']}")
+            for bridge_col, source_col in stage['numeric_columns']:
+                lines.append(f"  [{positions[bridge_col]}] {bridge_col} <- s.{source_col}")
+            lines.append("  Join:")
+            for join in stage['joins']:
+                if join['parent_alias'] is None:
+                    lines.append(f"    {join['alias']} = {join['table']}")
+                else:
+                    lines.append(f"    {join['alias']} = {join['table']} ON {join['alias']}.{join['pk_name']} = "
+                                 f"{join['parent_alias']}.{join['fk_column']}")
+            for col_name in stage['bridge_columns']:
+                sources = stage['pbk_sources'].get(col_name)
+                if not sources: continue
+                described = [f"{value_alias}.{value_column}" if condition_alias is None
+                             else f"{value_alias}.{value_column} se esiste {condition_alias}"
+                             for condition_alias, value_alias, value_column in sources]
+                lines.append(f"  [{positions[col_name]}] {col_name} <- " + ", altrimenti ".join(described))
+            if stage['aggregate']:
+                measures = ", ".join(f"{function.upper()}({name})" for name, function in stage['aggregate']['measures'])
+                lines.append(f"  Aggregata per Stage, {', '.join(stage['aggregate']['group_by'])}: {measures or 'nessuna misura'}")
+        return "\n".join(lines)
+
+
+class PopulationEstimate:
+    """Stima di un popolamento calcolata da PuppiniBridgeManager.estimate_puppini_bridge."""
+
+    def __init__(self, bridge_table_name, sample_rows, strategies, stages, fixed, notes=None):
+        self.bridge_table_name = bridge_table_name
+        self.sample_rows = sample_rows
+        self.strategies = list(strategies)
+        self.stages = stages
+        self.fixed = fixed
+        self.notes = notes or []
+
+    @property
+    def bridge_rows(self):
+        return sum(stage['bridge_rows'] for stage in self.stages)
+
+    @property
+    def bridge_bytes(self):
+        return sum(stage['bridge_bytes'] for stage in self.stages)
+
+    def totals(self, strategy):
+        """Statement e secondi stimati dell'intero popolamento con la strategia indicata."""
+        fixed = self.fixed.get(strategy, {'statements': 0, 'seconds': 0.0})
+        return {'statements': fixed['statements'] + sum(stage['strategies'][strategy]['statements'] for stage in self.stages),
+                'seconds': fixed['seconds'] + sum(stage['strategies'][strategy]['seconds'] for stage in self.stages)}
+
+    def to_dict(self):
+        """Rappresentazione serializzabile in JSON della stima."""
+        return {
+            'bridge_table': self.bridge_table_name,
+            'sample_rows': self.sample_rows,
+            'bridge_rows': self.bridge_rows,
+            'bridge_bytes': self.bridge_bytes,
+            'strategies': {strategy: dict(self.totals(strategy), seconds=round(self.totals(strategy)['seconds'], 3))
+                           for strategy in self.strategies},
+            'fixed': self.fixed,
+            'stages': self.stages,
+            'notes': list(self.notes),
+        }
+
+    def to_text(self):
+        """Rappresentazione testuale della stima."""
+        lines = [f"Stima di popolamento per '{self.bridge_table_name}' (campione di al massimo {self.sample_rows} righe per stage)",
+                 f"Righe bridge stimate: {self.bridge_rows}, dimensione stimata: {_format_bytes(self.bridge_bytes)} (dati, senza indici)"]
+        for strategy in self.strategies:
+            totals = self.totals(strategy)
+            lines.append(f"  {strategy:<10} {totals['statements']:>12} statement SQL, tempo stimato {_format_duration(totals['seconds'])}")
+        for stage in self.stages:
+            lines.append("")
+            arrow = "-> al massimo" if stage['aggregated'] else "->"
+            lines.append(f"Stage {stage['table']}: {stage['source_rows']} righe sorgente {arrow} {stage['bridge_rows']} righe bridge "
+                         f"(~{stage['row_bytes']} B/riga, {_format_bytes(stage['bridge_bytes'])}), "
+                         f"campione di {stage['sample_rows']} righe")
+            lines.append("  " + " | ".join(f"{strategy}: {estimate['statements']} statement, {_format_duration(estimate['seconds'])}"
+                                           for strategy, estimate in stage['strategies'].items()))
+            for explain_line in stage['explain']:
+                lines.append(f"  EXPLAIN {explain_line}")
+            if stage['full_scans']:
+                lines.append(f"  AVVISO: {stage['full_scans']} join senza indice (full scan) nel SELECT set-based.")
+        for note in self.notes:
+            lines.append(f"NOTA: {note}")
+        return "\n".join(lines)
+
+
+class BridgeVerification:
+    """Esito di PuppiniBridgeManager.verify_puppini_bridge: righe, PBK_ orfane e totali numerici per stage."""
+
+    def __init__(self, bridge_table_name, stages, unknown_stages):
+        self.bridge_table_name = bridge_table_name
+        self.stages = stages
+        self.unknown_stages = unknown_stages
+
+    @property
+    def ok(self):
+        return not self.unknown_stages and all(stage['ok'] for stage in self.stages)
+
+    def to_dict(self):
+        """Rappresentazione serializzabile in JSON della verifica."""
+        return {'bridge_table': self.bridge_table_name, 'ok': self.ok, 'stages': self.stages, 'unknown_stages': dict(self.unknown_stages)}
+
+    def to_text(self):
+        """Rappresentazione testuale della verifica, una riga per stage più il dettaglio delle differenze."""
+        lines = [f"Verifica di '{self.bridge_table_name}': {'OK' if self.ok else 'DIFFERENZE TROVATE'}"]
+        for stage in self.stages:
+            rows = f"{stage['bridge_rows']} righe bridge / {stage['source_rows']} righe sorgente"
+            if not stage['rows_checked']: rows += " (stage aggregata, conteggio non confrontato)"
+            lines.append(f"  {'OK ' if stage['ok'] else 'KO '} {stage['table']}: {rows}")
+            if stage['rows_checked'] and stage['bridge_rows'] != stage['source_rows']:
+                lines.append(f"      righe: differenza {stage['bridge_rows'] - stage['source_rows']:+d}")
+            for col_name, orphans in stage['orphans'].items():
+                lines.append(f"      {col_name}: {orphans} valori senza riga corrispondente nella dimensione")
+            for total in stage['totals']:
+                if not total['ok']:
+                    lines.append(f"      {total['function'].upper()}({total['source_column']}) = {total['source']} nella sorgente, "
+                                 f"SUM({total['bridge_column']}) = {total['bridge']} nella bridge")
+        for stage_name, rows in self.unknown_stages.items():
+            lines.append(f"  KO  Stage '{stage_name}' sconosciuta: {rows} righe bridge senza tabella sorgente")
+        return "\n".join(lines)
@@ -0,0 +1,440 @@
+import csv
+import itertools
+import os
+import queue
+import threading
+import time
+from contextlib import nullcontext
+from datetime import date, datetime
+from decimal import Decimal
+
+import sqlalchemy
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+    pq = None
+
+
+def _estimate_literal_width(col_type):
+    """Stima (per eccesso) i byte occupati da un valore della colonna scritto come literal SQL."""
+    if isinstance(col_type, sqlalchemy.types.String):
+        return (col_type.length or 255) + 2
+    if isinstance(col_type, sqlalchemy.types.Numeric):
+        return (getattr(col_type, 'precision', None) or 24) + 2
+    if isinstance(col_type, sqlalchemy.types.Integer):
+        return 20
+    if isinstance(col_type, (sqlalchemy.types.Date, sqlalchemy.types.DateTime, sqlalchemy.types.Time)):
+        return 28
+    return 64
+
+
+def _rows_per_packet(bridge_table_obj, stage_name, column_names, batch_size, max_packet_bytes, safety_ratio=0.8):
+    """
+    Numero di righe per INSERT multi-riga: batch_size, ridotto se la dimensione stimata dello
+    statement supererebbe safety_ratio * max_packet_bytes (max_allowed_packet di MySQL).
+    """
+    batch_size = max(1, int(batch_size))
+    if not max_packet_bytes:
+        return batch_size
+    columns_by_name = bridge_table_obj.columns
+    row_bytes = 4 + sum((len(stage_name) + 2) if name == 'Stage' else _estimate_literal_width(columns_by_name[name].type) + 2
+                        for name in column_names)
+    header_bytes = 64 + sum(len(name) + 4 for name in column_names) + len(bridge_table_obj.name)
+    rows_fitting_packet = int((max_packet_bytes * safety_ratio - header_bytes) // row_bytes)
+    return max(1, min(batch_size, rows_fitting_packet))
+
+
+def _compile_positional_insert(bridge_table_obj, column_names, dialect):
+    """INSERT con segnaposto posizionali del driver: (sql, [(posizione, bind processor)]) o (None, [])."""
+    if dialect.paramstyle in ("format", "pyformat"):
+        placeholders = ["%s"] * len(column_names)
+    elif dialect.paramstyle == "qmark":
+        placeholders = ["?"] * len(column_names)
+    elif dialect.paramstyle == "numeric":
+        placeholders = [f":{position + 1}" for position in range(len(column_names))]
+    else:
+        return None, []
+    preparer = dialect.identifier_preparer
+    quoted_columns = ", ".join(preparer.quote(name) for name in column_names)
+    insert_sql = f"INSERT INTO {preparer.format_table(bridge_table_obj)} ({quoted_columns}) VALUES ({', '.join(placeholders)})"
+    bind_processors = []
+    for position, name in enumerate(column_names):
+        bind_processor = bridge_table_obj.c[name].type.dialect_impl(dialect).bind_processor(dialect)
+        if bind_processor is not None:
+            bind_processors.append((position, bind_processor))
+    return insert_sql, bind_processors
+
+
+class _BridgeRowWriter:
+    """
+    Scrive le righe bridge di una stage a blocchi con executemany, ogni blocco in un SAVEPOINT.
+    I blocchi sono limitati da batch_size e da max_packet_bytes.
+    """
+    PACKET_SAFETY_RATIO = 0.8
+    STATEMENTS_PER_BATCH = 3  # SAVEPOINT, INSERT, RELEASE SAVEPOINT
+
+    def __init__(self, connection, bridge_table_obj, batch_size=1000, max_packet_bytes=None, silent=False, metrics=None):
+        self.connection = connection
+        self.bridge_table_obj = bridge_table_obj
+        self.batch_size = max(1, int(batch_size))
+        self.max_packet_bytes = max_packet_bytes
+        self.silent = silent
+        self.metrics = metrics
+        self.stage_name = None
+        self.stage_columns = []
+        self.rows_per_batch = self.batch_size
+        self.insert_stmt = None
+        self.insert_sql = None
+        self.bind_processors = []
+        self.buffer = []
+        self.rows_written = 0
+        self.batches = 0
+        self.errors = 0
+
+    def start_stage(self, stage_name, column_names):
+        """Scrive le righe pendenti e prepara il blocco per una nuova stage con le colonne indicate."""
+        self.flush()
+        self.stage_name = stage_name
+        self.stage_columns = list(column_names)
+        self.rows_per_batch = _rows_per_packet(self.bridge_table_obj, stage_name, self.stage_columns, self.batch_size,
+                                               self.max_packet_bytes, self.PACKET_SAFETY_RATIO)
+        self.insert_stmt = self.bridge_table_obj.insert().execution_options(insertmanyvalues_page_size=self.rows_per_batch)
+        self.insert_sql, self.bind_processors = _compile_positional_insert(self.bridge_table_obj, self.stage_columns,
+                                                                           self.connection.dialect)
+
+    def add(self, row_values):
+        """Aggiunge una riga: sequenza di valori nell'ordine delle colonne passate a start_stage."""
+        self.buffer.append(row_values)
+        if len(self.buffer) >= self.rows_per_batch:
+            self.flush()
+
+    def add_columns(self, column_arrays, row_count):
+        """Aggiunge row_count righe in forma colonnare (colonna -> sequenza); le colonne assenti valgono NULL."""
+        columns = [column_arrays[name] if name in column_arrays else itertools.repeat(None, row_count) for name in self.stage_columns]
+        rows = zip(*columns)
+        while True:
+            self.buffer.extend(itertools.islice(rows, self.rows_per_batch - len(self.buffer)))
+            if len(self.buffer) < self.rows_per_batch: break
+            self.flush()
+
+    def _execute_batch(self, batch):
+        if self.insert_sql is None:
+            self.connection.execute(self.insert_stmt, [dict(zip(self.stage_columns, row_values)) for row_values in batch])
+            return
+        if self.bind_processors:
+            driver_rows = []
+            for row_values in batch:
+                row_values = list(row_values)
+                for position, bind_processor in self.bind_processors:
+                    row_values[position] = bind_processor(row_values[position])
+                driver_rows.append(tuple(row_values))
+        else:
+            driver_rows = [tuple(row_values) for row_values in batch]
+        self.connection.exec_driver_sql(self.insert_sql, driver_rows)
+
+    def flush(self):
+        if not self.buffer: return
+        batch = self.buffer
+        self.buffer = []
+        try:
+            started = time.perf_counter()
+            with self.connection.begin_nested():
+                self._execute_batch(batch)
+            if self.metrics is not None:
+                self.metrics.add_phase('insert', time.perf_counter() - started, self.stage_name)
+                self.metrics.add_rows(self.stage_name, rows_written=len(batch))
+            self.rows_written += len(batch)
+            self.batches += 1
+        except Exception as e_batch:
+            self.errors += 1
+            if not self.silent: print(f"    ERRORE durante INSERT di un blocco di {len(batch)} righe da {self.stage_name}: {e_batch}")
+
+
+def _is_decimal_type(col_type):
+    return isinstance(col_type, sqlalchemy.Numeric) and not isinstance(col_type, sqlalchemy.Float)
+
+
+def _get_arrow_type(col_type):
+    """Tipo Arrow di una colonna della bridge; i tipi non riconosciuti sono esportati come stringa."""
+    if isinstance(col_type, sqlalchemy.Boolean): return pa.bool_()
+    if isinstance(col_type, sqlalchemy.Integer): return pa.int64()
+    if isinstance(col_type, sqlalchemy.Float): return pa.float64()
+    if isinstance(col_type, sqlalchemy.Numeric):
+        if col_type.precision is None: return pa.float64()
+        decimal_type = pa.decimal128 if col_type.precision <= 38 else pa.decimal256
+        return decimal_type(col_type.precision, col_type.scale or 0)
+    if isinstance(col_type, sqlalchemy.DateTime): return pa.timestamp("us")
+    if isinstance(col_type, sqlalchemy.Date): return pa.date32()
+    if isinstance(col_type, sqlalchemy.Time): return pa.time64("us")
+    return pa.string()
+
+
+def _to_arrow_array(values, arrow_type):
+    """Converte una colonna di valori Python in array Arrow, adattando float e testo restituiti dal driver (es. SQLite)."""
+    if pa.types.is_decimal(arrow_type):
+        exponent = Decimal(1).scaleb(-arrow_type.scale)
+        values = [Decimal(repr(v)).quantize(exponent) if isinstance(v, float) else v for v in values]
+    elif pa.types.is_timestamp(arrow_type):
+        values = [datetime.fromisoformat(v) if isinstance(v, str) else v for v in values]
+    elif pa.types.is_date(arrow_type):
+        values = [date.fromisoformat(v[:10]) if isinstance(v, str) else v for v in values]
+    elif pa.types.is_string(arrow_type):
+        values = [v if v is None or isinstance(v, str) else str(v) for v in values]
+    return pa.array(values, type=arrow_type)
+
+
+class _BridgeFileWriter:
+    """Stessa interfaccia di _BridgeRowWriter, ma scrive un file CSV o Parquet per stage in output_dir."""
+    PARQUET_MIN_ROW_GROUP = 65536
+
+    def __init__(self, output_dir, bridge_table_obj, file_format="csv", batch_size=1000, silent=False, metrics=None):
+        self.output_dir = output_dir
+        self.file_format = file_format
+        self.column_names = [col.name for col in bridge_table_obj.columns]
+        self.decimal_positions = [i for i, col in enumerate(bridge_table_obj.columns) if _is_decimal_type(col.type)]
+        self.arrow_schema = None
+        if file_format == "parquet":
+            self.arrow_schema = pa.schema([(col.name, _get_arrow_type(col.type)) for col in bridge_table_obj.columns])
+        self.batch_size = max(1, int(batch_size))
+        self.rows_per_batch = max(self.batch_size, self.PARQUET_MIN_ROW_GROUP) if file_format == "parquet" else self.batch_size
+        self.silent = silent
+        self.metrics = metrics
+        self.stage_name = None
+        self.stage_columns = []
+        self.column_positions = []
+        self.current_file = None
+        self.csv_writer = None
+        self.parquet_writer = None
+        self.buffer = []
+        self.files = []
+        self.rows_written = 0
+        self.batches = 0
+        self.errors = 0
+        os.makedirs(output_dir, exist_ok=True)
+
+    def start_stage(self, stage_name, column_names):
+        """Scrive le righe pendenti, chiude il file della stage precedente e apre quello della nuova stage."""
+        self.close()
+        self.stage_name = stage_name
+        self.stage_columns = list(column_names)
+        stage_positions = {name: position for position, name in enumerate(self.stage_columns)}
+        self.column_positions = [stage_positions.get(name) for name in self.column_names]
+        path = os.path.join(self.output_dir, f"{len(self.files) + 1:03d}_{stage_name}.{self.file_format}")
+        self.files.append((stage_name, path))
+        if self.file_format == "parquet":
+            self.parquet_writer = pq.ParquetWriter(path, self.arrow_schema)
+        else:
+            self.current_file = open(path, "w", encoding="utf-8", newline="")
+            self.csv_writer = csv.writer(self.current_file, lineterminator="\n")
+            self.csv_writer.writerow(self.column_names)
+
+    def add(self, row_values):
+        """Aggiunge una riga: sequenza di valori nell'ordine delle colonne passate a start_stage."""
+        self.buffer.append(row_values)
+        if len(self.buffer) >= self.rows_per_batch:
+            self.flush()
+
+    def add_columns(self, column_arrays, row_count):
+        """Aggiunge row_count righe in forma colonnare (colonna -> sequenza); le colonne assenti valgono NULL."""
+        columns = [column_arrays[name] if name in column_arrays else itertools.repeat(None, row_count) for name in self.stage_columns]
+        rows = zip(*columns)
+        while True:
+            self.buffer.extend(itertools.islice(rows, self.rows_per_batch - len(self.buffer)))
+            if len(self.buffer) < self.rows_per_batch: break
+            self.flush()
+
+    def _write_batch(self, batch):
+        if self.parquet_writer is not None:
+            arrays = [_to_arrow_array([row_values[position] for row_values in batch] if position is not None else [None] * len(batch),
+                                      field.type)
+                      for position, field in zip(self.column_positions, self.arrow_schema)]
+            self.parquet_writer.write_table(pa.Table.from_arrays(arrays, schema=self.arrow_schema))
+            return
+        rows = [[row_values[position] if position is not None else None for position in self.column_positions] for row_values in batch]
+        for i in self.decimal_positions:
+            for row in rows:
+                if isinstance(row[i], Decimal): row[i] = format(row[i], "f")
+        self.csv_writer.writerows(rows)
+
+    def flush(self):
+        if not self.buffer: return
+        batch = self.buffer
+        self.buffer = []
+        try:
+            started = time.perf_counter()
+            self._write_batch(batch)
+            if self.metrics is not None:
+                self.metrics.add_phase('write', time.perf_counter() - started, self.stage_name)
+                self.metrics.add_rows(self.stage_name, rows_written=len(batch))
+            self.rows_written += len(batch)
+            self.batches += 1
+        except Exception as e_batch:
+            self.errors += 1
+            if not self.silent: print(f"    ERRORE durante la scrittura su file di un blocco di {len(batch)} righe da "
+                                      f"{self.stage_name}: {e_batch}")
+
+    def close(self):
+        """Scrive le righe pendenti e chiude il file della stage corrente."""
+        self.flush()
+        if self.current_file is not None:
+            self.current_file.close()
+            self.current_file, self.csv_writer = None, None
+        if self.parquet_writer is not None:
+            self.parquet_writer.close()
+            self.parquet_writer = None
+
+
+_END_OF_ITEMS = object()
+
+
+def _iter_in_thread(make_iterator, max_pending):
+    """Esegue make_iterator() in un thread produttore, con una coda di al massimo max_pending elementi."""
+    items = queue.Queue(maxsize=max(1, int(max_pending)))
+    stopped = threading.Event()
+
+    def put(item):
+        while not stopped.is_set():
+            try:
+                items.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def produce():
+        iterator = iter(make_iterator())
+        try:
+            for value in iterator:
+                if not put((value, None)): return
+            put((_END_OF_ITEMS, None))
+        except BaseException as e_producer:
+            put((_END_OF_ITEMS, e_producer))
+        finally:
+            if hasattr(iterator, "close"): iterator.close()
+
+    producer = threading.Thread(target=produce, name="puppini-reader", daemon=True)
+    producer.start()
+    try:
+        while True:
+            value, error = items.get()
+            if error is not None: raise error
+            if value is _END_OF_ITEMS: return
+            yield value
+    finally:
+        stopped.set()
+        producer.join()
+
+
+class _PipelinedBridgeWriter:
+    """Stessa interfaccia di _BridgeRowWriter, ma scrive in un thread con connessione e transazione proprie."""
+
+    def __init__(self, connect, create_writer, batch_size=1000, depth=4, metrics=None):
+        self.connect = connect
+        self.create_writer = create_writer
+        self.batch_size = max(1, int(batch_size))
+        self.metrics = metrics
+        self.pending = []
+        self.commands = queue.Queue(maxsize=max(1, int(depth)))
+        self.aborted = threading.Event()
+        self.failure = None
+        self.writer = None
+        self.thread = threading.Thread(target=self._run, name="puppini-writer", daemon=True)
+        self.thread.start()
+
+    @property
+    def rows_written(self):
+        return self.writer.rows_written if self.writer is not None else 0
+
+    @property
+    def rows_per_batch(self):
+        return self.writer.rows_per_batch if self.writer is not None else self.batch_size
+
+    @property
+    def errors(self):
+        return 1 if self.failure is not None else 0
+
+    def _run(self):
+        try:
+            with self.connect() as connection:
+                self.writer = self.create_writer(connection)
+                try:
+                    while not self.aborted.is_set():
+                        try:
+                            command, payload, done = self.commands.get(timeout=0.1)
+                        except queue.Empty:
+                            continue
+                        stage_name = self.writer.stage_name
+                        with self.metrics.attribute(stage_name) if self.metrics is not None and stage_name else nullcontext():
+                            if command == "stage":
+                                self.writer.start_stage(*payload)
+                            elif command == "rows":
+                                for row_values in payload: self.writer.add(row_values)
+                            elif command == "columns":
+                                self.writer.add_columns(*payload)
+                            elif command in ("flush", "commit"):
+                                self.writer.flush()
+                        if self.writer.errors:
+                            raise RuntimeError(f"INSERT fallito per la stage {self.writer.stage_name}")
+                        if command == "commit":
+                            connection.commit()
+                        if done is not None: done.set()
+                        if command == "commit": return
+                    connection.rollback()
+                except BaseException:
+                    connection.rollback()
+                    raise
+        except BaseException as e_writer:
+            self.failure = e_writer
+
+    def _raise_failure(self):
+        if self.failure is not None:
+            raise RuntimeError(f"scrittura della pipeline fallita: {self.failure}") from self.failure
+        if not self.thread.is_alive():
+            raise RuntimeError("thread di scrittura della pipeline terminato")
+
+    def _send(self, command, payload=None, wait=False):
+        done = threading.Event() if wait else None
+        while True:
+            self._raise_failure()
+            try:
+                self.commands.put((command, payload, done), timeout=0.1)
+                break
+            except queue.Full:
+                continue
+        while done is not None and not done.wait(0.1):
+            self._raise_failure()
+
+    def _send_pending(self):
+        if self.pending:
+            batch = self.pending
+            self.pending = []
+            self._send("rows", batch)
+
+    def start_stage(self, stage_name, column_names):
+        self._send_pending()
+        self._send("stage", (stage_name, list(column_names)), wait=True)
+
+    def add(self, row_values):
+        self.pending.append(row_values)
+        if len(self.pending) >= self.batch_size:
+            self._send_pending()
+
+    def add_columns(self, column_arrays, row_count):
+        self._send_pending()
+        self._send("columns", (column_arrays, row_count))
+
+    def flush(self):
+        self._send_pending()
+        self._send("flush", wait=True)
+
+    def commit(self):
+        self._send_pending()
+        self._send("commit", wait=True)
+        self.thread.join()
+
+    def close(self):
+        self.aborted.set()
+        self.thread.join()
@@ -1,7 +1,29 @@
 import argparse
 import getpass
+import sys
 import json # Per stampare il dizionario di analyze-fks in modo leggibile
 from puppini_bridge_engine import PuppiniBridgeManager # Assumendo che la libreria sia in puppini_bridge_library.py
+from puppini_bridge_engine import POPULATE_STRATEGIES, DDL_MODES, ROW_FORMATS, EXPORT_FORMATS, AGGREGATE_FUNCTIONS
+
+def aggregate_option(value):
+    """Converte STAGE:PBK_A,PBK_B[:MISURA=funzione,...] nella coppia (stage, {'group_by': [...], 'measures': {...}})."""
+    parts = value.split(":")
+    if len(parts) not in (2, 3) or not parts[0] or not parts[1]:
+        raise argparse.ArgumentTypeError(f"formato non valido '{value}', atteso STAGE:PBK_A,PBK_B[:MISURA=funzione,...]")
+    measures = {}
+    for measure in (parts[2].split(",") if len(parts) == 3 else []):
+        name, _, function = measure.partition("=")
+        if not name or function not in AGGREGATE_FUNCTIONS:
+            raise argparse.ArgumentTypeError(f"misura non valida '{measure}', atteso MISURA=funzione ({', '.join(AGGREGATE_FUNCTIONS)})")
+        measures[name] = function
+    return parts[0], {'group_by': parts[1].split(","), 'measures': measures}
+
+def stage_list_option(value):
+    """Converte l'elenco STAGE_A,STAGE_B nella lista dei nomi di stage."""
+    stage_names = [name.strip() for name in value.split(",") if name.strip()]
+    if not stage_names:
+        raise argparse.ArgumentTypeError(f"elenco di stage non valido '{value}', atteso STAGE_A,STAGE_B")
+    return stage_names
 
 def main():
     parser = argparse.ArgumentParser(description="CLI per PuppiniBridgeManager per generare o eseguire SQL.")
@@ -14,19 +36,190 @@ def main():
     parser.add_argument("--user", required=True, help="Username per la connessione al DB")
     parser.add_argument("--password", help="Password per la connessione al DB (verrà chiesta se non fornita)")
     parser.add_argument("--bridge-name", default="Puppini_Bridge", help="Nome della tabella Puppini Bridge (default: Puppini_Bridge)")
-    parser.add_argument("--to-sql", action="store_true", help="Se presente, stampa l'SQL generato invece di eseguirlo. Applicabile a create, populate, remove-fks.")
+    parser.add_argument("--analysis-cache", metavar="FILE",
+                        help="File in cui salvare lo schema riflesso; viene riusato finché l'impronta dello schema non cambia")
+    parser.add_argument("--metrics-json", metavar="PATH",
+                        help="Scrive in PATH le metriche dell'azione in JSON: tempi per fase e per stage, "
+                             "righe lette/scritte, statement SQL")
+    parser.add_argument("--to-sql", action="store_true",
+                        help="Se presente, stampa l'SQL generato invece di eseguirlo. Applicabile a create, populate, "
+                             "export, remove-fks, restore-fks.")
 
     # Sotto-comandi per le azioni
     subparsers = parser.add_subparsers(dest="action", title="Azioni", required=True,
                                        help="Azione da eseguire con PuppiniBridgeManager")
 
-    create_parser = subparsers.add_parser("create", help="Genera SQL o esegue la creazione della tabella Puppini Bridge e modifica le tabelle sorgenti.")
-    populate_parser = subparsers.add_parser("populate", help="Genera SQL INSERT o esegue il popolamento della tabella Puppini Bridge.")
+    # Opzioni comuni a populate e incremental
+    populate_options_parser = argparse.ArgumentParser(add_help=False)
+    populate_options_parser.add_argument("--strategy", choices=POPULATE_STRATEGIES, default="rows",
+                                         help="Strategia di popolamento: 'rows' risale le FK riga per riga, 'set' usa un INSERT ... SELECT "
+                                              "con LEFT JOIN per ogni stage eseguito dal DB, 'vectorized' risolve le FK in memoria a "
+                                              "blocchi con NumPy (default: rows)")
+    populate_options_parser.add_argument("--dimension-cache-mb", type=float, default=256,
+                                         help="Memoria massima (MB) della cache LRU delle catene di dimensioni già "
+                                              "risolte; 0 la disattiva (default: 256)")
+    populate_options_parser.add_argument("--preload-dimensions", action="store_true",
+                                         help="Precarica le tabelle di dimensione con una query ciascuna invece "
+                                              "di leggerle per PK riga per riga")
+    populate_options_parser.add_argument("--batch-size", type=int, default=1000,
+                                         help="Numero massimo di righe per INSERT multi-riga in esecuzione diretta; i blocchi sono ridotti "
+                                              "automaticamente per rispettare max_allowed_packet (default: 1000)")
+    populate_options_parser.add_argument("--read-chunk-size", type=int, default=10000,
+                                         help="Righe lette per volta dal cursore lato server durante la lettura in streaming delle "
+                                              "tabelle sorgente (default: 10000)")
+
+    # Opzioni di aggregazione delle stage comuni a populate, rebuild, export e plan
+    aggregate_options_parser = argparse.ArgumentParser(add_help=False)
+    aggregate_options_parser.add_argument("--aggregate", action="append", type=aggregate_option,
+                                          metavar="STAGE:PBK_A,PBK_B[:MISURA=funzione,...]",
+                                          help="Scrive per la stage una riga per gruppo delle colonne PBK_ indicate, con SUM (o COUNT) "
+                                               "delle colonne numeriche invece di una riga per riga sorgente; ripetibile per più stage")
+
+    # Selezione delle stage comune a create e populate
+    stage_options_parser = argparse.ArgumentParser(add_help=False)
+    stage_options_parser.add_argument("--stages", type=stage_list_option, metavar="STAGE_A,STAGE_B",
+                                      help="Solo le stage indicate: create adegua la bridge esistente con ALTER TABLE invece di ricrearla, "
+                                           "populate ne rimuove le righe (DELETE ... WHERE Stage o TRUNCATE PARTITION) e le "
+                                           "ripopola lasciando invariate le altre")
+    stage_options_parser.add_argument("--exclude-stages", type=stage_list_option, metavar="STAGE_A,STAGE_B",
+                                      help="Come --stages, per tutte le stage tranne quelle indicate")
+
+    # Opzioni di layout fisico della bridge comuni a create e rebuild
+    layout_options_parser = argparse.ArgumentParser(add_help=False)
+    layout_options_parser.add_argument("--partition-by-stage", action="store_true",
+                                       help="Solo MySQL: partiziona la bridge con PARTITION BY LIST "
+                                            "COLUMNS(Stage), una partizione per stage")
+    layout_options_parser.add_argument("--row-format", choices=ROW_FORMATS,
+                                       help="Solo MySQL: ROW_FORMAT della tabella bridge (default: quello del server)")
+    layout_options_parser.add_argument("--narrow-stage", action="store_true",
+                                       help="Dimensiona la colonna Stage sul nome di stage più lungo invece di VARCHAR(255)")
+
+    create_parser = subparsers.add_parser("create", parents=[layout_options_parser, stage_options_parser],
+                                          help="Genera SQL o esegue la creazione della tabella Puppini Bridge "
+                                               "e modifica le tabelle sorgenti.")
+    create_parser.add_argument("--ddl-mode", choices=DDL_MODES, default="default",
+                               help="Aggiunta delle colonne PBK_ alle sorgenti: 'default' ALTER + un UPDATE per tabella, 'online' ALTER "
+                                    "con ALGORITHM=INSTANT/INPLACE e UPDATE a blocchi di PK, 'generated' colonna generata STORED "
+                                    "senza UPDATE (default: default)")
+    create_parser.add_argument("--backfill-chunk-size", type=int, default=10000,
+                               help="Con --ddl-mode online, righe per ogni UPDATE di backfill, ognuno con un "
+                                    "proprio commit (default: 10000)")
+    create_parser.add_argument("--throttle-ms", type=int, default=0,
+                               help="Con --ddl-mode online, pausa in millisecondi tra un blocco di backfill e il successivo (default: 0)")
+    create_parser.add_argument("--index-pbk", action="store_true",
+                               help="Crea un indice secondario su ogni colonna PBK_ della bridge (più Stage se non partizionata)")
+    # Opzioni di parallelismo comuni a populate e rebuild
+    parallel_options_parser = argparse.ArgumentParser(add_help=False)
+    parallel_options_parser.add_argument("--workers", type=int, default=1,
+                                         help="Numero di stage (o intervalli di PK) popolati in parallelo in esecuzione diretta, ognuno "
+                                              "con connessione e transazione proprie (default: 1)")
+    parallel_options_parser.add_argument("--chunk-rows", type=int, default=1000000,
+                                         help="Con --workers > 1, le stage sono divise in intervalli di PK di al massimo N righe; "
+                                              "0 non divide (default: 1000000)")
+    parallel_options_parser.add_argument("--pipeline", action="store_true",
+                                         help="Con --workers 1 e strategy rows o vectorized, legge, trasforma e scrive in parallelo su "
+                                              "thread e connessioni distinte (su SQLite richiede journal_mode=WAL)")
+    parallel_options_parser.add_argument("--pipeline-depth", type=int, default=4,
+                                         help="Con --pipeline, blocchi al massimo in coda tra lettura, "
+                                              "trasformazione e scrittura (default: 4)")
+    populate_parser = subparsers.add_parser("populate", parents=[populate_options_parser, parallel_options_parser, aggregate_options_parser,
+                                                                 stage_options_parser],
+                                            help="Genera SQL INSERT o esegue il popolamento della tabella Puppini Bridge.")
+    populate_parser.add_argument("--output",
+                                 help="Con --to-sql, scrive l'SQL in questo file (o directory con --shard-by-stage) invece che in console; "
+                                      "se termina in .gz è compresso con gzip")
+    populate_parser.add_argument("--gzip", action="store_true", help="Con --to-sql e --output, comprime l'output con gzip")
+    populate_parser.add_argument("--shard-by-stage", action="store_true",
+                                 help="Con --to-sql e --output, scrive un file per stage nella directory "
+                                      "indicata, per eseguirli in parallelo")
+    populate_parser.add_argument("--commit-every", type=int, default=0,
+                                 help="Conferma ogni stage a blocchi di al massimo N righe sorgente, salvando un checkpoint per stage in "
+                                      "<bridge>_Checkpoint; 0 un solo commit finale (default: 0)")
+    populate_parser.add_argument("--resume", action="store_true",
+                                 help="Riprende un popolamento con --commit-every interrotto: salta le stage completate, rimuove i blocchi "
+                                      "non confermati e continua dall'ultimo checkpoint")
+    incremental_parser = subparsers.add_parser("incremental", parents=[populate_options_parser],
+                                               help="Popola la Puppini Bridge solo con le righe sorgente nuove o modificate dall'ultima "
+                                                    "esecuzione (watermark per stage).")
+    incremental_parser.add_argument("--watermark-column",
+                                    help="Colonna (es. updated_at) usata come watermark nelle tabelle che la hanno; le "
+                                         "altre usano la PK (default: PK)")
+    rebuild_parser = subparsers.add_parser("rebuild", parents=[populate_options_parser, parallel_options_parser, layout_options_parser,
+                                                               aggregate_options_parser],
+                                           help="Ricostruisce la Puppini Bridge in una tabella ombra (<bridge>__new), crea gli indici a "
+                                                "fine caricamento e la scambia con un RENAME atomico.")
+    rebuild_parser.add_argument("--keep-old", action="store_true",
+                                help="Conserva la bridge precedente come <bridge>__old fino alla ricostruzione successiva")
+    export_parser = subparsers.add_parser("export", parents=[populate_options_parser, aggregate_options_parser],
+                                          help="Scrive le righe della Puppini Bridge su file (un CSV o Parquet per stage) invece di "
+                                               "inserirle, ed eventualmente le carica con LOAD DATA LOCAL INFILE.")
+    export_parser.add_argument("--output-dir", required=True,
+                               help="Directory in cui scrivere i file, uno per stage (NNN_<tabella>.csv o .parquet)")
+    export_parser.add_argument("--format", choices=EXPORT_FORMATS, default="csv",
+                               help="Formato dei file: csv o parquet (richiede pyarrow) (default: csv)")
+    export_parser.add_argument("--load", action="store_true",
+                               help="Solo csv: carica i file nella bridge con LOAD DATA LOCAL INFILE (richiede local_infile abilitato sul "
+                                    "server); con --to-sql i comandi LOAD DATA sono stampati invece che eseguiti")
+    plan_parser = subparsers.add_parser("plan", parents=[aggregate_options_parser],
+                                        help="Mostra il piano di popolamento (join per stage, sorgenti delle "
+                                             "colonne PBK_, cicli) senza eseguirlo.")
+    plan_parser.add_argument("--format", choices=["text", "json"], default="text",
+                             help="Formato del piano: testo in stile EXPLAIN o JSON (default: text)")
+    estimate_parser = subparsers.add_parser("estimate", parents=[aggregate_options_parser],
+                                            help="Stima righe e dimensione della bridge e, per ogni strategia, statement SQL e durata del "
+                                                 "popolamento (EXPLAIN dei join e un campione per stage in una tabella "
+                                                 "temporanea), senza scrivere nella bridge.")
+    estimate_parser.add_argument("--strategies", nargs="+", choices=POPULATE_STRATEGIES, default=list(POPULATE_STRATEGIES),
+                                 help="Strategie da stimare (default: tutte; 'vectorized' è saltata senza NumPy)")
+    estimate_parser.add_argument("--sample-rows", type=int, default=1000,
+                                 help="Righe sorgente per stage popolate nel campione con cui misurare i tempi (default: 1000)")
+    estimate_parser.add_argument("--dimension-cache-mb", type=float, default=256, help="Come per populate (default: 256)")
+    estimate_parser.add_argument("--preload-dimensions", action="store_true", help="Come per populate: stima con le dimensioni precaricate")
+    estimate_parser.add_argument("--batch-size", type=int, default=1000, help="Come per populate (default: 1000)")
+    estimate_parser.add_argument("--read-chunk-size", type=int, default=10000, help="Come per populate (default: 10000)")
+    estimate_parser.add_argument("--format", choices=["text", "json"], default="text", help="Formato della stima (default: text)")
+    verify_parser = subparsers.add_parser("verify", parents=[aggregate_options_parser],
+                                          help="Verifica la bridge popolata con query aggregate: righe per stage contro le sorgenti, "
+                                               "valori PBK_ senza riga nella dimensione e totali delle colonne numeriche; termina "
+                                               "con codice 1 se trova differenze.")
+    verify_parser.add_argument("--format", choices=["text", "json"], default="text", help="Formato dell'esito (default: text)")
     removefks_parser = subparsers.add_parser("remove-fks", help="Genera SQL o esegue la rimozione delle Foreign Keys dalle tabelle sorgenti.") # Descrizione aggiornata
+    removefks_parser.add_argument("--backup-file", metavar="FILE",
+                                  help="Salva in FILE (JSON) le definizioni delle FK rimosse, da ripristinare con restore-fks")
+    removefks_parser.add_argument("--workers", type=int, default=1,
+                                  help="Tabelle elaborate in parallelo, ognuna con un solo ALTER TABLE e una "
+                                       "connessione propria (default: 1)")
+    restorefks_parser = subparsers.add_parser("restore-fks",
+                                              help="Genera SQL o ripristina le Foreign Keys salvate da remove-fks --backup-file.")
+    restorefks_parser.add_argument("--backup-file", metavar="FILE", required=True, help="File JSON scritto da remove-fks --backup-file")
+    restorefks_parser.add_argument("--skip-validation", action="store_true",
+                                   help="Aggiunge le FK con foreign_key_checks=0, senza che InnoDB validi le "
+                                        "righe esistenti (molto più veloce)")
+    restorefks_parser.add_argument("--workers", type=int, default=1,
+                                   help="Tabelle elaborate in parallelo, ognuna con un solo ALTER TABLE e una "
+                                        "connessione propria (default: 1)")
     analyzefks_parser = subparsers.add_parser("analyze-fks", help="Analizza e restituisce le Foreign Keys presenti nelle tabelle sorgenti.")
 
     args = parser.parse_args()
 
+    if args.action == "populate" and (args.output or args.gzip or args.shard_by_stage) and not args.to_sql:
+        parser.error("--output, --gzip e --shard-by-stage richiedono --to-sql")
+    if args.action == "populate" and (args.gzip or args.shard_by_stage) and not args.output:
+        parser.error("--gzip e --shard-by-stage richiedono --output")
+
+    if args.action == "populate" and args.workers > 1 and args.to_sql:
+        parser.error("--workers richiede l'esecuzione diretta (senza --to-sql)")
+    if args.action == "populate" and (args.commit_every or args.resume) and args.to_sql:
+        parser.error("--commit-every e --resume richiedono l'esecuzione diretta (senza --to-sql)")
+    if args.action == "export" and (args.load or args.to_sql) and args.format != "csv":
+        parser.error("--load e --to-sql richiedono --format csv")
+    if args.action == "rebuild" and args.to_sql:
+        parser.error("rebuild non supporta --to-sql.")
+    if args.action in ("estimate", "verify") and args.to_sql:
+        parser.error(f"{args.action} non esegue né genera SQL e non supporta --to-sql")
+    if args.action == "incremental" and args.to_sql:
+        parser.error("incremental aggiorna i watermark sul DB e non supporta --to-sql")
+
     if args.port is None:
         if args.driver == "mysql":
             args.port = 3306
@@ -40,8 +233,9 @@ def main():
                 print("ATTENZIONE: È stata inserita una password vuota. Si tenterà la connessione senza password.")
             db_password_to_use = "" 
     
+    exit_code = 0
     try:
-        manager_silent = args.to_sql
+        manager_silent = args.to_sql or (args.action in ("plan", "estimate", "verify") and args.format == "json")
 
         if not manager_silent: 
             print(f"Inizializzazione PuppiniBridgeManager per DB: {args.db_name} su {args.host}...")
@@ -53,7 +247,10 @@ def main():
             database_name=args.db_name,
             username=args.user,
             password=db_password_to_use, 
-            silent=manager_silent 
+            silent=manager_silent,
+            analysis_cache_path=args.analysis_cache,
+            # In parallelo ogni worker può usare due connessioni (scrittura e lettura in streaming).
+            pool_size=max(5, 2 * getattr(args, "workers", 1))
         )
         
         if not manager_silent:
@@ -65,11 +262,17 @@ def main():
             # else: # Non stampare l'intestazione se to_sql è True, per output SQL pulito
                 # print(f"\n--- SQL per CREATE {args.bridge_name} (to_sql=True) ---") # Rimosso per output pulito
             
-            creation_result = manager.create_puppini_bridge(bridge_table_name=args.bridge_name, to_sql=args.to_sql)
+            creation_result = manager.create_puppini_bridge(bridge_table_name=args.bridge_name, to_sql=args.to_sql, ddl_mode=args.ddl_mode,
+                                                            backfill_chunk_size=args.backfill_chunk_size, throttle_ms=args.throttle_ms,
+                                                            partition_by_stage=args.partition_by_stage, index_pbk=args.index_pbk,
+                                                            row_format=args.row_format, narrow_stage=args.narrow_stage,
+                                                            stages=args.stages, exclude_stages=args.exclude_stages)
             
             if args.to_sql:
                 print(creation_result['create_bridge_sql'].strip())
                 if not creation_result['create_bridge_sql'].strip().startswith("--") and not creation_result['create_bridge_sql'].strip().endswith(";"): print(";")
+                for cmd in creation_result['create_index_sql']:
+                    print(cmd.strip() + ";")
 
                 if creation_result['modify_source_tables_sql']:
                     # print("\n--- SQL per MODIFICARE TABELLE SORGENTE (Aggiunta PBK_) (to_sql=True) ---") # Rimosso per output pulito
@@ -89,21 +292,106 @@ def main():
             # else: 
                 # print(f"\n--- SQL per POPULATE {args.bridge_name} (to_sql=True) ---") # Rimosso per output pulito
 
-            result = manager.populate_puppini_bridge(bridge_table_name=args.bridge_name, to_sql=args.to_sql)
+            populate_options = dict(bridge_table_name=args.bridge_name, strategy=args.strategy,
+                                    dimension_cache_mb=args.dimension_cache_mb, preload_dimensions=args.preload_dimensions,
+                                    batch_size=args.batch_size, read_chunk_size=args.read_chunk_size,
+                                    aggregate_stages=dict(args.aggregate or []), stages=args.stages, exclude_stages=args.exclude_stages)
 
             if args.to_sql:
-                sql_inserts = result
-                if sql_inserts and not (len(sql_inserts) == 1 and sql_inserts[0].startswith("-- ")):
-                    for sql_cmd in sql_inserts:
-                        print(sql_cmd.strip()) 
-                        if not sql_cmd.strip().startswith("--") and not sql_cmd.strip().endswith(";"): print(";")
+                # L'SQL viene scritto man mano che è generato, senza accumularlo in memoria.
+                manager.write_populate_sql(output_path=args.output, shard_by_stage=args.shard_by_stage,
+                                           compress=args.gzip, **populate_options)
             else: 
+                result = manager.populate_puppini_bridge(to_sql=False, workers=args.workers, chunk_rows=args.chunk_rows,
+                                                         pipeline=args.pipeline, pipeline_depth=args.pipeline_depth,
+                                                         commit_every=args.commit_every, resume=args.resume, **populate_options)
                 if not manager_silent:
                     if result: 
                         print(f"Popolamento di '{args.bridge_name}' eseguito con successo sul DB.")
                     else:
                         print(f"ERRORE durante l'esecuzione diretta del popolamento di '{args.bridge_name}'.")
+                if not result: exit_code = 1
+
+        elif args.action == "incremental":
+            print(f"\n--- Azione: Popolamento incrementale per '{args.bridge_name}' (Esecuzione Diretta) ---")
+            result = manager.populate_incremental(bridge_table_name=args.bridge_name, strategy=args.strategy,
+                                                  watermark_column=args.watermark_column,
+                                                  dimension_cache_mb=args.dimension_cache_mb, preload_dimensions=args.preload_dimensions,
+                                                  batch_size=args.batch_size, read_chunk_size=args.read_chunk_size)
+            if result:
+                print(f"Popolamento incrementale di '{args.bridge_name}' eseguito con successo sul DB.")
+            else:
+                print(f"ERRORE durante il popolamento incrementale di '{args.bridge_name}'.")
+                exit_code = 1
 
+        elif args.action == "rebuild":
+            print(f"\n--- Azione: Ricostruzione di '{args.bridge_name}' con scambio atomico (Esecuzione Diretta) ---")
+            result = manager.rebuild_puppini_bridge(bridge_table_name=args.bridge_name, strategy=args.strategy,
+                                                    dimension_cache_mb=args.dimension_cache_mb, preload_dimensions=args.preload_dimensions,
+                                                    batch_size=args.batch_size, read_chunk_size=args.read_chunk_size,
+                                                    workers=args.workers, chunk_rows=args.chunk_rows, keep_old=args.keep_old,
+                                                    partition_by_stage=args.partition_by_stage, row_format=args.row_format,
+                                                    narrow_stage=args.narrow_stage, pipeline=args.pipeline,
+                                                    pipeline_depth=args.pipeline_depth, aggregate_stages=dict(args.aggregate or []))
+            if result:
+                print(f"Ricostruzione di '{args.bridge_name}' eseguita con successo sul DB.")
+            else:
+                print(f"ERRORE durante la ricostruzione di '{args.bridge_name}'.")
+                exit_code = 1
+
+        elif args.action == "export":
+            if not args.to_sql:
+                print(f"\n--- Azione: Export su file di '{args.bridge_name}' in '{args.output_dir}' ---")
+            result = manager.export_puppini_bridge(output_dir=args.output_dir, bridge_table_name=args.bridge_name, file_format=args.format,
+                                                   load=args.load, to_sql=args.to_sql, strategy=args.strategy,
+                                                   dimension_cache_mb=args.dimension_cache_mb, preload_dimensions=args.preload_dimensions,
+                                                   batch_size=args.batch_size, read_chunk_size=args.read_chunk_size,
+                                                   aggregate_stages=dict(args.aggregate or []))
+            if args.to_sql:
+                for load_sql in result:
+                    print(load_sql.strip() + ";")
+            elif result:
+                print(f"Export di '{args.bridge_name}' eseguito con successo ({len(manager.last_export_files)} file).")
+            else:
+                print(f"ERRORE durante l'export di '{args.bridge_name}'.")
+                exit_code = 1
+
+        elif args.action == "plan":
+            if not manager_silent:
+                print(f"\n--- Azione: Piano di popolamento per '{args.bridge_name}' ---")
+            population_plan = manager.build_population_plan(bridge_table_name=args.bridge_name, aggregate_stages=dict(args.aggregate or []))
+            if args.format == "json":
+                print(json.dumps(population_plan.to_dict(), indent=2))
+            else:
+                print(population_plan.to_text())
+
+        elif args.action == "estimate":
+            if not manager_silent:
+                print(f"\n--- Azione: Stima del popolamento di '{args.bridge_name}' ---")
+            estimate = manager.estimate_puppini_bridge(bridge_table_name=args.bridge_name, strategies=args.strategies,
+                                                       sample_rows=args.sample_rows,
+                                                       batch_size=args.batch_size, read_chunk_size=args.read_chunk_size,
+                                                       dimension_cache_mb=args.dimension_cache_mb,
+                                                       preload_dimensions=args.preload_dimensions,
+                                                       aggregate_stages=dict(args.aggregate or []))
+            if not estimate:
+                print(f"ERRORE durante la stima del popolamento di '{args.bridge_name}'.")
+            elif args.format == "json":
+                print(json.dumps(estimate.to_dict(), indent=2, default=str))
+            else:
+                print(estimate.to_text())
+
+        elif args.action == "verify":
+            if not manager_silent:
+                print(f"\n--- Azione: Verifica di '{args.bridge_name}' ---")
+            verification = manager.verify_puppini_bridge(bridge_table_name=args.bridge_name, aggregate_stages=dict(args.aggregate or []))
+            if not verification:
+                print(f"ERRORE durante la verifica di '{args.bridge_name}'.")
+            elif args.format == "json":
+                print(json.dumps(verification.to_dict(), indent=2, default=str))
+            else:
+                print(verification.to_text())
+            exit_code = 0 if verification and verification.ok else 1
 
         elif args.action == "remove-fks":
             if not args.to_sql: 
@@ -111,7 +399,7 @@ def main():
             # else: 
                  # print(f"\n--- SQL per REMOVE Foreign Keys (to_sql=True) ---") # Rimosso per output pulito
             
-            result = manager.remove_foreign_keys(to_sql=args.to_sql)
+            result = manager.remove_foreign_keys(to_sql=args.to_sql, backup_path=args.backup_file, workers=args.workers)
 
             if args.to_sql:
                 sql_remove_fks_list = result
@@ -125,8 +413,23 @@ def main():
                         print("Rimozione delle Foreign Keys eseguita con successo sul DB.")
                     else:
                         print("ERRORE durante l'esecuzione diretta della rimozione delle Foreign Keys.")
+                exit_code = 0 if result else 1
 
 
+        elif args.action == "restore-fks":
+            if not args.to_sql:
+                print(f"\n--- Azione: Ripristino Foreign Keys da '{args.backup_file}' (Esecuzione Diretta) ---")
+            result = manager.restore_foreign_keys(backup_path=args.backup_file, to_sql=args.to_sql, skip_validation=args.skip_validation,
+                                                  workers=args.workers)
+            if args.to_sql:
+                for sql_cmd in result:
+                    print(sql_cmd.strip())
+            elif result:
+                print("Ripristino delle Foreign Keys eseguito con successo sul DB.")
+            else:
+                print("ERRORE durante il ripristino delle Foreign Keys.")
+                exit_code = 1
+
         elif args.action == "analyze-fks":
             # Questo metodo della libreria restituisce sempre dati di analisi.
             # Il flag to_sql nella CLI controlla solo la verbosità della CLI stessa.
@@ -144,12 +447,24 @@ def main():
             if not args.to_sql: # Stampa solo se non siamo in modalità solo SQL
                  print("\nNOTA: L'azione 'analyze-fks' mostra sempre l'analisi; non esegue modifiche al DB.")
 
+        if manager.last_metrics is not None and not manager_silent:
+            metrics = manager.last_metrics
+            print(f"Metriche '{metrics.operation}': {metrics.duration_s:.2f} s, {metrics.statements} statement SQL, "
+                  f"{sum(entry['rows_written'] for entry in metrics.stages.values())} righe scritte.")
+        if args.metrics_json and manager.last_metrics is not None:
+            with open(args.metrics_json, "w", encoding="utf-8") as metrics_file:
+                json.dump(manager.last_metrics.to_dict(), metrics_file, indent=2, default=str)
+            if not manager_silent: print(f"Metriche scritte in '{args.metrics_json}'.")
 
     except Exception as e:
         # Stampa sempre gli errori critici, anche se to_sql è True, perché indicano un problema
         print(f"\nERRORE DURANTE L'ESECUZIONE DELLA CLI: {e}")
         import traceback
         traceback.print_exc()
+        exit_code = 1
+
+    if exit_code:
+        sys.exit(exit_code)
 
 if __name__ == "__main__":
     main()
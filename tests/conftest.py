@@ -0,0 +1,114 @@
+import os
+import shutil
+import sqlite3
+import sys
+
+import pytest
+from sqlalchemy import text
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from puppini_bridge_engine import PuppiniBridgeManager
+
+# Snowflake SQLite piccolo con i casi limite del popolamento: FK orfane e NULL, un ciclo (DimEmployee.ManagerKey),
+# una fact con due FK verso la stessa dimensione (FactReturns) e una tabella senza PK (NoPkLog).
+SCHEMA = [
+    "CREATE TABLE DimTime (TimeKey INT PRIMARY KEY, FullDate VARCHAR(10), Weekday VARCHAR(10))",
+    "CREATE TABLE DimGeography (GeographyKey INT PRIMARY KEY, Country VARCHAR(50), Population INT)",
+    "CREATE TABLE DimStore (StoreKey INT PRIMARY KEY, StoreName VARCHAR(100), GK_Ref INT, "
+    "CONSTRAINT FK_Store_Geo FOREIGN KEY (GK_Ref) REFERENCES DimGeography(GeographyKey))",
+    "CREATE TABLE DimProductDepartment (DepartmentKey INT PRIMARY KEY, DepartmentName VARCHAR(50), GeoRef INT, "
+    "CONSTRAINT FK_Dept_Geo FOREIGN KEY (GeoRef) REFERENCES DimGeography(GeographyKey))",
+    "CREATE TABLE DimProductCategory (CategoryKey INT PRIMARY KEY, CategoryName VARCHAR(50), DPK_Ref INT, "
+    "CONSTRAINT FK_Cat_Dept FOREIGN KEY (DPK_Ref) REFERENCES DimProductDepartment(DepartmentKey))",
+    "CREATE TABLE DimProductSubcategory (SubcategoryKey INT PRIMARY KEY, SubcategoryName VARCHAR(50), CK_Ref INT, "
+    "CONSTRAINT FK_Subcat_Cat FOREIGN KEY (CK_Ref) REFERENCES DimProductCategory(CategoryKey))",
+    "CREATE TABLE DimProduct (ProductKey INT PRIMARY KEY, ProductName VARCHAR(100), SCK_Ref INT, UnitPrice DECIMAL(10,2), Stock INT, "
+    "CONSTRAINT FK_Prod_Subcat FOREIGN KEY (SCK_Ref) REFERENCES DimProductSubcategory(SubcategoryKey))",
+    "CREATE TABLE DimEmployee (EmployeeKey INT PRIMARY KEY, Name VARCHAR(50), ManagerKey INT, StoreRef INT, "
+    "CONSTRAINT FK_Emp_Mgr FOREIGN KEY (ManagerKey) REFERENCES DimEmployee(EmployeeKey), "
+    "CONSTRAINT FK_Emp_Store FOREIGN KEY (StoreRef) REFERENCES DimStore(StoreKey))",
+    "CREATE TABLE FactSales (SalesID INTEGER PRIMARY KEY, TK_Ref INT, PK_Ref INT, SK_Ref INT, EK_Ref INT, Quantity INT, "
+    "TotalAmount DECIMAL(12,2), "
+    "CONSTRAINT FK_Sales_Time FOREIGN KEY (TK_Ref) REFERENCES DimTime(TimeKey), "
+    "CONSTRAINT FK_Sales_Prod FOREIGN KEY (PK_Ref) REFERENCES DimProduct(ProductKey), "
+    "CONSTRAINT FK_Sales_Store FOREIGN KEY (SK_Ref) REFERENCES DimStore(StoreKey), "
+    "CONSTRAINT FK_Sales_Emp FOREIGN KEY (EK_Ref) REFERENCES DimEmployee(EmployeeKey))",
+    "CREATE TABLE FactReturns (ReturnID INTEGER PRIMARY KEY, OrderDate INT, ShipDate INT, PK_Ref INT, Amount DECIMAL(12,2), "
+    "CONSTRAINT FK_Ret_Ord FOREIGN KEY (OrderDate) REFERENCES DimTime(TimeKey), "
+    "CONSTRAINT FK_Ret_Ship FOREIGN KEY (ShipDate) REFERENCES DimTime(TimeKey), "
+    "CONSTRAINT FK_Ret_Prod FOREIGN KEY (PK_Ref) REFERENCES DimProduct(ProductKey))",
+    "CREATE TABLE NoPkLog (Msg VARCHAR(20), Val INT)",
+]
+DATA = [
+    "INSERT INTO DimTime VALUES (20230115,'2023-01-15','Sunday'),(20230320,'2023-03-20','Monday')",
+    "INSERT INTO DimGeography VALUES (1,'Italia',10),(2,'Italia',20),(3,'Francia',30)",
+    "INSERT INTO DimStore VALUES (101,'Milano',1),(102,'Roma',2),(103,'Orfano',99),(104,'Senza',NULL)",
+    "INSERT INTO DimProductDepartment VALUES (1,'Elettronica',3),(2,'Abbigliamento',NULL)",
+    "INSERT INTO DimProductCategory VALUES (11,'Computer',1),(12,'Smartphone',1),(21,'Pantaloni',2),(22,'Orfana',77)",
+    "INSERT INTO DimProductSubcategory VALUES (111,'Laptop',11),(121,'Android',12),(211,'Jeans',21),(221,'Varie',22)",
+    "INSERT INTO DimProduct VALUES (1001,'Laptop',111,1200.00,50),(1002,'Phone',121,800.00,120),(2001,'Jeans',211,75.00,200),"
+    "(3001,'Strano',221,1.5,1),(4001,'Orfano',999,2,2)",
+    "INSERT INTO DimEmployee VALUES (1,'Boss',NULL,101),(2,'Mid',1,NULL),(3,'Low',2,102),(4,'Loop',4,103)",
+    "INSERT INTO FactSales VALUES (1,20230115,1001,101,3,1,1200.00),(2,20230115,1002,101,2,2,1600.00),(3,20230320,2001,102,NULL,3,225.00),"
+    "(4,20230320,1001,102,4,1,1200.00),(5,NULL,3001,103,1,5,5),(6,20240101,4001,104,99,NULL,NULL),(7,NULL,NULL,NULL,NULL,0,0)",
+    "INSERT INTO FactReturns VALUES (1,NULL,20230115,1001,10),(2,20230320,20230115,2001,20),(3,19990101,20230115,4001,30)",
+    "INSERT INTO NoPkLog VALUES ('a',1)",
+]
+
+
+def create_manager(path):
+    """Manager SQLite silenzioso sul file path."""
+    return PuppiniBridgeManager(driver="sqlite", hostname="", port="", database_name=path, username="", password="", silent=True)
+
+
+def execute_sql(path, *statements):
+    """Esegue gli statement sul file SQLite path e conferma."""
+    connection = sqlite3.connect(path)
+    for statement in statements:
+        connection.execute(statement)
+    connection.commit()
+    connection.close()
+
+
+def read_bridge(manager, bridge_table_name="Puppini_Bridge"):
+    """Righe della bridge come lista ordinata di tuple (colonna, valore), confrontabile tra due esecuzioni."""
+    with manager.engine.connect() as connection:
+        rows = connection.execute(text(f'SELECT * FROM "{bridge_table_name}"')).mappings().all()
+    manager.engine.dispose()
+    return sorted(tuple(sorted((name, str(value)) for name, value in row.items())) for row in rows)
+
+
+def populate_full(path, **populate_options):
+    """Svuota la bridge di path, la ripopola per intero (default strategy='rows') e ne restituisce le righe."""
+    execute_sql(path, "DELETE FROM Puppini_Bridge")
+    manager = create_manager(path)
+    assert manager.populate_puppini_bridge(**populate_options) is True
+    return read_bridge(manager)
+
+
+@pytest.fixture(scope="session")
+def created_db_template(tmp_path_factory):
+    """DB con lo schema di test e la Puppini Bridge già creata (vuota), da copiare in ogni test."""
+    path = str(tmp_path_factory.mktemp("template") / "snowflake.db")
+    execute_sql(path, *SCHEMA, *DATA)
+    manager = create_manager(path)
+    assert manager.create_puppini_bridge() is True
+    manager.engine.dispose()
+    return path
+
+
+@pytest.fixture
+def created_db(created_db_template, tmp_path):
+    """Copia del DB di test con la bridge creata e vuota."""
+    path = str(tmp_path / "snowflake.db")
+    shutil.copy(created_db_template, path)
+    return path
+
+
+@pytest.fixture(scope="session")
+def expected_bridge(created_db_template, tmp_path_factory):
+    """Righe della bridge prodotte dal populate completo riga per riga, il riferimento di tutte le modalità."""
+    path = str(tmp_path_factory.mktemp("expected") / "snowflake.db")
+    shutil.copy(created_db_template, path)
+    return populate_full(path)
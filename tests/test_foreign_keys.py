@@ -0,0 +1,47 @@
+import copy
+import json
+
+from conftest import create_manager
+
+
+def _as_mysql(monkeypatch, manager, schema_snapshot):
+    """La generazione degli ALTER TABLE delle FK è solo MySQL: il manager usa lo schema riflesso da SQLite."""
+    monkeypatch.setattr(manager, "driver", "mysql")
+    monkeypatch.setattr(manager, "_get_schema_snapshot", lambda: schema_snapshot)
+    monkeypatch.setattr(manager, "_get_fk_rules", lambda: {('FactSales', 'FK_Sales_Time'): ('CASCADE', 'RESTRICT')})
+
+
+def test_remove_and_restore_foreign_keys_round_trip(created_db, tmp_path, monkeypatch):
+    manager = create_manager(created_db)
+    schema_snapshot = manager._get_schema_snapshot()
+    fk_names = {fk['name'] for table in schema_snapshot['tables'].values() for fk in table['fks']}
+    backup_path = str(tmp_path / "fks.json")
+    _as_mysql(monkeypatch, manager, schema_snapshot)
+
+    drop_sql = manager.remove_foreign_keys(to_sql=True, backup_path=backup_path)
+    with open(backup_path, encoding="utf-8") as backup_file:
+        backup = json.load(backup_file)['foreign_keys']
+    assert set(backup) == fk_names
+    assert backup['FK_Sales_Time'] == {'table': 'FactSales', 'columns': ['TK_Ref'], 'referred_table': 'DimTime',
+                                       'referred_columns': ['TimeKey'], 'on_delete': 'CASCADE', 'on_update': 'RESTRICT'}
+    assert "ALTER TABLE `FactSales` DROP FOREIGN KEY `FK_Sales_Time`, DROP FOREIGN KEY `FK_Sales_Prod`, " \
+           "DROP FOREIGN KEY `FK_Sales_Store`, DROP FOREIGN KEY `FK_Sales_Emp`;" in drop_sql
+
+    # Dopo la rimozione: FactSales e DimEmployee senza FK, le altre ancora presenti e quindi saltate.
+    removed_snapshot = copy.deepcopy(schema_snapshot)
+    for table_name in ("FactSales", "DimEmployee"):
+        removed_snapshot['tables'][table_name]['fks'] = []
+    monkeypatch.setattr(manager, "_get_schema_snapshot", lambda: removed_snapshot)
+    add_sql = manager.restore_foreign_keys(backup_path, to_sql=True, skip_validation=True)
+    assert add_sql[0] == "SET foreign_key_checks = 0;" and add_sql[-1] == "SET foreign_key_checks = 1;"
+    assert len(add_sql) == 4
+    assert ("ADD CONSTRAINT `FK_Sales_Time` FOREIGN KEY (`TK_Ref`) REFERENCES `DimTime` (`TimeKey`) "
+            "ON DELETE CASCADE ON UPDATE RESTRICT") in add_sql[1] + add_sql[2]
+    assert sum(statement.count("ADD CONSTRAINT") for statement in add_sql) == 6
+
+
+def test_restore_foreign_keys_requires_mysql(created_db, tmp_path):
+    backup_path = str(tmp_path / "fks.json")
+    manager = create_manager(created_db)
+    assert manager.remove_foreign_keys(to_sql=True, backup_path=backup_path) == []
+    assert manager.restore_foreign_keys(backup_path) is False
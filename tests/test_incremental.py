@@ -0,0 +1,65 @@
+import shutil
+
+import pytest
+
+from conftest import create_manager, execute_sql, populate_full, read_bridge
+
+TABLES = ["DimTime", "DimGeography", "DimStore", "DimProductDepartment", "DimProductCategory", "DimProductSubcategory",
+          "DimProduct", "DimEmployee", "FactSales", "FactReturns"]
+
+
+def _populate_incremental(path, strategy, watermark_column="updated_at"):
+    manager = create_manager(path)
+    assert manager.populate_incremental(strategy=strategy, watermark_column=watermark_column) is True
+    return read_bridge(manager)
+
+
+@pytest.fixture
+def incremental_db(created_db, tmp_path):
+    """DB di test con la colonna watermark updated_at in tutte le tabelle."""
+    execute_sql(created_db, *(f"ALTER TABLE {table_name} ADD COLUMN updated_at VARCHAR(30)" for table_name in TABLES),
+                *(f"UPDATE {table_name} SET updated_at = '2024-01-01 00:00:00'" for table_name in TABLES))
+    return created_db
+
+
+def _expected(path, tmp_path):
+    """Bridge del populate completo riga per riga su una copia di path."""
+    expected_path = str(tmp_path / "expected.db")
+    shutil.copy(path, expected_path)
+    return populate_full(expected_path)
+
+
+# Modifiche applicate in sequenza, ciascuna seguita da un incremental confrontato con un populate completo.
+CHANGES = [
+    ("prima esecuzione", []),
+    ("nessuna modifica", []),
+    ("prodotto spostato di sottocategoria",
+     ["UPDATE DimProduct SET SCK_Ref = 121, updated_at = '2024-02-01 00:00:00' WHERE ProductKey = 1001"]),
+    ("sottocategoria spostata di categoria",
+     ["UPDATE DimProductSubcategory SET CK_Ref = 21, updated_at = '2024-02-01 00:00:00' WHERE SubcategoryKey = 121"]),
+    ("inserimento con watermark uguale al precedente",
+     ["INSERT INTO FactSales VALUES (20, 20230115, 1001, 101, 1, 4, 4, 20, '2024-01-01 00:00:00')"]),
+    ("inserimento con watermark NULL", ["INSERT INTO FactSales VALUES (21, 20230115, 1002, 101, 1, 4, 4, 21, NULL)"]),
+    ("modifica di una riga con watermark NULL", ["UPDATE FactSales SET Quantity = 99, PK_Ref = 1001 WHERE SalesID = 21"]),
+    ("dimensione con watermark NULL spostata", ["UPDATE DimProduct SET SCK_Ref = 111, updated_at = NULL WHERE ProductKey = 2001"]),
+    ("riga orfana risolta", ["INSERT INTO DimProductSubcategory VALUES (999, 'Nuova', 12, 999, '2024-03-01 00:00:00')"]),
+    ("ciclo: responsabile cambiato", ["UPDATE DimEmployee SET ManagerKey = 3, updated_at = '2024-03-01 00:00:00' WHERE EmployeeKey = 2"]),
+    ("ciclo: negozio del responsabile cambiato",
+     ["UPDATE DimEmployee SET StoreRef = 102, updated_at = '2024-03-01 00:00:00' WHERE EmployeeKey = 1"]),
+]
+
+
+@pytest.mark.parametrize("strategy", ["rows", "set", "vectorized"])
+def test_incremental_matches_full_populate(incremental_db, tmp_path, strategy):
+    if strategy == "vectorized":
+        pytest.importorskip("numpy")
+    for label, statements in CHANGES:
+        execute_sql(incremental_db, *statements)
+        assert _populate_incremental(incremental_db, strategy) == _expected(incremental_db, tmp_path), label
+
+
+def test_incremental_with_pk_watermark_picks_up_new_rows(created_db, tmp_path):
+    _populate_incremental(created_db, "rows", watermark_column=None)
+    execute_sql(created_db, "INSERT INTO DimProduct VALUES (5001, 'Nuovo', 121, 3, 3, 5001)",
+                "INSERT INTO FactSales VALUES (9, NULL, 5001, 101, 2, 1, 1, 9)")
+    assert _populate_incremental(created_db, "rows", watermark_column=None) == _expected(created_db, tmp_path)
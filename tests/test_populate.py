@@ -0,0 +1,102 @@
+import sqlite3
+
+import pytest
+
+from conftest import create_manager, execute_sql, populate_full, read_bridge
+from puppini_bridge_engine import PuppiniBridgeManager
+
+
+@pytest.mark.parametrize("populate_options", [
+    {'strategy': "set"},
+    {'strategy': "vectorized"},
+    {'strategy': "rows", 'preload_dimensions': True, 'dimension_cache_mb': 0},
+    {'strategy': "rows", 'batch_size': 2, 'read_chunk_size': 3},
+    {'strategy': "rows", 'workers': 3, 'chunk_rows': 2},
+    {'strategy': "set", 'workers': 3, 'chunk_rows': 2},
+    {'strategy': "vectorized", 'workers': 3, 'chunk_rows': 2},
+    {'strategy': "rows", 'commit_every': 2},
+    {'strategy': "set", 'commit_every': 2},
+], ids=lambda options: "-".join(f"{key}={value}" for key, value in options.items()))
+def test_populate_modes_match_rows(created_db, expected_bridge, populate_options):
+    if populate_options['strategy'] == "vectorized":
+        pytest.importorskip("numpy")
+    assert populate_full(created_db, **populate_options) == expected_bridge
+
+
+@pytest.mark.parametrize("strategy", ["rows", "vectorized"])
+def test_pipeline_matches_rows(created_db, expected_bridge, strategy):
+    if strategy == "vectorized":
+        pytest.importorskip("numpy")
+    with sqlite3.connect(created_db) as connection:
+        connection.execute("PRAGMA journal_mode=WAL")
+    assert populate_full(created_db, strategy=strategy, pipeline=True, pipeline_depth=2, read_chunk_size=2, batch_size=2) == expected_bridge
+
+
+class _Interrupted(BaseException):
+    """Interruzione simulata (come un Ctrl-C): non è intercettata dalla gestione degli errori per stage."""
+
+
+@pytest.mark.parametrize("strategy", ["rows", "set"])
+@pytest.mark.parametrize("interrupt_at", [1, 3, 8])
+def test_resume_after_interruption_matches_rows(created_db, expected_bridge, monkeypatch, strategy, interrupt_at):
+    save_checkpoint = PuppiniBridgeManager._save_checkpoint
+    calls = []
+
+    def interrupting_save_checkpoint(self, *args, **kwargs):
+        calls.append(args[2])
+        if len(calls) == interrupt_at:
+            raise _Interrupted()
+        return save_checkpoint(self, *args, **kwargs)
+
+    monkeypatch.setattr(PuppiniBridgeManager, "_save_checkpoint", interrupting_save_checkpoint)
+    manager = create_manager(created_db)
+    try:
+        manager.populate_puppini_bridge(strategy=strategy, commit_every=2)
+    except _Interrupted:
+        pass
+    manager.engine.dispose()
+    assert len(calls) == interrupt_at
+    monkeypatch.setattr(PuppiniBridgeManager, "_save_checkpoint", save_checkpoint)
+
+    manager = create_manager(created_db)
+    assert manager.populate_puppini_bridge(strategy=strategy, commit_every=2, resume=True) is True
+    assert read_bridge(manager) == expected_bridge
+
+
+def _change_fact_sales(path):
+    execute_sql(path, "UPDATE FactSales SET Quantity = Quantity + 10, PK_Ref = 2001 WHERE SalesID <= 3",
+                "INSERT INTO FactSales VALUES (8, 20230115, 1002, 102, 3, 4, 40, NULL)")
+
+
+@pytest.mark.parametrize("strategy", ["rows", "set", "vectorized"])
+def test_stage_selection_repopulates_only_selected_stages(created_db, strategy):
+    if strategy == "vectorized":
+        pytest.importorskip("numpy")
+    before = populate_full(created_db)
+    _change_fact_sales(created_db)
+    execute_sql(created_db, "UPDATE DimStore SET StoreName = 'Torino' WHERE StoreKey = 101")
+
+    manager = create_manager(created_db)
+    assert manager.populate_puppini_bridge(strategy=strategy, stages=["FactSales"]) is True
+    after = read_bridge(manager)
+
+    assert [row for row in after if ('Stage', 'FactSales') not in row] == [row for row in before if ('Stage', 'FactSales') not in row]
+    assert after == populate_full(created_db)
+
+
+@pytest.mark.parametrize("rebuild_options", [{}, {'strategy': "set"}, {'strategy': "rows", 'workers': 2, 'chunk_rows': 2},
+                                             {'keep_old': True}],
+                         ids=["rows", "set", "workers", "keep_old"])
+def test_rebuild_matches_rows(created_db, rebuild_options):
+    populate_full(created_db)
+    _change_fact_sales(created_db)
+    expected = populate_full(created_db)
+    execute_sql(created_db, "DELETE FROM Puppini_Bridge WHERE Stage = 'FactSales'")
+
+    manager = create_manager(created_db)
+    assert manager.rebuild_puppini_bridge(**rebuild_options) is True
+    assert read_bridge(manager) == expected
+    with sqlite3.connect(created_db) as connection:
+        table_names = {row[0] for row in connection.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    assert "Puppini_Bridge__new" not in table_names
+    assert ("Puppini_Bridge__old" in table_names) == bool(rebuild_options.get('keep_old'))